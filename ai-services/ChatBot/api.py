@@ -1,9 +1,6 @@
 import os
 import uuid
 import sys
-import json
-import traceback
-import subprocess
 from typing import Optional
 from contextlib import asynccontextmanager
 
@@ -13,30 +10,17 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-# Now these imports will work correctly
-from reorder_point_calculator import ReorderPointCalculator, convert_to_serializable
-
-# --- FIX: Set Matplotlib backend to Agg to prevent GUI errors ---
-# This MUST be done before importing pyplot
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+# Now these imports will work correctly. The forecast, reorder and operations
+# endpoints come from forecast_service, whose data snapshot, caches and
+# warm-up this app shares; LangChain and the embedding model are loaded by the
+# chatbot's own warm-up, and /ready reports when that is done.
+import forecast_service
+from warmup import Warmup
 
 # --- Library Imports ---
-import pandas as pd
-import joblib
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
-
-# --- LangChain Imports ---
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.chat_models import ChatOllama
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema.runnable import RunnablePassthrough
-from langchain.schema.output_parser import StrOutputParser
 
 # --- CONFIGURATION ---
 PERSIST_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "document_store")
@@ -47,15 +31,26 @@ LLM_MODEL = "phi3:mini"
 ml_models = {}
 active_sessions = {}
 
-# --- FASTAPI LIFESPAN MANAGER (for chatbot models) ---
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+# --- BACKGROUND WARM-UP ---
+# On its own thread, so the chat is not held up by the forecast warm-up
+chat_warmup = Warmup('chatbot')
+
+
+@chat_warmup.task(name='chat_models')
+def build_chat_chains():
     print("--- Loading chatbot models and building chains ---")
-    
+    from langchain_chroma import Chroma
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_community.chat_models import ChatOllama
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema.output_parser import StrOutputParser
+
     # Initialize shared components for the chatbot
     llm = ChatOllama(model=LLM_MODEL)
     embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
     vectordb = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+    # One query loads the embedding weights and the collection's index before the first question
+    vectordb.similarity_search("warm-up", k=1)
     retriever = vectordb.as_retriever(search_kwargs={'k': 5})
 
     # --- 1. The Q&A Chain for StockPilot ---
@@ -128,7 +123,15 @@ async def lifespan(app: FastAPI):
     ml_models["router_chain"] = router_prompt | llm | StrOutputParser()
     
     print("--- Chatbot models loaded and ready ---")
+
+# --- FASTAPI LIFESPAN MANAGER ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    chat_warmup.start()
+    forecast_service.start()
     yield
+    chat_warmup.stop()
+    forecast_service.stop()
     ml_models.clear()
     active_sessions.clear()
 
@@ -141,6 +144,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Ready once the chat chains are; the forecast service's tasks (which need
+# MongoDB) are reported in /ready as optional
+forecast_service.mount(app, readiness=[(chat_warmup, None), (forecast_service.warmup, ())])
 
 # --- PYDANTIC MODELS ---
 class ChatRequest(BaseModel):
@@ -185,113 +191,3 @@ async def handle_chat(request: ChatRequest):
     active_sessions[session_id] = chat_history_list
     
     return ChatResponse(response=response_text, session_id=session_id)
-
-@app.get("/forecast")
-def get_general_forecast():
-    try:
-        print("Training GENERAL forecasting model on latest data...")
-        # Load sales and sale_items data
-        sales_df = pd.read_csv(os.path.join(parent_dir, 'sales.csv'))
-        sale_items_df = pd.read_csv(os.path.join(parent_dir, 'sale_items.csv'))
-        # Merge sale_items with sales to get sale_date for each item
-        merged = sale_items_df.merge(sales_df, left_on='sale_id', right_on='_id', how='left')
-        merged = merged.dropna(subset=['sale_date'])
-        merged['sale_date'] = pd.to_datetime(merged['sale_date'])
-        # Aggregate to daily total quantity
-        daily_sales = merged.groupby(merged['sale_date'].dt.date)['quantity'].sum().reset_index()
-        daily_sales.columns = ['ds', 'y']
-        daily_sales['ds'] = pd.to_datetime(daily_sales['ds'])
-        # Defensive: If not enough data, return error
-        if len(daily_sales) < 2:
-            return JSONResponse(content={"error": "Not enough sales data to train model."}, status_code=400)
-        # Train Prophet model on demand
-        from prophet import Prophet
-        model = Prophet(daily_seasonality=False, weekly_seasonality=True, yearly_seasonality=False)
-        model.fit(daily_sales)
-        # Calculate average price per unit
-        merged = merged.dropna(subset=['total_amount'])
-        total_quantity = merged['quantity'].sum()
-        total_revenue = merged['total_amount'].sum()
-        avg_price_per_unit = total_revenue / total_quantity if total_quantity > 0 else 0
-        # Forecast
-        future = model.make_future_dataframe(periods=7)
-        forecast = model.predict(future)
-        result = forecast.rename(columns={'ds': 'date', 'yhat': 'predicted_sales'})
-        result = result[['date', 'predicted_sales']].tail(7)
-        result['date'] = result['date'].dt.strftime('%Y-%m-%d')
-        result['predicted_sales'] = result['predicted_sales'].round().astype(int)
-        result['predicted_price'] = (result['predicted_sales'] * avg_price_per_unit).round(2)
-        return JSONResponse(content=result.to_dict('records'))
-    except FileNotFoundError:
-        return JSONResponse(content={"error": "Required sales data file not found."}, status_code=404)
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
-
-@app.get("/forecast/{product_id}")
-def get_product_forecast(product_id: str):
-    try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        python_executable = sys.executable
-        script_path = os.path.join(current_dir, "C:/Users/uday0/OneDrive/Desktop/code/HackForge/ai-services/product_forecaster.py") # Assumes script is in the same directory
-        
-        result = subprocess.run(
-            [python_executable, script_path, product_id],
-            capture_output=True, text=True, check=False
-        )
-        
-        if result.returncode != 0:
-            return JSONResponse(content={
-                "error": f"Failed to generate forecast for product {product_id}",
-                "details": result.stderr or result.stdout or "Unknown error in script"
-            }, status_code=500)
-        
-        return JSONResponse(content=json.loads(result.stdout.strip()))
-    except FileNotFoundError:
-        return JSONResponse(content={"error": "product_forecaster.py script not found."}, status_code=404)
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
-
-# In api.py
-
-@app.get("/reorder")
-def get_all_reorder_points():
-    try:
-        # Create an instance of the calculator
-        calculator = ReorderPointCalculator()
-        # Use the instance to call the method
-        results = calculator.calculate_all_reorder_points()
-        
-        reorder_needed_count = sum(1 for item in results if item['reorder_needed'])
-        
-        if 'convert_to_serializable' in globals() and results:
-            results = [{k: convert_to_serializable(v) for k, v in item.items()} for item in results]
-            
-        return JSONResponse(content={
-            "reorder_summary": {
-                "total_products": len(results),
-                "products_needing_reorder": reorder_needed_count
-            },
-            "reorder_points": results
-        })
-    except Exception as e:
-        traceback.print_exc()
-        return JSONResponse(content={"error": str(e)}, status_code=500)
-
-@app.get("/reorder/{product_id}")
-def get_product_reorder_point(product_id: str):
-    try:
-        # Create an instance of the calculator
-        calculator = ReorderPointCalculator()
-        # Use the instance to call the method
-        result = calculator.calculate_reorder_point(product_id)
-        
-        if 'error' in result:
-            return JSONResponse(content={"error": result['error']}, status_code=400)
-            
-        if 'convert_to_serializable' in globals():
-            result = {k: convert_to_serializable(v) for k, v in result.items()}
-            
-        return JSONResponse(content=result)
-    except Exception as e:
-        traceback.print_exc()
-        return JSONResponse(content={"error": str(e)}, status_code=500)
\ No newline at end of file
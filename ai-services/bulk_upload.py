@@ -0,0 +1,457 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pymongo import ReplaceOne, UpdateOne, DeleteMany
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from data_sources import get_data_source, COLLECTIONS
+from mongo_client import get_database, close_client, record_deletions, DEFAULT_DATABASE
+from sales_simulator import object_id_strings
+from mongo_indexes import ensure_indexes
+from sale_lines import refresh_sale_lines
+from stock_ledger import sync_stock_ledger, rebuild_stock_ledger
+from schema import FOREIGN_KEYS
+from validate_dataset import validate_dataset, print_issues
+
+# How _id values are handled:
+#   keep       - keep the CSV ids, stored as ObjectIds (upload_mongo_objectids.py)
+#   regenerate - assign fresh ObjectIds and remap foreign keys (upload_mongo_auto_ids.py)
+#   drop       - let MongoDB assign ids, foreign keys stay as strings (upload_mongo.py)
+ID_MODES = ['keep', 'regenerate', 'drop']
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Field holding the content hash of each source row, used by sync to find changed documents
+SYNC_HASH_FIELD = '_sync_hash'
+
+# Field holding the source row's own id (its CSV _id) in the id modes that do not
+# store it as _id. Sync matches documents to source rows on it, so it works in
+# every id mode.
+SOURCE_ID_FIELD = '_source_id'
+
+# Strings ObjectId accepts; anything else converts to None
+OBJECT_ID_PATTERN = r'[0-9a-fA-F]{24}'
+
+
+def to_object_ids(series):
+    """Convert a column of id strings to ObjectIds, converting each distinct value once"""
+    codes, uniques = pd.factorize(series)
+    strings = pd.Index(uniques).astype(str)
+    valid = np.asarray(strings.str.fullmatch(OBJECT_ID_PATTERN), dtype=bool)
+    # The last slot stays None: factorize marks missing values with -1
+    converted = np.full(len(uniques) + 1, None, dtype=object)
+    converted[:-1][valid] = list(map(ObjectId, strings[valid]))
+    return pd.Series(converted[codes], index=series.index)
+
+
+def content_hashes(df):
+    """64-bit hash of every row's content, excluding the ids and the stored hash"""
+    content = df.drop(columns=['_id', SYNC_HASH_FIELD, SOURCE_ID_FIELD], errors='ignore')
+    return pd.util.hash_pandas_object(content, index=False).to_numpy().view(np.int64)
+
+
+def clean_missing(df):
+    """Replace NaN/NaT with None column by column so MongoDB stores nulls"""
+    for column in df.columns:
+        missing = df[column].isna()
+        if missing.any() or pd.api.types.is_datetime64_any_dtype(df[column]):
+            values = df[column].astype(object)
+            values[missing.to_numpy()] = None
+            df[column] = values
+    return df
+
+
+class Checkpoint:
+    """Per-collection progress stored as JSON so an interrupted upload can resume"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.state = json.load(f)
+
+    def rows_done(self, collection):
+        return self.state.get(collection, {}).get('rows_done', 0)
+
+    def is_complete(self, collection):
+        return self.state.get(collection, {}).get('complete', False)
+
+    def update(self, collection, rows_done, complete=False, **counts):
+        with self.lock:
+            self.state[collection] = {'rows_done': rows_done, 'complete': complete, **counts}
+            if self.path:
+                with open(self.path, 'w') as f:
+                    json.dump(self.state, f, indent=2)
+
+
+def clear_checkpoint(path):
+    """Remove a checkpoint file and the id maps saved next to it"""
+    if os.path.exists(path):
+        os.remove(path)
+    for collection in COLLECTIONS:
+        id_map = os.path.join(os.path.dirname(path) or '.', f'{collection}_id_map.csv')
+        if os.path.exists(id_map):
+            os.remove(id_map)
+
+
+class BulkLoader:
+    """
+    Chunked, parallel loader for the StockPilot collections.
+
+    Ids are remapped with vectorized Series.map lookups, missing values are cleaned
+    column-wise, and documents are streamed with insert_many(ordered=False) in
+    chunks of CHUNK_SIZE. Since new ids are assigned before anything is inserted,
+    every collection is independent and the collections upload in parallel.
+
+    With sync=True nothing is cleared: source rows are diffed against the target by
+    their natural key - the source row's id, stored as _id in keep mode and as
+    _source_id otherwise - and content hash, and only the inserted, changed and
+    deleted documents are written with batched bulk_write calls.
+    """
+
+    def __init__(self, db, source, id_mode='keep', checkpoint_path=None, workers=4):
+        # Constants for the upload
+        self.CHUNK_SIZE = 5000  # Documents per insert_many call
+
+        if id_mode not in ID_MODES:
+            raise ValueError(f"Unknown id mode: {id_mode}")
+        self.db = db
+        self.source = source
+        self.id_mode = id_mode
+        self.workers = workers
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.id_maps = {}
+
+    def _id_map_path(self, collection):
+        if self.checkpoint.path is None:
+            return None
+        return os.path.join(os.path.dirname(self.checkpoint.path) or '.', f'{collection}_id_map.csv')
+
+    @property
+    def key_field(self):
+        """Target field matching a document to its source row"""
+        return '_id' if self.id_mode == 'keep' else SOURCE_ID_FIELD
+
+    def build_id_maps(self, frames, sync=False):
+        """
+        Assign new ObjectIds up front in regenerate mode. Maps are saved next to the
+        checkpoint so a resumed upload reuses the same ids. When syncing, rows that
+        are already stored keep the id they were given and only new rows get one.
+        """
+        if self.id_mode != 'regenerate':
+            return
+        for collection, df in frames.items():
+            if '_id' not in df.columns:
+                continue
+            path = self._id_map_path(collection)
+            if path and os.path.exists(path) and not sync:
+                saved = pd.read_csv(path, dtype=str)
+                self.id_maps[collection] = pd.Series(saved['new_id'].values, index=saved['old_id'].values)
+                continue
+            old_ids = df['_id'].astype(str).drop_duplicates()
+            stored = pd.Series(dtype=object)
+            if sync:
+                docs = self.db[collection].find({SOURCE_ID_FIELD: {'$exists': True}}, {SOURCE_ID_FIELD: 1})
+                stored = pd.Series({str(doc[SOURCE_ID_FIELD]): str(doc['_id']) for doc in docs}, dtype=object)
+            missing = old_ids[~old_ids.isin(stored.index)]
+            new_ids = pd.concat([stored, pd.Series(
+                object_id_strings(len(missing), int(time.time()), np.random.default_rng()),
+                index=missing.values, dtype=object
+            )])
+            self.id_maps[collection] = new_ids
+            if path and not sync:
+                pd.DataFrame({'old_id': new_ids.index, 'new_id': new_ids.values}).to_csv(path, index=False)
+
+    def prepare(self, collection, df):
+        """Remap and convert ids and clean missing values for one collection"""
+        df = df.copy()
+        foreign_keys = FOREIGN_KEYS.get(collection, {})
+        if '_id' in df.columns and SYNC_HASH_FIELD not in df.columns:
+            df[SYNC_HASH_FIELD] = content_hashes(df)
+        if self.id_mode != 'keep' and '_id' in df.columns:
+            df[SOURCE_ID_FIELD] = df['_id'].astype(str)
+
+        if self.id_mode == 'drop':
+            df = df.drop(columns=['_id'], errors='ignore')
+        else:
+            if self.id_mode == 'regenerate':
+                df['_id'] = df['_id'].astype(str).map(self.id_maps[collection])
+                for field, target in foreign_keys.items():
+                    if field in df.columns and target in self.id_maps:
+                        remapped = df[field].astype(str).map(self.id_maps[target])
+                        df[field] = remapped.fillna(df[field])
+                # Documents are created now, as in upload_mongo_auto_ids.py
+                now = pd.Timestamp.now()
+                for column in ['createdAt', 'updatedAt']:
+                    if column in df.columns:
+                        df[column] = now
+            df['_id'] = to_object_ids(df['_id'])
+            for field in foreign_keys:
+                if field in df.columns:
+                    df[field] = to_object_ids(df[field])
+
+        # float32 prices and percentages are widened back to the paisa they were recorded in
+        for column in df.columns:
+            if df[column].dtype == np.float32:
+                df[column] = df[column].astype(np.float64).round(2)
+
+        return clean_missing(df)
+
+    def upload_collection(self, collection, df):
+        """Clear one collection and stream it in chunks; returns the write counts"""
+        df = self.prepare(collection, df)
+        target = self.db[collection]
+        rows_done = self.checkpoint.rows_done(collection)
+        if rows_done == 0:
+            target.delete_many({})
+
+        inserted = 0
+        for start in range(rows_done, len(df), self.CHUNK_SIZE):
+            documents = df.iloc[start:start + self.CHUNK_SIZE].to_dict('records')
+            try:
+                result = target.insert_many(documents, ordered=False)
+                inserted += len(result.inserted_ids)
+            except BulkWriteError as e:
+                # A resumed chunk may already be partly stored - only duplicates are safe to skip.
+                # In drop mode MongoDB assigns the ids, so a resumed chunk is inserted again.
+                errors = e.details.get('writeErrors', [])
+                if any(error.get('code') != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+                inserted += e.details.get('nInserted', 0)
+            self.checkpoint.update(collection, min(start + self.CHUNK_SIZE, len(df)))
+
+        self.checkpoint.update(collection, len(df), complete=True)
+        return {'inserted': inserted}
+
+    def diff(self, collection, df):
+        """
+        Compare source rows with the target by natural key and content hash. Returns
+        (new rows, changed rows, keys of target documents missing from the source).
+        Documents stored without a key, e.g. by an upload from before keys were
+        recorded, are missing from the source too - their key is None.
+        """
+        key = self.key_field
+        # Nullable integers keep the hashes exact through the outer merge
+        source = pd.DataFrame({'key': df['_id'].astype(str).to_numpy(), 'hash': pd.array(content_hashes(df), dtype='Int64')})
+        stored = list(self.db[collection].find({}, {key: 1, SYNC_HASH_FIELD: 1}))
+        target = pd.DataFrame({
+            'key': pd.Series([str(doc[key]) if doc.get(key) is not None else None for doc in stored], dtype=object),
+            'stored_hash': pd.array([doc.get(SYNC_HASH_FIELD) for doc in stored], dtype='Int64')
+        })
+        unkeyed = int(target['key'].isna().sum())
+        target = target.dropna(subset=['key'])
+
+        merged = source.merge(target, on='key', how='outer', indicator=True)
+        in_source = merged['_merge'] != 'right_only'
+        new_keys = merged.loc[merged['_merge'] == 'left_only', 'key']
+        # Documents without a stored hash were written by something else and are replaced
+        changed = (merged['_merge'] == 'both') & (merged['hash'] != merged['stored_hash']).fillna(True)
+        changed_keys = merged.loc[changed, 'key']
+        deleted_keys = merged.loc[~in_source, 'key'].tolist() + [None] * unkeyed
+
+        ids = df['_id'].astype(str)
+        return df[ids.isin(new_keys).to_numpy()], df[ids.isin(changed_keys).to_numpy()], deleted_keys
+
+    def upsert(self, document):
+        """The write storing one prepared document over the one with the same natural key"""
+        key = self.key_field
+        if self.id_mode == 'regenerate':
+            # A stored document keeps the id and creation time it was first given
+            on_insert = {field: document.pop(field) for field in ('_id', 'createdAt') if field in document}
+            return UpdateOne({key: document[key]}, {'$set': document, '$setOnInsert': on_insert}, upsert=True)
+        return ReplaceOne({key: document[key]}, document, upsert=True)
+
+    def delete(self, collection, query):
+        """
+        Delete the documents matching query, recording a tombstone for each so
+        sale_lines and the stock ledger catch up without comparing every id
+        """
+        document_ids = [doc['_id'] for doc in self.db[collection].find(query, {'_id': 1})]
+        if document_ids:
+            self.db[collection].bulk_write([DeleteMany({'_id': {'$in': document_ids}})], ordered=False)
+            record_deletions(self.db, collection, document_ids)
+
+    def sync_collection(self, collection, df):
+        """
+        Apply only the differences between the source and one collection; returns the
+        write counts. New and changed documents are upserted before anything is
+        deleted, so readers never see a cleared collection, and re-running after a
+        failure simply finds the writes that are still missing.
+
+        Written documents get updatedAt set to the time of the sync, as the
+        backend's timestamps do, so the jobs that follow updatedAt watermarks
+        (sale_lines, the stock ledger) pick the changes up.
+        """
+        target = self.db[collection]
+        key = self.key_field
+        new_rows, changed_rows, deleted_keys = self.diff(collection, df)
+        counts = {
+            'inserted': len(new_rows),
+            'updated': len(changed_rows),
+            'deleted': len(deleted_keys),
+            'unchanged': len(df) - len(new_rows) - len(changed_rows)
+        }
+
+        upserts = self.prepare(collection, pd.concat([new_rows, changed_rows]))
+        upserts['updatedAt'] = pd.Timestamp.now('UTC').tz_localize(None).to_pydatetime()
+        rows_done = 0
+        for start in range(0, len(upserts), self.CHUNK_SIZE):
+            documents = upserts.iloc[start:start + self.CHUNK_SIZE].to_dict('records')
+            target.bulk_write([self.upsert(doc) for doc in documents], ordered=False)
+            rows_done += len(documents)
+            self.checkpoint.update(collection, rows_done, **counts)
+
+        unkeyed = deleted_keys.count(None)
+        deleted_keys = [value for value in deleted_keys if value is not None]
+        if key == '_id':
+            deleted_keys = to_object_ids(pd.Series(deleted_keys, dtype=object)).tolist()
+        for start in range(0, len(deleted_keys), self.CHUNK_SIZE):
+            query = {key: {'$in': deleted_keys[start:start + self.CHUNK_SIZE]}}
+            self.delete(collection, query)
+            rows_done += len(deleted_keys[start:start + self.CHUNK_SIZE])
+            self.checkpoint.update(collection, rows_done, **counts)
+        if unkeyed:
+            # Replaced by the keyed documents upserted above
+            self.delete(collection, {key: None})
+            rows_done += unkeyed
+            self.checkpoint.update(collection, rows_done, **counts)
+
+        self.checkpoint.update(collection, rows_done, complete=True, **counts)
+        return counts
+
+    def run(self, collections=None, sync=False):
+        """Upload or sync all collections in parallel and report throughput"""
+        collections = [c for c in (collections or COLLECTIONS) if not self.checkpoint.is_complete(c)]
+        frames = {}
+        for collection in collections:
+            try:
+                frames[collection] = self.source.load(collection)
+            except FileNotFoundError:
+                print(f"⚠️ File not found for {collection}, skipping")
+
+        # Remapping needs the ids of every referenced collection, even completed ones
+        if self.id_mode == 'regenerate':
+            referenced = {t for c in frames for t in FOREIGN_KEYS.get(c, {}).values()} - set(frames)
+            id_frames = dict(frames)
+            for collection in referenced:
+                try:
+                    id_frames[collection] = self.source.load(collection, columns=['_id'])
+                except FileNotFoundError:
+                    pass
+            self.build_id_maps(id_frames, sync=sync)
+
+        task = self.sync_collection if sync else self.upload_collection
+
+        def timed(collection, df):
+            start_time = time.perf_counter()
+            counts = task(collection, df)
+            return counts, time.perf_counter() - start_time
+
+        total_start = time.perf_counter()
+        total_documents = 0
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(timed, collection, df): collection for collection, df in frames.items()}
+            for future in as_completed(futures):
+                collection = futures[future]
+                try:
+                    counts, seconds = future.result()
+                    written = counts['inserted'] + counts.get('updated', 0) + counts.get('deleted', 0)
+                    total_documents += written
+                    rate = written / seconds if seconds > 0 else 0
+                    if sync:
+                        print(
+                            f"✅ Synced '{collection}': {counts['inserted']} inserted, {counts['updated']} updated, "
+                            f"{counts['deleted']} deleted, {counts['unchanged']} unchanged in {seconds:.2f}s ({rate:,.0f} docs/sec)"
+                        )
+                    else:
+                        print(f"✅ Uploaded {written} documents to '{collection}' in {seconds:.2f}s ({rate:,.0f} docs/sec)")
+                except Exception as e:
+                    failed.append(collection)
+                    print(f"❌ Error uploading {collection}: {e}")
+                    traceback.print_exc()
+
+        elapsed = time.perf_counter() - total_start
+        rate = total_documents / elapsed if elapsed > 0 else 0
+        print(f"\n📊 {total_documents} documents in {elapsed:.2f}s ({rate:,.0f} docs/sec)")
+        if failed:
+            print(f"⚠️ Failed collections: {', '.join(failed)}. Re-run with --resume to continue.")
+        return not failed
+
+
+def main(default_database=DEFAULT_DATABASE, default_id_mode='keep'):
+    parser = argparse.ArgumentParser(description="Bulk-load the StockPilot collections into MongoDB.")
+    parser.add_argument("--database", type=str, default=default_database, help="Target database name.")
+    parser.add_argument("--id-mode", choices=ID_MODES, default=default_id_mode, help="How _id values are handled.")
+    parser.add_argument("--source", choices=["csv", "parquet"], default="csv", help="Where to read the collections from.")
+    parser.add_argument("--input-dir", type=str, default=None, help="Directory of the CSV files or Parquet snapshot.")
+    parser.add_argument("--collections", nargs="+", choices=COLLECTIONS, default=None, help="Only upload these collections.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Documents per insert_many call.")
+    parser.add_argument("--workers", type=int, default=4, help="Collections uploaded in parallel.")
+    parser.add_argument("--checkpoint", type=str, default="upload_checkpoint.json", help="Progress file used to resume.")
+    parser.add_argument("--resume", action="store_true", help="Continue a previous upload from its checkpoint.")
+    parser.add_argument("--sync", action="store_true", help="Write only new, changed and deleted documents instead of reloading.")
+    parser.add_argument("--skip-validation", action="store_true", help="Upload without checking references, duplicates and ranges first.")
+    args = parser.parse_args()
+
+    if not args.resume:
+        clear_checkpoint(args.checkpoint)
+
+    source_kwargs = {'base_dir': args.input_dir} if args.input_dir else {}
+    source = get_data_source(args.source, **source_kwargs)
+
+    # Refuse to upload data with broken references before anything is written
+    if not args.skip_validation:
+        issues = validate_dataset(source, args.collections)
+        print_issues(issues)
+        if issues:
+            print("Fix the data or rerun with --skip-validation.")
+            exit(1)
+
+    try:
+        db = get_database(args.database)
+        db.command('ping')
+        print("✅ Connected to MongoDB Atlas successfully!")
+    except Exception as e:
+        print(f"Error connecting to MongoDB: {e}")
+        exit(1)
+
+    loader = BulkLoader(db, source, id_mode=args.id_mode,
+                        checkpoint_path=args.checkpoint, workers=args.workers)
+    loader.CHUNK_SIZE = args.chunk_size
+    success = loader.run(args.collections, sync=args.sync)
+    created = ensure_indexes(db)
+    if created:
+        print(f"✅ Created indexes: {', '.join(created)}")
+
+    # Keep the materialized sale_lines in step - a full reload rebuilds them, a
+    # sync only picks up the sales and sale items changed since the last refresh
+    if success and set(args.collections or COLLECTIONS) & {'sales', 'sale_items', 'product_batches'}:
+        counts = refresh_sale_lines(db, rebuild=not args.sync)
+        print(f"✅ Refreshed {counts['lines']} sale lines")
+    # The stock ledger is appended to by a sync and recorded again after a reload
+    if success and set(args.collections or COLLECTIONS) & {'purchases', 'purchase_items', 'sales', 'sale_items', 'product_batches'}:
+        counts = sync_stock_ledger(db) if args.sync else rebuild_stock_ledger(db)
+        if counts.get('skipped'):
+            print("⚠️ Another process is syncing the stock ledger - it will pick up these changes")
+        else:
+            print(f"✅ Appended {counts['movements']} stock movements")
+
+    close_client()
+    if success:
+        clear_checkpoint(args.checkpoint)
+        print("\n🎉 All data has been uploaded. Connection closed.")
+    else:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
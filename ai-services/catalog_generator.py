@@ -0,0 +1,284 @@
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import time
+from multiprocessing import Pool
+from faker import Faker
+from sales_simulator import object_id_strings, mongo_timestamps
+
+# Vocabulary used to build product names without per-row Faker calls
+BRANDS = np.array(['Pedigree', 'Whiskas', 'Drools', 'Royal Canin', 'Himalaya', 'Purina', 'Farmina',
+                   'Meat Up', 'Taiyo', 'Optimum', 'Bluepet', 'Trixie', 'Kong', 'Me-O', 'Sheba'])
+PRODUCT_LINES = np.array(['Adult', 'Puppy', 'Kitten', 'Senior', 'Chicken & Veg', 'Oceanfish', 'Lamb & Rice',
+                          'Dental Chew', 'Shampoo', 'Collar', 'Leash', 'Fish Net', 'Filter', 'Tick Spray', 'Treats'])
+VARIANTS = np.array(['Classic', 'Premium', 'Grain Free', 'Large Breed', 'Small Breed', 'Indoor', 'Active', 'Lite'])
+SIZES = np.array(['100 G', '400 G', '800 G', '1.2 Kg', '2.8 Kg', '3 Kg', '10 Kg', '15 Kg', 'Small', 'Medium', 'Large'])
+CATEGORIES = np.array(['Pet Supplies', 'Pet Food', 'Aquarium', 'Grooming', 'Toys', 'Health Care'])
+PAYMENT_TERMS = np.array(['Net 15', 'Net 30', 'Net 60'])
+PAYMENT_STATUSES = np.array(['Paid', 'Pending'])
+
+
+UPPERCASE = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+
+
+def bothify(rng, count, pattern):
+    """Vectorized Faker.bothify: '#' becomes a digit and '?' an uppercase letter"""
+    result = np.full(count, '', dtype=f'<U{len(pattern)}')
+    for char in pattern:
+        if char == '#':
+            result = np.char.add(result, rng.integers(0, 10, size=count).astype(str))
+        elif char == '?':
+            result = np.char.add(result, UPPERCASE[rng.integers(0, len(UPPERCASE), size=count)])
+        else:
+            result = np.char.add(result, char)
+    return result
+
+
+def gst_numbers(rng, count):
+    """GST numbers for roughly 30% of rows, empty strings for the rest"""
+    return np.where(rng.random(count) > 0.7, bothify(rng, count, '##AAAAA####A#Z#'), '')
+
+
+def name_pools(seed):
+    """Small pools of realistic names and addresses, combined vectorized per chunk"""
+    fake = Faker('en_IN')
+    fake.seed_instance(seed)
+    return {
+        'first_names': np.array([fake.first_name() for _ in range(300)]),
+        'last_names': np.array([fake.last_name() for _ in range(300)]),
+        'streets': np.array([fake.street_name() for _ in range(300)]),
+        'cities': np.array([fake.city() for _ in range(200)]),
+        'companies': np.array([fake.company() for _ in range(300)])
+    }
+
+
+def addresses(rng, pools, count):
+    """'<house>, <street>, <city> <pin>' addresses"""
+    house = rng.integers(1, 999, size=count).astype(str)
+    street = pools['streets'][rng.integers(0, len(pools['streets']), size=count)]
+    city = pools['cities'][rng.integers(0, len(pools['cities']), size=count)]
+    pin = rng.integers(110001, 855999, size=count).astype(str)
+    return np.char.add(np.char.add(np.char.add(np.char.add(house, ', '), street), np.char.add(', ', city)), np.char.add(' ', pin))
+
+
+def phones(rng, count):
+    return np.char.add('+91', rng.integers(6000000000, 9999999999, size=count).astype(str))
+
+
+def generate_vendors(num_vendors, pools, created_at, rng):
+    names = pools['companies'][rng.integers(0, len(pools['companies']), size=num_vendors)]
+    names = np.char.add(np.char.add(names, ' #'), np.arange(1, num_vendors + 1).astype(str))
+    handles = np.char.lower(np.char.replace(np.char.partition(names, ' ')[:, 0], '.', ''))
+    return pd.DataFrame({
+        '_id': object_id_strings(num_vendors, created_at, rng),
+        'vendor_name': names,
+        'phone': phones(rng, num_vendors),
+        'email': np.char.add(np.char.add(np.char.add('contact@', handles), np.arange(num_vendors).astype(str)), '.com'),
+        'address': addresses(rng, pools, num_vendors),
+        'gst_number': gst_numbers(rng, num_vendors),
+        'payment_terms': rng.choice(PAYMENT_TERMS, size=num_vendors),
+        'createdAt': mongo_timestamps(np.full(num_vendors, np.datetime64(created_at, 's'))),
+        'updatedAt': mongo_timestamps(np.full(num_vendors, np.datetime64(created_at, 's'))),
+        '__v': 0
+    })
+
+
+def generate_customer_chunk(task):
+    """Worker: one chunk of customers"""
+    count, seed_sequence, pools, created_at = task
+    rng = np.random.default_rng(seed_sequence)
+    first = pools['first_names'][rng.integers(0, len(pools['first_names']), size=count)]
+    last = pools['last_names'][rng.integers(0, len(pools['last_names']), size=count)]
+    handle = np.char.lower(np.char.add(np.char.add(first, '.'), last))
+    timestamp = mongo_timestamps(np.full(count, np.datetime64(created_at, 's')))
+    return {'customers': pd.DataFrame({
+        '_id': object_id_strings(count, created_at, rng),
+        'customer_name': np.char.add(np.char.add(first, ' '), last),
+        'phone': phones(rng, count),
+        'email': np.char.add(np.char.add(handle, rng.integers(1, 9999, size=count).astype(str)), '@example.com'),
+        'address': addresses(rng, pools, count),
+        'gst_number': gst_numbers(rng, count),
+        'createdAt': timestamp,
+        'updatedAt': timestamp,
+        '__v': 0
+    })}
+
+
+def generate_product_chunk(task):
+    """
+    Worker: one chunk of products with their batches, purchase items and purchases.
+
+    Batches are received on purchases grouped by (vendor, delivery week) within the
+    chunk, mirroring the consolidated vendor orders in generate_initial.py.
+    """
+    count, seed_sequence, vendor_ids, batches_per_product, history_days, created_at = task
+    rng = np.random.default_rng(seed_sequence)
+    created_seconds = np.datetime64(created_at, 's')
+    created_timestamps = mongo_timestamps(np.full(count, created_seconds))
+
+    # --- Products ---
+    product_ids = object_id_strings(count, created_at, rng)
+    names = np.char.add(np.char.add(BRANDS[rng.integers(0, len(BRANDS), size=count)], ' '),
+                        PRODUCT_LINES[rng.integers(0, len(PRODUCT_LINES), size=count)])
+    names = np.char.add(np.char.add(names, ' '), VARIANTS[rng.integers(0, len(VARIANTS), size=count)])
+    names = np.char.add(np.char.add(names, ' '), SIZES[rng.integers(0, len(SIZES), size=count)])
+    products = pd.DataFrame({
+        '_id': product_ids,
+        'product_name': names,
+        'category': rng.choice(CATEGORIES, size=count),
+        'hsn_code': bothify(rng, count, '####.##.##'),
+        'description': np.char.add(np.char.add('High-quality ', names), ' for pets.'),
+        'createdAt': created_timestamps,
+        'updatedAt': created_timestamps,
+        '__v': 0
+    })
+
+    # --- Product batches ---
+    num_batches = count * batches_per_product
+    product_index = np.repeat(np.arange(count), batches_per_product)
+    product_vendor = vendor_ids[rng.integers(0, len(vendor_ids), size=count)]
+    product_mrp = np.round(np.exp(rng.uniform(np.log(25), np.log(3000), size=count))).astype(np.int64)
+    # Vendors deliver weekly, so batches of a vendor share a purchase per week
+    purchase_day = created_seconds.astype('datetime64[D]') - rng.integers(1, history_days + 1, size=num_batches)
+    purchase_day = purchase_day - (purchase_day.astype(np.int64) % 7)
+    quantity = rng.integers(20, 121, size=num_batches)
+    mrp = product_mrp[product_index]
+    expiry = purchase_day + rng.integers(180, 501, size=num_batches)
+    expiry_strings = np.where(rng.random(num_batches) < 0.2, '', mongo_timestamps(expiry))
+    batch_ids = object_id_strings(num_batches, created_at, rng)
+    batch_timestamps = mongo_timestamps(np.full(num_batches, created_seconds))
+    batches = pd.DataFrame({
+        '_id': batch_ids,
+        'product_id': product_ids[product_index],
+        'batch_number': bothify(rng, num_batches, 'BN-?#?#?#'),
+        'barcode': '',
+        'expiry_date': expiry_strings,
+        'mrp': mrp,
+        'quantity_in_stock': quantity,
+        'createdAt': batch_timestamps,
+        'updatedAt': batch_timestamps,
+        '__v': 0
+    })
+
+    # --- Purchases: one per (vendor, delivery week) in the chunk ---
+    batch_vendor = product_vendor[product_index]
+    group_keys = pd.MultiIndex.from_arrays([batch_vendor, purchase_day])
+    group_codes, group_index = pd.factorize(group_keys)
+    num_purchases = len(group_index)
+    purchase_ids = object_id_strings(num_purchases, created_at, rng)
+
+    purchase_rate = np.round(mrp * rng.uniform(0.6, 0.8, size=num_batches), 2)
+    tax = rng.choice([5, 12, 18], size=num_batches)
+    discount = rng.choice([0, 5, 10], size=num_batches)
+    line_total = quantity * purchase_rate * (1 + tax / 100) * (1 - discount / 100)
+
+    purchase_items = pd.DataFrame({
+        '_id': object_id_strings(num_batches, created_at, rng),
+        'purchase_id': purchase_ids[group_codes],
+        'batch_id': batch_ids,
+        'quantity': quantity,
+        'purchase_rate': purchase_rate,
+        'tax_percent': tax,
+        'discount_percent': discount,
+        'createdAt': batch_timestamps,
+        'updatedAt': batch_timestamps,
+        '__v': 0
+    })
+
+    purchase_dates = group_index.get_level_values(1).to_numpy().astype('datetime64[s]')
+    purchase_dates = purchase_dates + rng.integers(0, 86400, size=num_purchases).astype('timedelta64[s]')
+    purchase_timestamps = mongo_timestamps(np.full(num_purchases, created_seconds))
+    purchases = pd.DataFrame({
+        '_id': purchase_ids,
+        'vendor_id': group_index.get_level_values(0).to_numpy(),
+        'bill_no': np.char.add('INV-', rng.integers(1000, 9999, size=num_purchases).astype(str)),
+        'purchase_date': mongo_timestamps(purchase_dates),
+        'total_amount': np.round(np.bincount(group_codes, weights=line_total, minlength=num_purchases), 2),
+        'payment_status': rng.choice(PAYMENT_STATUSES, size=num_purchases),
+        'createdAt': purchase_timestamps,
+        'updatedAt': purchase_timestamps,
+        '__v': 0
+    })
+
+    return {'products': products, 'product_batches': batches, 'purchases': purchases, 'purchase_items': purchase_items}
+
+
+class CatalogWriter:
+    """Appends chunk frames to one CSV per collection so memory stays flat"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.rows = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, frames):
+        for collection, frame in frames.items():
+            path = os.path.join(self.output_dir, f'{collection}.csv')
+            first = collection not in self.rows
+            frame.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+            self.rows[collection] = self.rows.get(collection, 0) + len(frame)
+
+
+def chunk_sizes(total, chunk_size):
+    return [min(chunk_size, total - start) for start in range(0, total, chunk_size)]
+
+
+def generate_catalog(num_vendors, num_customers, num_products, batches_per_product, history_days,
+                     output_dir='.', chunk_size=10000, workers=None, seed=None, created_at='2025-09-26T00:00:00'):
+    """
+    Generate a synthetic catalog in the MongoDB CSV schema.
+
+    Customers and products are generated in parallel chunks, each with its own
+    child seed so the output does not depend on the number of workers, and every
+    chunk is appended to disk as soon as it is ready.
+    """
+    seed_sequence = np.random.SeedSequence(seed)
+    vendor_seed, customer_seed, product_seed = seed_sequence.spawn(3)
+    created_epoch = int(np.datetime64(created_at, 's').astype(np.int64))
+    pools = name_pools(int(vendor_seed.generate_state(1)[0]))
+    writer = CatalogWriter(output_dir)
+
+    df_vendors = generate_vendors(num_vendors, pools, created_epoch, np.random.default_rng(vendor_seed))
+    writer.write({'vendors': df_vendors})
+    vendor_ids = df_vendors['_id'].to_numpy()
+
+    customer_sizes = chunk_sizes(num_customers, chunk_size)
+    customer_tasks = [(size, child, pools, created_epoch)
+                      for size, child in zip(customer_sizes, customer_seed.spawn(len(customer_sizes)))]
+    product_sizes = chunk_sizes(num_products, chunk_size)
+    product_tasks = [(size, child, vendor_ids, batches_per_product, history_days, created_epoch)
+                     for size, child in zip(product_sizes, product_seed.spawn(len(product_sizes)))]
+
+    with Pool(processes=workers) as pool:
+        for frames in pool.imap(generate_customer_chunk, customer_tasks):
+            writer.write(frames)
+        for frames in pool.imap(generate_product_chunk, product_tasks):
+            writer.write(frames)
+
+    return writer.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large synthetic catalog for benchmarks.")
+    parser.add_argument("--vendors", type=int, default=100, help="Number of vendors.")
+    parser.add_argument("--customers", type=int, default=10000, help="Number of customers.")
+    parser.add_argument("--products", type=int, default=100000, help="Number of products.")
+    parser.add_argument("--batches-per-product", type=int, default=3, help="Batches received per product.")
+    parser.add_argument("--history-days", type=int, default=365, help="Days of purchase history.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows generated per chunk.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible datasets.")
+    parser.add_argument("--output-dir", type=str, default=".", help="Directory for the CSV files.")
+    args = parser.parse_args()
+
+    print("🚀 Starting Large Catalog Generation with MongoDB Schema...")
+    start_time = time.perf_counter()
+    rows = generate_catalog(
+        args.vendors, args.customers, args.products, args.batches_per_product, args.history_days,
+        output_dir=args.output_dir, chunk_size=args.chunk_size, workers=args.workers, seed=args.seed
+    )
+    for collection, count in rows.items():
+        print(f"✅ Created {collection}.csv with {count} rows")
+    print(f"\n🎉 Catalog generation complete in {time.perf_counter() - start_time:.2f}s!")
+    print("Run 'generate_sales.py' to simulate transactions.")
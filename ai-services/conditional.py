@@ -0,0 +1,303 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger("conditional")
+
+DEFAULT_MAX_ENTRIES = 256
+
+# Response header saying how the body was produced: hit, miss, stale or revalidated (304)
+CACHE_HEADER = 'X-StockPilot-Cache'
+
+# Code the reorder and product forecast results depend on: their modification
+# times version the model unless STOCKPILOT_MODEL_VERSION is set
+MODEL_FILES = ('product_forecaster.py', 'reorder_point_calculator.py', 'training_window.py',
+               'stock_index.py', 'stock_ledger.py')
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Version:
+    """
+    Version of a result: a weak ETag built from everything the result depends
+    on, and the newest modification time among them for Last-Modified.
+    """
+
+    def __init__(self, *parts, last_modified=None):
+        self.tag = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+        self.last_modified = _utc(last_modified) if last_modified is not None else None
+
+    def etag(self, variant=None):
+        # Weak: the same version is sent gzip- or Brotli-compressed
+        return f'W/"{self.tag}-{variant}"' if variant else f'W/"{self.tag}"'
+
+    def headers(self, variant=None):
+        headers = {'ETag': self.etag(variant), 'Cache-Control': 'no-cache'}
+        if self.last_modified is not None:
+            headers['Last-Modified'] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def newest_time(*values):
+    """Newest of the datetimes and ObjectId creation times among values (nested in tuples), or None"""
+    times = []
+    for value in values:
+        if isinstance(value, (tuple, list)):
+            newest = newest_time(*value)
+            if newest is not None:
+                times.append(newest)
+        elif isinstance(value, datetime):
+            times.append(_utc(value))
+        elif hasattr(value, 'generation_time'):
+            times.append(_utc(value.generation_time))
+    return max(times) if times else None
+
+
+def _today():
+    """Start of today - the training windows move at midnight"""
+    return datetime.combine(date.today(), time()).astimezone(timezone.utc)
+
+
+def model_version():
+    """STOCKPILOT_MODEL_VERSION, or the modification times of the model code"""
+    if os.environ.get('STOCKPILOT_MODEL_VERSION'):
+        return os.environ['STOCKPILOT_MODEL_VERSION']
+    stats = []
+    for name in MODEL_FILES:
+        path = os.path.join(_BASE_DIR, name)
+        if os.path.exists(path):
+            stats.append((name, os.stat(path).st_mtime_ns))
+    return tuple(stats)
+
+
+def _model_time():
+    if os.environ.get('STOCKPILOT_MODEL_VERSION'):
+        return None
+    times = [os.stat(os.path.join(_BASE_DIR, name)).st_mtime for name in MODEL_FILES
+             if os.path.exists(os.path.join(_BASE_DIR, name))]
+    return datetime.fromtimestamp(max(times), timezone.utc) if times else None
+
+
+def _product_query_id(product_id):
+    from bson import ObjectId
+    return ObjectId(product_id) if isinstance(product_id, str) and ObjectId.is_valid(product_id) else product_id
+
+
+def _data_version(db, kind, product_id, watermarks):
+    """
+    Last-Modified comes from stored change times only - the updatedAt of the
+    watermarks and when a refresh last changed sale_lines - never from _id
+    creation times, which miss deletes and in-place updates.
+    """
+    from sale_lines import sale_lines_changed_at
+    changed = [watermark[3] for watermark in watermarks] + [sale_lines_changed_at(db)]
+    return Version(kind, product_id, watermarks, date.today().isoformat(), model_version(),
+                   last_modified=newest_time(changed, _today(), _model_time()))
+
+
+def product_forecast_version(product_id):
+    """Version of a product's forecast: its sale lines and batches, the day and the model"""
+    from mongo_client import get_database, find_watermark
+    db = get_database()
+    query_id = _product_query_id(product_id)
+    watermarks = (find_watermark(db, 'sale_lines', {'product_id': query_id}),
+                  find_watermark(db, 'product_batches', {'product_id': query_id}))
+    return _data_version(db, 'product_forecast', str(product_id), watermarks)
+
+
+def reorder_version(product_id=None):
+    """Version of the reorder point of one product, or of all products"""
+    from mongo_client import get_database, find_watermark
+    db = get_database()
+    if product_id is None:
+        watermarks = tuple(find_watermark(db, collection) for collection in ('sale_lines', 'product_batches', 'products'))
+    else:
+        query_id = _product_query_id(product_id)
+        watermarks = (find_watermark(db, 'sale_lines', {'product_id': query_id}),
+                      find_watermark(db, 'product_batches', {'product_id': query_id}),
+                      find_watermark(db, 'products', {'_id': query_id}))
+    return _data_version(db, 'reorder', str(product_id) if product_id is not None else None, watermarks)
+
+
+def file_version(path):
+    """Version of a result computed from one file, such as a saved model"""
+    stat = os.stat(path)
+    return Version('file', os.path.abspath(path), stat.st_mtime_ns, stat.st_size,
+                   last_modified=datetime.fromtimestamp(stat.st_mtime, timezone.utc))
+
+
+def _matches(if_none_match, etag):
+    # Weak comparison, as HTTP requires for If-None-Match
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return any((tag[2:] if tag.startswith('W/') else tag) == bare for tag in tags)
+
+
+def _not_modified_since(if_modified_since, last_modified):
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= _utc(since)
+
+
+def request_conditions(headers):
+    """The conditional-request arguments of ConditionalCache.get from request headers"""
+    cache_control = (headers.get('Cache-Control') or '').lower()
+    return {
+        'if_none_match': headers.get('If-None-Match'),
+        'if_modified_since': headers.get('If-Modified-Since'),
+        # max-stale: the client accepts a stale response (served while a refresh runs)
+        'allow_stale': 'max-stale' in cache_control or None
+    }
+
+
+class ConditionalResult:
+    """What to answer: status 304 (no body) or 200 with result, and the headers to send"""
+
+    def __init__(self, status, result, headers):
+        self.status = status
+        self.result = result
+        self.headers = headers
+
+
+class ConditionalCache:
+    """
+    Conditional responses for results that are expensive to compute but cheap
+    to version.
+
+    get() first computes the current Version from the data watermarks. A
+    request whose If-None-Match (or If-Modified-Since) matches it is answered
+    304 without computing anything; a result cached under the same version is
+    served again; otherwise it is computed and cached. In stale-while-revalidate
+    mode - STOCKPILOT_STALE_WHILE_REVALIDATE=1, or per request with
+    Cache-Control: max-stale - a result cached under an older version is served
+    at once while a background thread computes the new one. Holds the results
+    of the most recent max_entries keys. Lookups are counted in CACHE_REQUESTS
+    under name, by the CACHE_HEADER value.
+    """
+
+    def __init__(self, max_entries=None, stale_while_revalidate=None, name='responses'):
+        if max_entries is None:
+            max_entries = int(os.environ.get('STOCKPILOT_RESPONSE_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+        if stale_while_revalidate is None:
+            stale_while_revalidate = os.environ.get('STOCKPILOT_STALE_WHILE_REVALIDATE', '0') not in ('', '0', 'false')
+        self.name = name
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self._entries = OrderedDict()
+        # key -> (version tag, when this cache first saw it)
+        self._seen = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, version, result):
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _observed(self, key, version):
+        """
+        The version with Last-Modified no earlier than when this cache first saw
+        its tag, and later than the Last-Modified sent for the key's previous
+        tag. A change the stored times miss (a delete) still moves it forward,
+        so If-Modified-Since cannot match a result that changed.
+        """
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is None or seen[0] != version.tag:
+                floor = now if seen is None else max(now, seen[1] + timedelta(seconds=1))
+                seen = self._seen[key] = (version.tag, floor)
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            if version.last_modified is None or version.last_modified < seen[1]:
+                version.last_modified = seen[1]
+            else:
+                # Later responses for this tag send the same time
+                self._seen[key] = (version.tag, version.last_modified)
+        return version
+
+    def _refresh(self, key, version, compute, cacheable):
+        try:
+            result = compute()
+            if cacheable is None or cacheable(result):
+                self._store(key, version, result)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key, version, compute, cacheable):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, version, compute, cacheable),
+                         name='conditional-refresh', daemon=True).start()
+
+    def get(self, key, version_fn, compute, if_none_match=None, if_modified_since=None,
+            allow_stale=None, cacheable=None, variant=None):
+        """
+        Answer a request for the result under key. compute() produces the result
+        and is only called on a miss; results failing cacheable(result) are
+        returned but not cached. variant (e.g. the response shape) distinguishes
+        representations of the same result in the ETag.
+        """
+        version = self._observed(key, version_fn())
+        entry = self._lookup(key)
+        state = 'miss'
+        if entry is not None and entry[0].tag == version.tag:
+            state = 'hit'
+        elif entry is not None and (self.stale_while_revalidate if allow_stale is None else allow_stale):
+            state = 'stale'
+            self._refresh_in_background(key, version, compute, cacheable)
+            version = entry[0]
+
+        headers = version.headers(variant)
+        if _matches(if_none_match, headers['ETag']) or (
+                if_none_match is None and _not_modified_since(if_modified_since, version.last_modified)):
+            headers[CACHE_HEADER] = 'revalidated'
+            CACHE_REQUESTS.inc(cache=self.name, result='revalidated')
+            return ConditionalResult(304, None, headers)
+
+        if state == 'miss':
+            result = compute()
+            if cacheable is None or cacheable(result):
+                self._store(key, version, result)
+        else:
+            result = entry[1]
+        headers[CACHE_HEADER] = state
+        CACHE_REQUESTS.inc(cache=self.name, result=state)
+        return ConditionalResult(200, result, headers)
+
+
+# Process-wide cache of the forecast and reorder responses
+responses = ConditionalCache()
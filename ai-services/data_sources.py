@@ -0,0 +1,344 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+import time
+
+# Try importing optional backends - handle gracefully if not available
+try:
+    from bson import ObjectId
+except ImportError:
+    ObjectId = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from mongo_client import get_database, DEFAULT_DATABASE
+from schema import apply_schema, csv_dtypes, parse_timestamps, timestamp_columns
+
+logger = logging.getLogger("data_sources")
+
+COLLECTIONS = [
+    'vendors',
+    'customers',
+    'products',
+    'product_batches',
+    'purchases',
+    'purchase_items',
+    'sales',
+    'sale_items'
+]
+
+# Collections materialized from the ones above
+DERIVED_COLLECTIONS = ['sale_lines']
+
+# Columns holding dates in each collection
+DATE_COLUMNS = timestamp_columns()
+
+# Collections partitioned by month in Parquet snapshots: collection -> date column
+MONTH_PARTITIONS = {'sales': 'sale_date', 'sale_lines': 'sale_date'}
+PARTITION_COLUMN = 'month'
+
+
+def normalize_frame(df, collection=None):
+    """
+    Give every backend the same column types: ObjectIds become strings, date
+    columns become timezone-naive UTC datetimes, and the collection's declared
+    schema dtypes are applied.
+    """
+    for column in df.columns:
+        if column in DATE_COLUMNS:
+            df[column] = parse_timestamps(df[column])
+        elif df[column].dtype == object and ObjectId is not None:
+            first = df[column].dropna()
+            if not first.empty and isinstance(first.iloc[0], ObjectId):
+                df[column] = df[column].map(lambda value: str(value) if value is not None else None)
+    return apply_schema(df, collection)
+
+
+def apply_filters(df, filters):
+    """Apply (column, op, value) filters to a DataFrame"""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        series = df[column]
+        if column in DATE_COLUMNS and not isinstance(value, (list, tuple, set)):
+            value = pd.Timestamp(value)
+        if op == '==':
+            mask &= (series == value).to_numpy()
+        elif op == '!=':
+            mask &= (series != value).to_numpy()
+        elif op == '<':
+            mask &= (series < value).to_numpy()
+        elif op == '<=':
+            mask &= (series <= value).to_numpy()
+        elif op == '>':
+            mask &= (series > value).to_numpy()
+        elif op == '>=':
+            mask &= (series >= value).to_numpy()
+        elif op == 'in':
+            mask &= series.isin(list(value)).to_numpy()
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return df[mask].reset_index(drop=True)
+
+
+class DataSource:
+    """
+    Common interface for loading StockPilot collections.
+
+    load(collection, columns=None, filters=None) returns a DataFrame with ids as
+    strings and dates as datetimes whatever the backend. filters is a list of
+    (column, op, value) tuples with op one of ==, !=, <, <=, >, >=, in.
+
+    fingerprint(collections) returns a cheap value that changes whenever the data
+    of those collections changes, so derived results can be cached until it does.
+
+    newest(collection, column) returns the largest value of a column, or None.
+
+    load_raw(collection) returns the collection as a plain loader would, with
+    pandas' inferred dtypes and no schema applied.
+    """
+
+    def load(self, collection, columns=None, filters=None):
+        raise NotImplementedError
+
+    def load_raw(self, collection):
+        raise NotImplementedError
+
+    def newest(self, collection, column):
+        values = self.load(collection, columns=[column])[column]
+        return values.max() if values.notna().any() else None
+
+    def fingerprint(self, collections):
+        # Unknown backends never match, so their results are always recomputed
+        return None
+
+    def close(self):
+        pass
+
+
+class CSVDataSource(DataSource):
+    """Reads the generated <collection>.csv files"""
+
+    def __init__(self, base_dir='.'):
+        self.base_dir = base_dir
+
+    def load(self, collection, columns=None, filters=None):
+        path = os.path.join(self.base_dir, f'{collection}.csv')
+        # Filter columns must be read even if they are not returned
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(list(columns) + [f[0] for f in (filters or [])]))
+        df = pd.read_csv(path, usecols=usecols, dtype=csv_dtypes(collection))
+        df = apply_filters(normalize_frame(df, collection), filters)
+        return df[list(columns)] if columns is not None else df
+
+    def load_raw(self, collection):
+        return pd.read_csv(os.path.join(self.base_dir, f'{collection}.csv'))
+
+    def fingerprint(self, collections):
+        """Modification time and size of each collection's file"""
+        stats = []
+        for collection in collections:
+            path = os.path.join(self.base_dir, f'{collection}.csv')
+            stat = os.stat(path) if os.path.exists(path) else None
+            stats.append((collection, stat.st_mtime_ns, stat.st_size) if stat else (collection, None, None))
+        return tuple(stats)
+
+
+class MongoDataSource(DataSource):
+    """
+    Reads collections from MongoDB with server-side projection and filtering,
+    through the shared pooled client.
+    """
+
+    def __init__(self, database=None):
+        self.db = get_database(database)
+
+    @staticmethod
+    def _query(filters):
+        """Translate (column, op, value) filters into a MongoDB query"""
+        operators = {'==': '$eq', '!=': '$ne', '<': '$lt', '<=': '$lte', '>': '$gt', '>=': '$gte', 'in': '$in'}
+        query = {}
+        for column, op, value in filters or []:
+            if op not in operators:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if column in DATE_COLUMNS and op != 'in':
+                value = pd.Timestamp(value).to_pydatetime()
+            elif op == 'in':
+                value = list(value)
+            query.setdefault(column, {})[operators[op]] = value
+        return query
+
+    def load(self, collection, columns=None, filters=None):
+        projection = None
+        if columns is not None:
+            projection = {column: 1 for column in columns}
+            if '_id' not in columns:
+                projection['_id'] = 0
+        documents = list(self.db[collection].find(self._query(filters), projection))
+        df = pd.DataFrame(documents, columns=list(columns) if columns is not None else None)
+        return normalize_frame(df, collection)
+
+    def load_raw(self, collection):
+        return pd.DataFrame(list(self.db[collection].find()))
+
+    def newest(self, collection, column):
+        """An indexed lookup when the column is indexed"""
+        document = self.db[collection].find_one({column: {'$ne': None}}, {column: 1}, sort=[(column, -1)])
+        return document[column] if document is not None else None
+
+    def fingerprint(self, collections):
+        """Document count and newest createdAt of each collection - both indexed lookups"""
+        stats = []
+        for collection in collections:
+            newest = self.db[collection].find_one({}, {'createdAt': 1}, sort=[('createdAt', -1)])
+            stats.append((collection, self.db[collection].estimated_document_count(),
+                          newest.get('createdAt') if newest else None))
+        return tuple(stats)
+
+
+class ParquetDataSource(DataSource):
+    """
+    Reads Parquet snapshots written by snapshot_to_parquet.
+
+    Column selection and filters are pushed down to the Parquet reader, and
+    filters on the date column of month-partitioned collections also prune
+    whole month partitions.
+    """
+
+    def __init__(self, base_dir='snapshot'):
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for the Parquet data source. Install with 'pip install pyarrow'")
+        self.base_dir = base_dir
+
+    @staticmethod
+    def _partition_filters(collection, filters):
+        """Derive month partition filters from range filters on the partition date column"""
+        date_column = MONTH_PARTITIONS.get(collection)
+        # A strict bound on the date is still an inclusive bound on its month
+        month_ops = {'<': '<=', '<=': '<=', '>': '>=', '>=': '>=', '==': '=='}
+        derived = []
+        for column, op, value in filters or []:
+            if column != date_column or op not in month_ops:
+                continue
+            derived.append((PARTITION_COLUMN, month_ops[op], pd.Timestamp(value).strftime('%Y-%m')))
+        return derived
+
+    def load(self, collection, columns=None, filters=None):
+        path = os.path.join(self.base_dir, collection)
+        if not os.path.exists(path):
+            path = f'{path}.parquet'
+
+        parquet_filters = None
+        if filters:
+            parquet_filters = []
+            for column, op, value in filters:
+                if column in DATE_COLUMNS and op != 'in':
+                    value = pd.Timestamp(value)
+                parquet_filters.append((column, op, value))
+            parquet_filters += self._partition_filters(collection, filters)
+
+        df = pd.read_parquet(path, columns=list(columns) if columns is not None else None, filters=parquet_filters)
+        if PARTITION_COLUMN in df.columns and (columns is None or PARTITION_COLUMN not in columns):
+            df = df.drop(columns=[PARTITION_COLUMN])
+        return apply_schema(df.reset_index(drop=True), collection)
+
+    def load_raw(self, collection):
+        path = os.path.join(self.base_dir, collection)
+        df = pd.read_parquet(path if os.path.exists(path) else f'{path}.parquet')
+        return df.drop(columns=[PARTITION_COLUMN]) if PARTITION_COLUMN in df.columns else df
+
+    def fingerprint(self, collections):
+        """Modification times and sizes of the snapshot files of each collection"""
+        stats = []
+        for collection in collections:
+            path = os.path.join(self.base_dir, collection)
+            paths = [f'{path}.parquet'] if not os.path.isdir(path) else [
+                os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+            ]
+            stats.append((collection, tuple(sorted(
+                (p, os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths if os.path.exists(p)
+            ))))
+        return tuple(stats)
+
+
+def get_data_source(kind=None, **kwargs):
+    """
+    Create the configured data source.
+
+    kind defaults to the STOCKPILOT_DATA_SOURCE environment variable (csv, mongo or
+    parquet, default csv); STOCKPILOT_DATA_DIR sets the CSV/Parquet directory.
+    """
+    kind = (kind or os.environ.get('STOCKPILOT_DATA_SOURCE', 'csv')).lower()
+    if kind == 'csv':
+        return CSVDataSource(kwargs.get('base_dir', os.environ.get('STOCKPILOT_DATA_DIR', '.')))
+    if kind == 'mongo':
+        # base_dir only applies to the file backends
+        return MongoDataSource(**{key: value for key, value in kwargs.items() if key != 'base_dir'})
+    if kind == 'parquet':
+        return ParquetDataSource(kwargs.get('base_dir', os.environ.get('STOCKPILOT_DATA_DIR', 'snapshot')))
+    raise ValueError(f"Unknown data source: {kind}")
+
+
+def snapshot_to_parquet(source, output_dir='snapshot', collections=None):
+    """
+    Export collections from any data source to Parquet.
+
+    Sales and sale lines are partitioned by month of sale_date so date-windowed
+    reads only touch the partitions they need. Derived collections such as
+    sale_lines are included when the source has them. Returns the number of rows written per collection.
+    """
+    if pyarrow is None:
+        raise ImportError("pyarrow is required for Parquet snapshots. Install with 'pip install pyarrow'")
+
+    os.makedirs(output_dir, exist_ok=True)
+    rows = {}
+    for collection in collections or COLLECTIONS + DERIVED_COLLECTIONS:
+        start_time = time.perf_counter()
+        try:
+            df = source.load(collection)
+        except FileNotFoundError:
+            # Derived collections are optional
+            if collection not in DERIVED_COLLECTIONS:
+                raise
+            continue
+        if df.empty and collection in DERIVED_COLLECTIONS:
+            continue
+        # Mixed-type object columns (e.g. empty barcodes) are stored as strings
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+
+        if collection in MONTH_PARTITIONS:
+            path = os.path.join(output_dir, collection)
+            df[PARTITION_COLUMN] = df[MONTH_PARTITIONS[collection]].dt.strftime('%Y-%m')
+            df.to_parquet(path, partition_cols=[PARTITION_COLUMN], index=False)
+        else:
+            df.to_parquet(os.path.join(output_dir, f'{collection}.parquet'), index=False)
+
+        rows[collection] = len(df)
+        logger.info(f"Snapshotted {len(df)} rows of {collection} in {time.perf_counter() - start_time:.2f}s")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export StockPilot collections to a Parquet snapshot.")
+    parser.add_argument("command", choices=["snapshot"], help="Command to run.")
+    parser.add_argument("--source", choices=["csv", "mongo"], default="csv", help="Where to read the collections from.")
+    parser.add_argument("--input-dir", type=str, default=".", help="Directory of the CSV files (csv source).")
+    parser.add_argument("--output-dir", type=str, default="snapshot", help="Directory for the Parquet snapshot.")
+    args = parser.parse_args()
+
+    source = get_data_source(args.source, base_dir=args.input_dir) if args.source == 'csv' else get_data_source(args.source)
+    try:
+        rows = snapshot_to_parquet(source, args.output_dir)
+        for collection, count in rows.items():
+            print(f"✅ Snapshotted {count} rows of '{collection}'")
+    finally:
+        source.close()
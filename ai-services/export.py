@@ -0,0 +1,304 @@
+import bisect
+import csv
+import io
+import itertools
+import logging
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from fit_scheduler import scheduler, SchedulerBusy, BATCH
+from metrics import Counter, stage, STAGE_TRAILER
+from serialization import dumps, loads, GZIP_LEVEL, JSONDecodeError
+
+# Try importing Arrow - handle gracefully if not available
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger("export")
+
+# Products computed per chunk - one chunk of rows is held in memory at a time
+DEFAULT_CHUNK_SIZE = 50
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+FORMATS = list(MEDIA_TYPES)
+
+# Columns of each export and their Arrow types. A product that could not be
+# exported gets a single row with only product_id and error set.
+FORECAST_FIELDS = (
+    ('product_id', 'string'),
+    ('date', 'string'),
+    ('predicted_sales', 'int64'),
+    ('error', 'string'),
+)
+REORDER_FIELDS = (
+    ('product_id', 'string'),
+    ('product_name', 'string'),
+    ('current_inventory', 'int64'),
+    ('avg_daily_usage', 'float64'),
+    ('reorder_point', 'int64'),
+    ('safety_stock', 'int64'),
+    ('reorder_needed', 'bool_'),
+    ('days_until_reorder', 'float64'),
+    ('lead_time_days', 'int64'),
+    ('calculated_on', 'string'),
+    ('error', 'string'),
+)
+
+EXPORTED_ROWS = Counter('stockpilot_export_rows_total', 'Rows written by the bulk exports', ['export', 'format'])
+EXPORT_ERRORS = Counter('stockpilot_export_errors_total', 'Products the bulk exports wrote an error row for',
+                        ['export', 'reason'])
+
+# Error of the row ending an export cut short by a busy fit scheduler
+BUSY_ERROR = 'fit scheduler busy - export stopped here'
+
+
+def error_row(product_id, message):
+    return {'product_id': product_id, 'error': message}
+
+
+def _forecaster_error(completed):
+    """The error reported by a failed product_forecaster.py run"""
+    try:
+        output = loads(completed.stdout.strip())
+        if isinstance(output, dict) and 'error' in output:
+            return str(output['error'])
+    except JSONDecodeError:
+        pass
+    lines = [line for line in (completed.stderr or '').splitlines() if line.strip() and not line.startswith(STAGE_TRAILER)]
+    return lines[-1] if lines else f"product_forecaster.py exited with code {completed.returncode}"
+
+
+def forecast_rows(calculator, product_id):
+    """
+    The 30-day forecast of one product as (product_id, date, predicted_sales)
+    rows, from the same response cache as /forecast/{product_id}: a forecast
+    is only refitted when the product's data changed since it was last fitted
+    """
+    completed = calculator.when_admitted(lambda: calculator.cached_product_forecast(product_id, BATCH)).result
+    if completed.returncode != 0:
+        return [error_row(product_id, _forecaster_error(completed))]
+    try:
+        forecast = loads(completed.stdout.strip())
+    except JSONDecodeError as e:
+        return [error_row(product_id, f"Unreadable forecast: {e}")]
+    if not isinstance(forecast, list):
+        return [error_row(product_id, str(forecast.get('error', 'No forecast')) if isinstance(forecast, dict) else 'No forecast')]
+    return [{'product_id': product_id, 'date': day['date'], 'predicted_sales': day['predicted_sales']}
+            for day in forecast]
+
+
+def reorder_rows(calculator, product_id):
+    """The reorder point of one product as a single row"""
+    result = calculator.when_admitted(lambda: calculator.calculate_reorder_point(product_id, BATCH))
+    if 'error' in result:
+        return [error_row(product_id, str(result['error']))]
+    return [result]
+
+
+# Export name: (columns, row function, products it covers)
+EXPORTS = {
+    'forecasts': (FORECAST_FIELDS, forecast_rows, lambda calculator: calculator.df_products['_id']),
+    # The same products as calculate_all_reorder_points
+    'reorder': (REORDER_FIELDS, reorder_rows, lambda calculator: calculator.df_batches['product_id']),
+}
+
+
+class NDJSONEncoder:
+    def __init__(self, fields):
+        pass
+
+    def start(self):
+        return b''
+
+    def rows(self, rows):
+        return b''.join(dumps(row) + b'\n' for row in rows)
+
+    def end(self):
+        return b''
+
+
+class CSVEncoder:
+    def __init__(self, fields):
+        self.names = [name for name, _ in fields]
+        self.buffer = io.StringIO()
+        self.writer = csv.DictWriter(self.buffer, self.names, extrasaction='ignore', lineterminator='\n')
+
+    def _take(self):
+        data = self.buffer.getvalue().encode('utf-8')
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def start(self):
+        self.writer.writeheader()
+        return self._take()
+
+    def rows(self, rows):
+        self.writer.writerows(rows)
+        return self._take()
+
+    def end(self):
+        return b''
+
+
+class ArrowEncoder:
+    """Arrow IPC stream: the schema, then one record batch per chunk"""
+
+    def __init__(self, fields):
+        self.schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in fields])
+        self.sink = io.BytesIO()
+        self.writer = None
+
+    def _take(self):
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def start(self):
+        self.writer = pa.ipc.new_stream(self.sink, self.schema)
+        return self._take()
+
+    def rows(self, rows):
+        if rows:
+            self.writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=self.schema))
+        return self._take()
+
+    def end(self):
+        self.writer.close()
+        return self._take()
+
+
+ENCODERS = {'ndjson': NDJSONEncoder, 'csv': CSVEncoder, 'arrow': ArrowEncoder}
+
+
+def export_product_ids(calculator, name, after=None, limit=None):
+    """
+    Product ids covered by an export, in ascending order: those after the
+    product id `after` (to resume an interrupted download), at most limit
+    """
+    ids = sorted(set(EXPORTS[name][2](calculator).astype(str)))
+    if after is not None:
+        ids = ids[bisect.bisect_right(ids, after):]
+    return ids[:limit] if limit is not None else ids
+
+
+def _chunks(name, calculator, product_ids, chunk_size):
+    """
+    Rows of each chunk of products in product order, computed chunk by chunk.
+    Products that failed get an error row. When a fit is still not admitted
+    after the calculator's retries, the export stops: the chunk is cut after
+    the last product exported in full and ends with an error row (BUSY_ERROR)
+    for the first product left out - or SchedulerBusy is raised when not even
+    the first product was exported.
+    """
+    row_fn = EXPORTS[name][1]
+    busy = threading.Event()
+    busy_errors = []
+
+    def product_rows(product_id):
+        if busy.is_set():
+            return None
+        try:
+            rows = row_fn(calculator, product_id)
+        except SchedulerBusy as e:
+            busy_errors.append(e)
+            busy.set()
+            return None
+        except Exception as e:
+            rows = [error_row(product_id, str(e))]
+        if rows and 'error' in rows[0]:
+            logger.warning(f"No {name} export for product {product_id}: {rows[0]['error']}")
+            EXPORT_ERRORS.inc(export=name, reason='failed')
+        return rows
+
+    exported = 0
+    # The fit scheduler decides how many fits run at once; more workers would only queue
+    with ThreadPoolExecutor(max_workers=scheduler.max_concurrent, thread_name_prefix=f'export-{name}') as pool:
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            rows = []
+            with stage(f'export_{name}_chunk'):
+                for product_id, result in zip(chunk, pool.map(product_rows, chunk)):
+                    if isinstance(result, list):
+                        rows.extend(result)
+                        exported += 1
+                        continue
+                    # Busy: products after this one are not exported even if computed
+                    if exported == 0:
+                        raise busy_errors[0]
+                    logger.warning(f"Fit scheduler busy - {name} export stopped after {exported} "
+                                   f"of {len(product_ids)} products")
+                    EXPORT_ERRORS.inc(export=name, reason='busy')
+                    rows.append(error_row(product_id, BUSY_ERROR))
+                    break
+            yield rows
+            if busy.is_set():
+                return
+
+
+def _gzip(pieces):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    for piece in pieces:
+        # Flushed per chunk so the client receives each chunk as soon as it is computed
+        yield compressor.compress(piece) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_stream(name, calculator, fmt='ndjson', after=None, limit=None, chunk_size=None, accept_encoding=None):
+    """
+    Stream an export of every product as NDJSON, CSV or an Arrow IPC stream.
+    Returns (body iterator of bytes, response headers).
+
+    Rows are produced chunk by chunk from the loaded calculator - fits queue in
+    the fit scheduler at batch priority - and written as each chunk completes,
+    so memory stays at one chunk however large the catalog. Products come in
+    ascending id order: an interrupted download resumes with after= set to the
+    last product id of which all rows arrived. A product that could not be
+    exported gets one row with its error, and an export cut short by a busy fit
+    scheduler ends with a BUSY_ERROR row for the first product left out. The
+    first chunk is computed before returning, so SchedulerBusy before any
+    product and load errors are raised here rather than cutting off a started
+    response.
+    """
+    if fmt not in ENCODERS:
+        raise ValueError(f"'format' must be one of: {', '.join(FORMATS)}")
+    if fmt == 'arrow' and pa is None:
+        raise ValueError("Arrow export needs pyarrow, which is not installed")
+    if chunk_size is None:
+        chunk_size = int(os.environ.get('STOCKPILOT_EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+
+    product_ids = export_product_ids(calculator, name, after, limit)
+    encoder = ENCODERS[fmt](EXPORTS[name][0])
+    chunks = _chunks(name, calculator, product_ids, max(1, chunk_size))
+    first = next(chunks, None)
+
+    def body():
+        yield encoder.start()
+        for rows in itertools.chain([first] if first is not None else [], chunks):
+            EXPORTED_ROWS.inc(len(rows), export=name, format=fmt)
+            yield encoder.rows(rows)
+        yield encoder.end()
+
+    extension = 'arrows' if fmt == 'arrow' else fmt
+    headers = {
+        'Content-Type': MEDIA_TYPES[fmt],
+        'Content-Disposition': f'attachment; filename="{name}.{extension}"',
+        'X-StockPilot-Export-Products': str(len(product_ids)),
+    }
+    # Arrow is already a compact binary format - only the text formats are gzipped
+    if fmt != 'arrow':
+        headers['Vary'] = 'Accept-Encoding'
+        accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+        if 'gzip' in accepted:
+            headers['Content-Encoding'] = 'gzip'
+            return _gzip(body()), headers
+    return body(), headers
@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger("fit_scheduler")
+
+# Priorities - lower runs first
+INTERACTIVE = 0
+BATCH = 1
+
+# Seconds a request may wait in the queue before it is turned away
+DEFAULT_DEADLINES = {INTERACTIVE: 30.0, BATCH: 300.0}
+
+# Assumed fit duration until real fits have been timed
+INITIAL_FIT_SECONDS = 5.0
+
+
+class SchedulerBusy(Exception):
+    """
+    A fit was not admitted. status is the HTTP status to answer with (429 when
+    the queue is full, 503 when the request's deadline passed while queued) and
+    retry_after the suggested wait in seconds.
+    """
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def default_concurrency():
+    """
+    Fits allowed at once: the cores divided by the cores one fit keeps busy
+    (STOCKPILOT_FIT_THREADS, default 2), overridden by STOCKPILOT_FIT_CONCURRENCY.
+    """
+    if os.environ.get('STOCKPILOT_FIT_CONCURRENCY'):
+        return max(1, int(os.environ['STOCKPILOT_FIT_CONCURRENCY']))
+    threads_per_fit = max(1, int(os.environ.get('STOCKPILOT_FIT_THREADS', 2)))
+    return max(1, (os.cpu_count() or 1) // threads_per_fit)
+
+
+class _Ticket:
+    def __init__(self, key, priority, expires):
+        self.key = key
+        self.priority = priority
+        self.expires = expires
+        self.granted = False
+
+
+class FitScheduler:
+    """
+    Admission control for CPU-heavy model fits.
+
+    At most max_concurrent fits run at once; further requests wait in a bounded
+    priority queue where interactive requests go ahead of batch work. A request
+    is rejected straight away when the queue is full, and gives up when its
+    deadline passes before a slot frees up - both raise SchedulerBusy with a
+    Retry-After estimate from the average fit time. promote() moves a queued
+    fit up when a more urgent caller comes to wait for it.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None, deadlines=None):
+        self.max_concurrent = max_concurrent or default_concurrency()
+        if max_queue is None:
+            max_queue = int(os.environ.get('STOCKPILOT_FIT_QUEUE', 4 * self.max_concurrent))
+        self.max_queue = max_queue
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        self.deadlines[INTERACTIVE] = float(os.environ.get('STOCKPILOT_FIT_DEADLINE_SECONDS', self.deadlines[INTERACTIVE]))
+        self.deadlines[BATCH] = float(os.environ.get('STOCKPILOT_FIT_BATCH_DEADLINE_SECONDS', self.deadlines[BATCH]))
+        self.deadlines.update(deadlines or {})
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._fit_seconds = INITIAL_FIT_SECONDS
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.promoted = 0
+
+    def retry_after(self):
+        """Seconds until the current backlog is expected to clear"""
+        backlog = len(self._queue) + self._running
+        return max(1, math.ceil(self._fit_seconds * backlog / self.max_concurrent))
+
+    def _grant_next(self):
+        while self._running < self.max_concurrent and self._queue:
+            _, _, ticket = heapq.heappop(self._queue)
+            ticket.granted = True
+            self._running += 1
+        self._cond.notify_all()
+
+    def _acquire(self, priority, deadline, key):
+        with self._cond:
+            if self._running < self.max_concurrent and not self._queue:
+                self._running += 1
+                return
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy("Forecast queue is full", 429, self.retry_after())
+
+            ticket = _Ticket(key, priority, time.monotonic() + deadline)
+            heapq.heappush(self._queue, (priority, next(self._sequence), ticket))
+            while not ticket.granted:
+                # Read on every wake-up - promote() may have shortened it
+                remaining = ticket.expires - time.monotonic()
+                if remaining <= 0:
+                    self._queue = [entry for entry in self._queue if entry[2] is not ticket]
+                    heapq.heapify(self._queue)
+                    self.expired += 1
+                    raise SchedulerBusy("Timed out waiting for a forecast slot", 503, self.retry_after())
+                self._cond.wait(remaining)
+
+    def promote(self, key, priority):
+        """
+        Raise queued fits of key to priority, also shortening their deadline to
+        that priority's. Used when an interactive caller joins a batch fit.
+        Returns the number of fits promoted - fits already running are left alone.
+        """
+        if key is None:
+            return 0
+        with self._cond:
+            promoted = 0
+            for i, (queued_priority, sequence, ticket) in enumerate(self._queue):
+                if ticket.key == key and priority < queued_priority:
+                    ticket.priority = priority
+                    ticket.expires = min(ticket.expires, time.monotonic() + self.deadlines[priority])
+                    self._queue[i] = (priority, sequence, ticket)
+                    promoted += 1
+            if promoted:
+                heapq.heapify(self._queue)
+                self.promoted += promoted
+                self._cond.notify_all()
+            return promoted
+
+    def _release(self, seconds):
+        with self._cond:
+            self._running -= 1
+            self.completed += 1
+            # Moving average of fit durations for the Retry-After estimate
+            self._fit_seconds = 0.8 * self._fit_seconds + 0.2 * seconds
+            self._grant_next()
+
+    def run(self, fn, priority=INTERACTIVE, deadline=None, key=None):
+        """
+        Run fn once a slot is free; deadline (seconds queued) defaults by priority.
+        key names the fit for promote().
+        """
+        self._acquire(priority, self.deadlines[priority] if deadline is None else deadline, key)
+        start_time = time.monotonic()
+        try:
+            return fn()
+        finally:
+            self._release(time.monotonic() - start_time)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'running': self._running,
+                'queued': len(self._queue),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'promoted': self.promoted,
+                'avg_fit_seconds': round(self._fit_seconds, 3)
+            }
+
+
+# Process-wide scheduler for the product forecaster fits
+scheduler = FitScheduler()
+
+FIT_SLOTS = Gauge('stockpilot_fit_slots', 'Forecast fits running and waiting for a slot', ['state'],
+                  collect=lambda: {(state,): scheduler.stats()[state] for state in ('running', 'queued')})
+FIT_ADMISSIONS = Counter('stockpilot_fit_admissions_total', 'Forecast fits by admission outcome', ['outcome'],
+                         collect=lambda: {(outcome,): scheduler.stats()[outcome] for outcome in ('completed', 'rejected', 'expired')})
@@ -0,0 +1,566 @@
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+# Only light modules are imported here so a service binds its port at once.
+# pandas, Prophet and the reorder calculator are loaded by the background
+# warm-up - /ready reports when that is done.
+import metrics
+from conditional import responses, request_conditions, file_version, reorder_version, CACHE_HEADER
+from fit_scheduler import scheduler, SchedulerBusy
+from general_forecast import GeneralForecast
+from profiling import profiler, PROFILE_HEADER, PROFILE_ID_HEADER
+from serialization import fastapi_response, loads, shape_records, JSONDecodeError, SHAPES
+from single_flight import flights
+from warmup import Warmup, fit_prophet_once
+
+logger = logging.getLogger("forecast_service")
+
+# The forecasting and reorder service shared by forecast_api.py (standalone,
+# port 5001) and ChatBot/api.py. Everything below is process-wide: one data
+# snapshot, one general forecast, one response cache and one fit scheduler,
+# whichever app the requests come through.
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ?method= of the reorder endpoints (reorder_point_calculator.REORDER_METHODS): the
+# forecast-based formula or the service-level quantile of lead-time demand
+REORDER_METHODS = ['forecast', 'service_level']
+
+# Saved store-wide model served by /forecast while the live general forecast has
+# no data to train on (STOCKPILOT_SAVED_FORECAST_MODEL)
+SAVED_MODEL_PATH = os.environ.get('STOCKPILOT_SAVED_FORECAST_MODEL',
+                                  os.path.join(SERVICE_DIR, 'ChatBot', 'sales_forecaster2.joblib'))
+
+# Response header naming the model a /forecast response came from: live or saved
+FORECAST_MODEL_HEADER = 'X-StockPilot-Forecast-Model'
+
+# Save a PNG of each newly computed product forecast (STOCKPILOT_FORECAST_PLOTS=1)
+SAVE_PLOTS = os.environ.get('STOCKPILOT_FORECAST_PLOTS', '0') not in ('', '0', 'false')
+
+
+def general_forecast_source():
+    from data_sources import get_data_source
+    return get_data_source(base_dir=os.environ.get('STOCKPILOT_DATA_DIR', SERVICE_DIR))
+
+
+# General forecast prepared at startup and refit in the background when the data changes
+general_forecast = GeneralForecast(source_factory=general_forecast_source)
+
+
+class ReorderSnapshot:
+    """
+    One loaded ReorderPointCalculator shared by all reorder and inventory
+    requests. The data is loaded once and again only when the reorder data
+    watermark changes; the calculator is replaced as a whole, so requests
+    running on the previous snapshot finish undisturbed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tag = None
+        self._calculator = None
+
+    def get(self):
+        tag = reorder_version().tag
+        if tag == self._tag:
+            return self._calculator
+        with self._lock:
+            if tag != self._tag:
+                from reorder_point_calculator import ReorderPointCalculator
+                calculator = ReorderPointCalculator()
+                with metrics.stage('reorder_snapshot'):
+                    if not calculator.load_data():
+                        raise RuntimeError("Failed to load data")
+                self._calculator, self._tag = calculator, tag
+            return self._calculator
+
+
+reorder_snapshot = ReorderSnapshot()
+
+# --- BACKGROUND WARM-UP ---
+warmup = Warmup('forecast_service')
+
+
+@warmup.task(name='indexes')
+def warm_indexes():
+    from mongo_indexes import ensure_indexes_on_startup
+    ensure_indexes_on_startup()
+
+
+# Created by the warm-up, which also imports pandas for it
+sale_lines_refresher = None
+
+
+@warmup.task(name='sale_lines')
+def warm_sale_lines():
+    # Sales written by the Node backend only reach sale_lines (and the stock
+    # ledger) through this refresh, so it runs before the first snapshot and
+    # then periodically
+    global sale_lines_refresher
+    from sale_lines import SaleLinesRefresher
+    if sale_lines_refresher is None:
+        sale_lines_refresher = SaleLinesRefresher()
+    try:
+        sale_lines_refresher.refresh()
+    finally:
+        sale_lines_refresher.start()
+
+
+@warmup.task(name='reorder_snapshot')
+def warm_reorder_snapshot():
+    # Also imports pandas, NumPy and the MongoDB driver
+    reorder_snapshot.get()
+
+
+@warmup.task(name='prophet')
+def warm_prophet():
+    # Loads Prophet and its Stan backend for the in-process fits (the general
+    # forecast) and the saved model
+    fit_prophet_once()
+
+
+@warmup.task(name='general_forecast')
+def warm_general_forecast():
+    # Loads the sales data and fits Prophet once before the first request
+    try:
+        general_forecast.refresh()
+    finally:
+        general_forecast.start()
+
+
+def start():
+    warmup.start()
+
+
+def stop():
+    warmup.stop()
+    general_forecast.stop()
+    if sale_lines_refresher is not None:
+        sale_lines_refresher.stop()
+    from mongo_client import close_client
+    close_client()
+
+
+# --- HELPERS ---
+def shape_error(shape):
+    """400 response for an unknown ?shape=, or None"""
+    if shape not in SHAPES:
+        return JSONResponse(content={"error": f"'shape' must be one of: {', '.join(SHAPES)}"}, status_code=400)
+    return None
+
+
+def method_error(method):
+    """400 response for an unknown reorder ?method=, or None"""
+    if method not in REORDER_METHODS:
+        return JSONResponse(content={"error": f"'method' must be one of: {', '.join(REORDER_METHODS)}"}, status_code=400)
+    return None
+
+
+def conditional(request: Request, key, version_fn, compute, cacheable=None, shape=None):
+    """
+    Answer a request from the response cache (see conditional.ConditionalCache).
+    shape, or a tuple of the parameters choosing the representation, varies the ETag.
+    """
+    variant = '-'.join(shape) if isinstance(shape, tuple) else shape
+    return responses.get(key, version_fn, compute, cacheable=cacheable, variant=variant,
+                         **request_conditions(request.headers))
+
+
+def not_modified(cached):
+    return Response(status_code=304, headers=cached.headers)
+
+
+def predict_saved_forecast(periods=7):
+    """The next days of the saved store-wide model, in the live forecast's records"""
+    import joblib
+    model = joblib.load(SAVED_MODEL_PATH)
+    with metrics.stage('predict'):
+        forecast = model.predict(model.make_future_dataframe(periods=periods))
+    result = forecast.rename(columns={'ds': 'date', 'yhat': 'predicted_sales'})
+    result = result[['date', 'predicted_sales']].tail(periods)
+    result['date'] = result['date'].dt.strftime('%Y-%m-%d')
+    result['predicted_sales'] = result['predicted_sales'].round().astype(int)
+    return result.to_dict('records')
+
+
+def save_forecast_plot(product_id, forecast_data):
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    forecast_df = pd.DataFrame(forecast_data)
+    with metrics.stage('plot'):
+        plt.figure(figsize=(10, 6))
+        plt.plot(pd.to_datetime(forecast_df['date']), forecast_df['predicted_sales'], label='Predicted Sales')
+        plt.title(f'Sales Forecast for Product {product_id} - Next 30 Days')
+        plt.xlabel('Date')
+        plt.ylabel('Predicted Sales')
+        plt.legend()
+        plt.grid(True, alpha=0.3)
+        plt.savefig(os.path.join(SERVICE_DIR, f'components_{product_id}.png'), dpi=300, bbox_inches='tight')
+        plt.close()
+
+
+# --- FORECAST AND REORDER ENDPOINTS ---
+router = APIRouter()
+
+
+@router.get("/forecast")
+def get_general_forecast(request: Request, shape: str = "records"):
+    error = shape_error(shape)
+    if error:
+        return error
+    try:
+        # The model is fit at startup and by the background refresher; requests only read its
+        # forecast, and clients that already have it get a 304
+        model = 'live'
+        try:
+            cached = conditional(request, ('general_forecast',), general_forecast.version, general_forecast.get, shape=shape)
+        except (FileNotFoundError, ValueError) as e:
+            # No sales data to train on - serve the saved model until there is,
+            # predicted again only when the file changes
+            logger.warning(f"Live general forecast unavailable ({e}) - serving {SAVED_MODEL_PATH}")
+            model = 'saved'
+            cached = conditional(request, ('saved_forecast',), lambda: file_version(SAVED_MODEL_PATH),
+                                 predict_saved_forecast, shape=shape)
+        cached.headers[FORECAST_MODEL_HEADER] = model
+        if cached.status == 304:
+            return not_modified(cached)
+        return fastapi_response(shape_records(cached.result, shape), request, headers=cached.headers)
+    except FileNotFoundError:
+        return JSONResponse(content={"error": "No sales data to forecast from and no saved model (sales_forecaster2.joblib)."},
+                            status_code=404)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@router.get("/forecast/{product_id}")
+def get_product_forecast(product_id: str, request: Request, shape: str = "records"):
+    """Returns a 30-day forecast for a SPECIFIC product, from product_forecaster.py"""
+    error = shape_error(shape)
+    if error:
+        return error
+    try:
+        # Successful runs are reused until the product's data changes; the
+        # snapshot's calculator resolves the product's tier as the reorder path does
+        cached = reorder_snapshot.get().cached_product_forecast(
+            product_id, variant=shape, **request_conditions(request.headers))
+        if cached.status == 304:
+            return not_modified(cached)
+        result = cached.result
+
+        # Check if the process returned an error code
+        if result.returncode != 0:
+            logger.error(f"Error running product_forecaster.py: {result.stderr}")
+            if result.stdout:
+                # Try to extract error from JSON if present
+                try:
+                    error_data = loads(result.stdout)
+                    if isinstance(error_data, dict) and 'error' in error_data:
+                        return JSONResponse(content={"error": error_data['error']}, status_code=400)
+                except JSONDecodeError:
+                    pass
+            return JSONResponse(content={
+                "error": f"Failed to generate forecast for product {product_id}",
+                "details": result.stderr or "Unknown error"
+            }, status_code=500)
+
+        try:
+            forecast_data = loads(result.stdout.strip())
+        except JSONDecodeError as e:
+            logger.error(f"Failed to parse output as JSON: {e}. Raw output: {result.stdout}")
+            return JSONResponse(content={
+                "error": "Failed to parse forecast data.",
+                "details": f"JSON parsing error: {str(e)}"
+            }, status_code=500)
+
+        # Check if there's an error message in the JSON
+        if isinstance(forecast_data, dict) and 'error' in forecast_data:
+            return JSONResponse(content={"error": forecast_data['error']}, status_code=400)
+
+        if SAVE_PLOTS and isinstance(forecast_data, list) and forecast_data and cached.headers[CACHE_HEADER] == 'miss':
+            save_forecast_plot(product_id, forecast_data)
+
+        return fastapi_response({
+            "product_id": product_id,
+            "forecast": shape_records(forecast_data, shape) if isinstance(forecast_data, list) else forecast_data
+        }, request, headers=cached.headers)
+    except SchedulerBusy:
+        raise  # Answered by handle_scheduler_busy
+    except Exception as e:
+        logger.exception(f"Unexpected error: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@router.get("/reorder")
+def get_all_reorder_points(request: Request, shape: str = "records", method: str = "forecast"):
+    """
+    Reorder points for all products; products that need reordering are at the top of the list.
+    ?method=service_level reads them as lead-time demand quantiles instead of fitting forecasts.
+    """
+    error = shape_error(shape) or method_error(method)
+    if error:
+        return error
+    try:
+        # Concurrent requests share one calculation, reused until the data changes.
+        # A partial run (products the fit scheduler kept turning away) is not cached.
+        cached = conditional(
+            request, ('reorder_all', method), reorder_version,
+            lambda: flights.do(('reorder_all', method),
+                               lambda: reorder_snapshot.get().calculate_all_reorder_points(method=method, with_status=True)),
+            cacheable=lambda result: result[1]['status'] == 'complete',
+            shape=(shape, method) if method != 'forecast' else shape
+        )
+        if cached.status == 304:
+            return not_modified(cached)
+        results, status = cached.result
+
+        # Count products that need reordering
+        reorder_needed_count = sum(1 for item in results if item['reorder_needed'])
+
+        return fastapi_response({
+            "reorder_summary": {
+                "total_products": len(results),
+                "products_needing_reorder": reorder_needed_count,
+                "status": status['status'],
+                "skipped_products": status['skipped_products']
+            },
+            "reorder_points": shape_records(results, shape)
+        }, request, headers=cached.headers)
+    except SchedulerBusy:
+        raise  # Answered by handle_scheduler_busy
+    except Exception as e:
+        logger.exception(f"Error calculating all reorder points: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@router.get("/reorder/{product_id}")
+def get_product_reorder_point(product_id: str, request: Request, method: str = "forecast"):
+    """Reorder point for a specific product; ?method= as for /reorder"""
+    error = method_error(method)
+    if error:
+        return error
+    try:
+        # Concurrent requests for the product share one calculation, reused until its data changes
+        cached = conditional(
+            request, ('reorder', product_id, method),
+            lambda: reorder_version(product_id),
+            lambda: flights.do(('reorder', product_id, method),
+                               lambda: reorder_snapshot.get().calculate_reorder_point(product_id, method=method)),
+            cacheable=lambda result: 'error' not in result,
+            shape=method if method != 'forecast' else None
+        )
+        if cached.status == 304:
+            return not_modified(cached)
+        result = cached.result
+
+        if 'error' in result:
+            return JSONResponse(content={"error": result['error']}, status_code=400)
+
+        return fastapi_response(result, request, headers=cached.headers)
+    except SchedulerBusy:
+        raise  # Answered by handle_scheduler_busy
+    except Exception as e:
+        logger.exception(f"Error calculating reorder point: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@router.get("/inventory/expiring")
+def get_expiring_stock(request: Request, days: int = 30, shape: str = "records"):
+    """
+    Products with sellable stock expiring within ?days= (default 30).
+    Products with the soonest expiry are at the top of the list.
+    """
+    error = shape_error(shape)
+    if error:
+        return error
+    if days < 0:
+        return JSONResponse(content={"error": "'days' must be a non-negative integer"}, status_code=400)
+    try:
+        results = reorder_snapshot.get().get_expiring_stock(days)
+
+        return fastapi_response({
+            "expiring_summary": {
+                "days": days,
+                "total_products": len(results),
+                "total_expiring_quantity": sum(item['expiring_quantity'] for item in results)
+            },
+            "expiring_stock": shape_records(results, shape)
+        }, request)
+    except Exception as e:
+        logger.exception(f"Error calculating expiring stock: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+# --- BULK EXPORT ENDPOINTS ---
+def export_response(name, request: Request, fmt, after, limit):
+    """
+    Stream an export of every product (see export.export_stream):
+    ?format=ndjson|csv|arrow, ?after=<product id> to resume, ?limit=<products>
+    """
+    from export import export_stream, FORMATS
+    if fmt not in FORMATS:
+        return JSONResponse(content={"error": f"'format' must be one of: {', '.join(FORMATS)}"}, status_code=400)
+    if limit is not None and limit < 1:
+        return JSONResponse(content={"error": "'limit' must be a positive integer"}, status_code=400)
+    try:
+        body, headers = export_stream(name, reorder_snapshot.get(), fmt, after=after, limit=limit,
+                                      accept_encoding=request.headers.get('accept-encoding'))
+        return StreamingResponse(body, headers=headers)
+    except SchedulerBusy:
+        raise  # Answered by handle_scheduler_busy
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.exception(f"Error exporting {name}: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@router.get("/export/forecasts")
+def export_forecasts(request: Request, fmt: str = Query("ndjson", alias="format"),
+                     after: str = None, limit: int = None):
+    """30-day forecasts of every product, one row per product and day"""
+    return export_response('forecasts', request, fmt, after, limit)
+
+
+@router.get("/export/reorder")
+def export_reorder_points(request: Request, fmt: str = Query("ndjson", alias="format"),
+                          after: str = None, limit: int = None):
+    """Reorder points of every stocked product, one row per product"""
+    return export_response('reorder', request, fmt, after, limit)
+
+
+# --- OPERATIONS ENDPOINTS ---
+operations_router = APIRouter()
+
+
+@operations_router.get("/health")
+async def health_check():
+    return {"status": "healthy"}
+
+
+@operations_router.get("/ready")
+async def readiness_check(request: Request):
+    """
+    503 until every warm-up task the app requires has succeeded (see mount) -
+    failed ones are being retried. Optional tasks are reported but never block.
+    """
+    ready, tasks = True, {}
+    for checked, required in request.app.state.readiness:
+        status = checked.status(required)
+        ready = ready and status["ready"]
+        tasks.update(status["tasks"])
+    status = {"ready": ready, "tasks": tasks}
+    if not ready:
+        failed = any(task["state"] == "failed" and not task.get("optional") for task in tasks.values())
+        return JSONResponse(content={"status": "degraded" if failed else "warming up", **status}, status_code=503)
+    return {"status": "ready", **status}
+
+
+@operations_router.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@operations_router.get("/profiles")
+def list_profiles(request: Request):
+    """Saved request profiles - needs profiling enabled and, if configured, the token"""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER), request.query_params.get("profile")):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {"profiles": profiler.list()}
+
+
+@operations_router.get("/profiles/{name}")
+def download_profile(name: str, request: Request):
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER), request.query_params.get("profile")):
+        raise HTTPException(status_code=404, detail="Not Found")
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json" if name.endswith(".json") else "text/plain", filename=name)
+
+
+# --- MOUNTING ---
+async def record_request_latency(request: Request, call_next):
+    """Latency of every request by route template, so /reorder/{product_id} is one series"""
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start_time,
+                                        endpoint=route.path if route is not None else "unmatched",
+                                        method=request.method, status=status)
+
+
+async def profile_request(request: Request, call_next):
+    """Run the request under the profiler when it asks for it and profiling is enabled"""
+    session = None
+    if profiler.authorized(request.headers.get(PROFILE_HEADER), request.query_params.get("profile")):
+        # Sync endpoints run on a worker thread, so every thread is sampled
+        session = profiler.start(f"{request.method} {request.url.path}")
+    if session is None:
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        session.stop(500)
+        raise
+    response.headers[PROFILE_ID_HEADER] = session.stop(response.status_code)
+    return response
+
+
+async def handle_scheduler_busy(request: Request, e: SchedulerBusy):
+    """Overloaded: answer at once with 429/503 and when to retry"""
+    return JSONResponse(content={"error": str(e), "retry_after": e.retry_after}, status_code=e.status,
+                        headers={"Retry-After": str(e.retry_after)})
+
+
+def mount(app: FastAPI, readiness=None):
+    """
+    Add the service to an app: the forecast, reorder and operations endpoints,
+    request metrics, opt-in profiling and the overload handler. The app's
+    lifespan must call start() and stop().
+
+    readiness lists what /ready waits for as (Warmup, names of the required
+    tasks or None for all of them); by default every task of this service.
+    """
+    app.state.readiness = readiness if readiness is not None else [(warmup, None)]
+    app.middleware("http")(record_request_latency)
+    app.middleware("http")(profile_request)
+    app.add_exception_handler(SchedulerBusy, handle_scheduler_busy)
+    app.include_router(router)
+    app.include_router(operations_router)
+
+
+def create_app():
+    """The service as a standalone ASGI app"""
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        start()
+        yield
+        stop()
+
+    app = FastAPI(title="StockPilot forecasting service", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    mount(app)
+    return app
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import stage, timed_fit, ROWS_FETCHED, CACHE_REQUESTS
+
+logger = logging.getLogger("general_forecast")
+
+# Collections the general forecast is trained on
+SOURCE_COLLECTIONS = ['sales', 'sale_items']
+
+# Seconds between background checks for new data (STOCKPILOT_FORECAST_REFRESH_SECONDS)
+DEFAULT_REFRESH_SECONDS = 300
+
+
+class GeneralForecast:
+    """
+    Store-wide daily sales forecast kept ready between requests.
+
+    refresh() rebuilds the daily aggregates, fits Prophet and predicts the
+    forecast horizon, but only when the data fingerprint of the source or the
+    training window (which follows the newest sale, or the date with
+    STOCKPILOT_WINDOW_END=now) has changed since the last fit.
+    Requests read the prepared result; a background thread started with
+    start() keeps it fresh. Errors from preparing the forecast (missing files,
+    too little data) are kept and re-raised to the requests until a later
+    refresh succeeds.
+    """
+
+    def __init__(self, source_factory=None, periods=7):
+        self.source_factory = source_factory
+        self.periods = periods
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # (data key, forecast records, error) - replaced as a whole so readers never see a mix
+        self._state = None
+        self.metadata = None
+        self.prepared_at = None
+
+    def _prepare(self, source, window_start, window_end):
+        import pandas as pd
+        from training_window import load_windowed_sales, window_metadata
+        with stage('load'):
+            sales_df, sale_items_df = load_windowed_sales(
+                source, window_start, window_end,
+                sale_columns=['sale_date', 'total_amount'], item_columns=['quantity']
+            )
+        ROWS_FETCHED.inc(len(sales_df), collection='sales')
+        ROWS_FETCHED.inc(len(sale_items_df), collection='sale_items')
+        # Merge sale_items with sales to get sale_date for each item
+        merged = sale_items_df.merge(sales_df, left_on='sale_id', right_on='_id', how='left')
+        merged = merged.dropna(subset=['sale_date'])
+        # Aggregate to daily total quantity
+        daily_sales = merged.groupby(merged['sale_date'].dt.date)['quantity'].sum().reset_index()
+        daily_sales.columns = ['ds', 'y']
+        daily_sales['ds'] = pd.to_datetime(daily_sales['ds'])
+        if len(daily_sales) < 2:
+            raise ValueError("Not enough sales data to train model.")
+
+        from prophet import Prophet
+        model = Prophet(daily_seasonality=False, weekly_seasonality=True, yearly_seasonality=False)
+        timed_fit('general', lambda: model.fit(daily_sales))
+
+        # Calculate average price per unit
+        merged = merged.dropna(subset=['total_amount'])
+        total_quantity = merged['quantity'].sum()
+        total_revenue = merged['total_amount'].sum()
+        avg_price_per_unit = total_revenue / total_quantity if total_quantity > 0 else 0
+
+        # The horizon follows the last training day, so the prediction only
+        # changes when the model does and is made once per fit
+        with stage('predict'):
+            future = model.make_future_dataframe(periods=self.periods)
+            forecast = model.predict(future)
+        result = forecast.rename(columns={'ds': 'date', 'yhat': 'predicted_sales'})
+        result = result[['date', 'predicted_sales']].tail(self.periods)
+        result['date'] = result['date'].dt.strftime('%Y-%m-%d')
+        result['predicted_sales'] = result['predicted_sales'].round().astype(int)
+        result['predicted_price'] = (result['predicted_sales'] * avg_price_per_unit).round(2)
+        return result.to_dict('records'), window_metadata('general', window_start, window_end, rows=len(daily_sales))
+
+    def refresh(self, force=False):
+        """Refit if the data or training window changed. Returns True if it refit."""
+        # Data access and pandas are imported here, not at module level, so
+        # services can create the forecast without slowing their startup
+        from data_sources import get_data_source
+        from training_window import training_window
+        with self._lock:
+            source = (self.source_factory or get_data_source)()
+            try:
+                window_start, window_end = training_window('general', newest=lambda: source.newest('sales', 'sale_date'))
+                key = (window_start, source.fingerprint(SOURCE_COLLECTIONS))
+                if not force and key[1] is not None and self._state is not None and key == self._state[0]:
+                    return False
+
+                start_time = time.perf_counter()
+                try:
+                    result, metadata = self._prepare(source, window_start, window_end)
+                except (FileNotFoundError, ValueError) as e:
+                    # Serve the error until the data is fixed, without refitting every request
+                    self._state = (key, None, e)
+                    logger.warning(f"General forecast unavailable: {e}")
+                    return True
+                self._state = (key, result, None)
+                self.metadata = metadata
+                self.prepared_at = datetime.now(timezone.utc)
+                logger.info(f"General forecast refit in {time.perf_counter() - start_time:.2f}s - training window: {metadata}")
+                return True
+            finally:
+                source.close()
+
+    def get(self):
+        """The prepared forecast records, preparing them first if no refresh has run yet"""
+        if self._state is None:
+            CACHE_REQUESTS.inc(cache='general_forecast', result='miss')
+            self.refresh()
+        else:
+            CACHE_REQUESTS.inc(cache='general_forecast', result='hit')
+        _, result, error = self._state
+        if error is not None:
+            raise error
+        return result
+
+    def version(self):
+        """
+        Version of the prepared forecast for conditional responses: it changes
+        exactly when a refit replaces the result. Prepares it first if needed.
+        """
+        from conditional import Version
+        if self._state is None:
+            self.refresh()
+        return Version('general_forecast', self._state[0], self.periods, last_modified=self.prepared_at)
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"General forecast refresh failed: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval=None):
+        """Prepare the forecast in the background now and re-check the data every interval seconds"""
+        if self._thread is not None:
+            return
+        if interval is None:
+            interval = float(os.environ.get('STOCKPILOT_FORECAST_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='general-forecast-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
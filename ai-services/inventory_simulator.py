@@ -0,0 +1,141 @@
+import pandas as pd
+import numpy as np
+import json
+import time
+import logging
+
+logger = logging.getLogger("inventory_simulator")
+
+
+def build_daily_demand_matrix(df_items_with_products, df_sales, product_ids=None):
+    """
+    Pivot sale items into a (products x days) matrix of units sold per calendar day.
+
+    Days without a sale are kept as zeros so that the empirical distribution of
+    each row reflects intermittent demand. Returns (product_ids, dates, matrix).
+    """
+    # Attach sale_date to every item - compare ids as strings to handle ObjectIds
+    df_items = df_items_with_products[['sale_id', 'product_id', 'quantity']].copy()
+    df_items['sale_id_str'] = df_items['sale_id'].astype(str)
+    df_items['product_id_str'] = df_items['product_id'].astype(str)
+    sale_dates = pd.Series(
+        pd.to_datetime(df_sales['sale_date']).dt.normalize().values,
+        index=df_sales['_id'].astype(str).values
+    )
+    df_items['sale_day'] = df_items['sale_id_str'].map(sale_dates)
+    df_items = df_items.dropna(subset=['sale_day', 'product_id'])
+
+    if product_ids is None:
+        product_ids = np.sort(df_items['product_id_str'].unique())
+    else:
+        product_ids = np.asarray([str(p) for p in product_ids])
+
+    if df_items.empty:
+        return product_ids, pd.DatetimeIndex([]), np.zeros((len(product_ids), 0), dtype=np.float32)
+
+    dates = pd.date_range(df_items['sale_day'].min(), df_items['sale_day'].max(), freq='D')
+
+    # Scatter-add quantities into the dense matrix
+    row = pd.Index(product_ids).get_indexer(df_items['product_id_str'])
+    col = dates.get_indexer(df_items['sale_day'])
+    keep = row >= 0
+    matrix = np.zeros((len(product_ids), len(dates)), dtype=np.float32)
+    np.add.at(matrix, (row[keep], col[keep]), df_items['quantity'].to_numpy(dtype=np.float32)[keep])
+
+    return product_ids, dates, matrix
+
+
+class InventorySimulator:
+    """
+    Monte Carlo simulator for lead-time stockout risk across the whole catalog.
+
+    Demand paths are bootstrapped from each product's empirical daily demand and
+    sampled for all products at once as a (products x paths x days) array. Products
+    are processed in chunks so that the working set stays under MAX_CHUNK_BYTES.
+    """
+
+    def __init__(self, demand_matrix, num_paths=1000, seed=None):
+        # Constants for the simulation
+        self.NUM_PATHS = num_paths  # Demand paths sampled per product
+        self.MAX_CHUNK_BYTES = 256 * 1024 * 1024  # Upper bound on the per-chunk working set
+
+        self.demand_matrix = np.asarray(demand_matrix, dtype=np.float32)
+        self.rng = np.random.default_rng(seed)
+
+    def _chunk_size(self, max_lead_time, num_lead_times, num_candidates):
+        """Number of products that fit into one chunk under MAX_CHUNK_BYTES"""
+        # int32 sample indices, float32 demand and cumulative demand per path-day,
+        # plus the float32 shortage array per path x lead time x candidate
+        per_product = self.NUM_PATHS * (max_lead_time * (4 + 4 + 4) + num_lead_times * num_candidates * 4)
+        return max(1, int(self.MAX_CHUNK_BYTES // per_product))
+
+    def sample_lead_time_demand(self, demand_chunk, lead_times):
+        """
+        Sample total demand over each lead time for a chunk of products.
+
+        Returns an array of shape (products, paths, len(lead_times)).
+        """
+        num_products, num_days = demand_chunk.shape
+        max_lead_time = int(max(lead_times))
+
+        # Draw a historical day for every (product, path, day) and gather the demand
+        day_index = self.rng.integers(0, num_days, size=(num_products, self.NUM_PATHS, max_lead_time), dtype=np.int32)
+        paths = np.take_along_axis(demand_chunk[:, None, :], day_index.reshape(num_products, 1, -1), axis=2)
+        paths = paths.reshape(num_products, self.NUM_PATHS, max_lead_time)
+
+        # Cumulative demand gives every candidate lead time in a single pass
+        cumulative = np.cumsum(paths, axis=2)
+        return cumulative[:, :, np.asarray(lead_times, dtype=np.int64) - 1]
+
+    def simulate(self, lead_times, reorder_points):
+        """
+        Estimate stockout probability and fill rate for candidate reorder points.
+
+        reorder_points is either a (candidates,) array shared by all products or a
+        (products, candidates) array. A stockout occurs when lead-time demand exceeds
+        the reorder point; fill rate is the share of lead-time demand served from it.
+        Returns a dict of (products, lead_times, candidates) arrays.
+        """
+        lead_times = np.atleast_1d(np.asarray(lead_times, dtype=np.int64))
+        num_products = self.demand_matrix.shape[0]
+        reorder_points = np.asarray(reorder_points, dtype=np.float32)
+        if reorder_points.ndim == 1:
+            reorder_points = np.broadcast_to(reorder_points, (num_products, reorder_points.shape[0]))
+        num_candidates = reorder_points.shape[1]
+
+        stockout_probability = np.zeros((num_products, len(lead_times), num_candidates), dtype=np.float32)
+        fill_rate = np.ones((num_products, len(lead_times), num_candidates), dtype=np.float32)
+        if num_products == 0 or self.demand_matrix.shape[1] == 0:
+            return {'stockout_probability': stockout_probability, 'fill_rate': fill_rate}
+
+        chunk_size = self._chunk_size(int(lead_times.max()), len(lead_times), num_candidates)
+        start_time = time.perf_counter()
+
+        for start in range(0, num_products, chunk_size):
+            stop = min(start + chunk_size, num_products)
+            demand = self.sample_lead_time_demand(self.demand_matrix[start:stop], lead_times)
+
+            # (products, paths, lead_times, candidates)
+            shortage = demand[..., None] - reorder_points[start:stop, None, None, :]
+            stockout_probability[start:stop] = np.count_nonzero(shortage > 0, axis=1) / self.NUM_PATHS
+
+            np.maximum(shortage, 0, out=shortage)
+            expected_shortage = shortage.sum(axis=1, dtype=np.float32) / self.NUM_PATHS
+            expected_demand = demand.sum(axis=1, dtype=np.float32)[..., None] / self.NUM_PATHS
+            with np.errstate(divide='ignore', invalid='ignore'):
+                chunk_fill_rate = 1 - expected_shortage / expected_demand
+            fill_rate[start:stop] = np.where(expected_demand > 0, chunk_fill_rate, 1.0)
+
+        logger.info(
+            f"Simulated {num_products} products x {self.NUM_PATHS} paths in "
+            f"{time.perf_counter() - start_time:.2f}s (chunk size {chunk_size})"
+        )
+        return {'stockout_probability': stockout_probability, 'fill_rate': fill_rate}
+
+
+if __name__ == "__main__":
+    from reorder_point_calculator import ReorderPointCalculator
+
+    calculator = ReorderPointCalculator()
+    results = calculator.simulate_service_levels()
+    print(json.dumps(results, indent=2))
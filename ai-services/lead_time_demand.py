@@ -0,0 +1,129 @@
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger("lead_time_demand")
+
+
+def daily_demand_pmf(demand_matrix):
+    """
+    Empirical probability mass function of daily demand for every product.
+
+    demand_matrix is a (products x days) array of units sold per day. Returns a
+    (products x max_units + 1) array where column k is P(daily demand == k).
+    """
+    demand = np.rint(np.asarray(demand_matrix)).astype(np.int64)
+    demand = np.clip(demand, 0, None)
+    num_products, num_days = demand.shape
+    num_units = int(demand.max()) + 1 if demand.size else 1
+
+    # One bincount over offset indices counts every product at once
+    offsets = np.arange(num_products, dtype=np.int64)[:, None] * num_units
+    counts = np.bincount((demand + offsets).ravel(), minlength=num_products * num_units)
+    pmf = counts.reshape(num_products, num_units).astype(np.float64)
+    if num_days > 0:
+        pmf /= num_days
+    else:
+        pmf[:, 0] = 1.0
+    return pmf
+
+
+class LeadTimeDemandModel:
+    """
+    Exact lead-time demand distributions via batched FFT convolution.
+
+    The distribution of total demand over L days is the L-fold convolution of the
+    daily demand pmf with itself, which is a single power in the frequency domain.
+    Products are sorted by their largest daily sale and transformed together in
+    chunks bounded by MAX_CHUNK_BYTES, each sized by its own largest product, so
+    one fast mover does not widen the distributions of the whole catalog.
+    """
+
+    def __init__(self, demand_matrix):
+        # Constants for the convolution
+        self.MAX_CHUNK_BYTES = 256 * 1024 * 1024  # Upper bound on the per-chunk working set
+
+        self.demand = np.clip(np.rint(np.asarray(demand_matrix)), 0, None).astype(np.int64)
+        self.num_products = self.demand.shape[0]
+        self.max_units = self.demand.max(axis=1) if self.demand.size else np.zeros(self.num_products, dtype=np.int64)
+        self.order = np.argsort(self.max_units, kind='stable')
+
+    def _chunk_bytes(self, lead_time_days, max_units):
+        """Working set per product of a chunk whose largest daily sale is max_units"""
+        support = lead_time_days * max_units + 1
+        fft_size = 1 << np.ceil(np.log2(support)).astype(np.int64)
+        # complex128 spectrum, the float64 inverse transform and the cdf of the support
+        return (fft_size // 2 + 1) * 16 + fft_size * 8 + support * 8
+
+    def _chunks(self, lead_time_days):
+        """
+        Yield (product rows, lead-time demand distributions of those rows) chunk
+        by chunk. Only one chunk of distributions exists at a time.
+        """
+        per_product = self._chunk_bytes(lead_time_days, self.max_units[self.order])
+        start = 0
+        while start < self.num_products:
+            # Sorted by size, so a chunk's cost is its length times its last product's cost
+            needed = np.arange(1, self.num_products - start + 1) * per_product[start:]
+            stop = start + max(1, int(np.searchsorted(needed, self.MAX_CHUNK_BYTES, side='right')))
+            rows = self.order[start:stop]
+
+            pmf = daily_demand_pmf(self.demand[rows])
+            support = lead_time_days * (pmf.shape[1] - 1) + 1
+            # Linear (not circular) convolution needs the full support
+            fft_size = 1 << int(np.ceil(np.log2(support)))
+            spectrum = np.fft.rfft(pmf, n=fft_size, axis=1)
+            distribution = np.fft.irfft(spectrum ** lead_time_days, n=fft_size, axis=1)[:, :support]
+
+            # Remove floating point noise and renormalise
+            np.clip(distribution, 0, None, out=distribution)
+            distribution /= distribution.sum(axis=1, keepdims=True)
+            yield rows, distribution
+            start = stop
+
+    def distribution(self, lead_time_days):
+        """
+        Distribution of total demand over the lead time for every product.
+
+        Returns a (products x support) array where column k is P(lead-time demand == k).
+        This materializes every distribution - reorder_points does not.
+        """
+        lead_time_days = int(lead_time_days)
+        if lead_time_days <= 0:
+            result = np.zeros((self.num_products, 1))
+            result[:, 0] = 1.0
+            return result
+
+        support = lead_time_days * int(self.max_units.max() if self.num_products else 0) + 1
+        result = np.zeros((self.num_products, support))
+        for rows, distribution in self._chunks(lead_time_days):
+            result[rows, :distribution.shape[1]] = distribution
+        return result
+
+    def reorder_points(self, lead_time_days, service_level):
+        """
+        Smallest reorder point per product whose cycle service level meets the target.
+
+        That is the service_level quantile of lead-time demand, returned together
+        with the expected lead-time demand as (reorder_points, mean_demand). Both
+        are read off each chunk of distributions as it is computed.
+        """
+        lead_time_days = int(lead_time_days)
+        reorder_points = np.zeros(self.num_products, dtype=np.int64)
+        mean_demand = np.zeros(self.num_products)
+        if lead_time_days <= 0:
+            return reorder_points, mean_demand
+
+        start_time = time.perf_counter()
+        for rows, distribution in self._chunks(lead_time_days):
+            cdf = np.cumsum(distribution, axis=1, out=distribution)
+            # Tolerance keeps exact quantiles from slipping a unit on rounding error
+            reorder_points[rows] = np.argmax(cdf >= service_level - 1e-9, axis=1)
+            # E[D] = sum over k of P(D > k), from the cdf already in hand
+            mean_demand[rows] = (1.0 - cdf[:, :-1]).sum(axis=1)
+
+        logger.info(
+            f"Computed {lead_time_days}-day reorder points for {self.num_products} products "
+            f"in {time.perf_counter() - start_time:.3f}s"
+        )
+        return reorder_points, mean_demand
@@ -0,0 +1,255 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Try importing the memory probes - handle gracefully if not available
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Latency buckets in seconds, from fast cache reads to full Prophet fits
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    A named metric with optional labels, rendered in the Prometheus text
+    format. Values are keyed by the tuple of label values. With collect, the
+    values are instead read when the metrics are rendered: collect() returns
+    {label values tuple: value}, for state another object already tracks.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=(), registry=None, collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        if self.collect is not None:
+            return [(self.name, tuple(str(v) for v in key), value) for key, value in sorted(self.collect().items())]
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value, *extra in self.samples():
+            lines.append(f'{name}{_labels(self.label_names, key, extra[0] if extra else None)} {_number(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', key, cumulative, [('le', _number(float(bound)))]))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _memory():
+    """Resident (and, where known, peak resident) memory of this process in bytes"""
+    if psutil is not None:
+        return {('resident',): psutil.Process().memory_info().rss}
+    memory = {}
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory[('peak_resident',)] = peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        with open('/proc/self/statm') as statm:
+            memory[('resident',)] = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return memory
+
+
+# --- Metrics shared by both services ---
+REQUEST_SECONDS = Histogram('stockpilot_request_seconds', 'HTTP request latency by endpoint', ['endpoint', 'method', 'status'])
+STAGE_SECONDS = Histogram('stockpilot_stage_seconds', 'Latency of each pipeline stage', ['stage'])
+ROWS_FETCHED = Counter('stockpilot_rows_fetched_total', 'Rows loaded from the data source', ['collection'])
+FITS = Counter('stockpilot_fits_total', 'Forecast model fits', ['model', 'outcome'])
+CACHE_REQUESTS = Counter('stockpilot_cache_requests_total', 'Cache lookups by result', ['cache', 'result'])
+PROCESS_MEMORY = Gauge('stockpilot_process_memory_bytes', 'Process memory', ['kind'], collect=_memory)
+
+
+def stage(name):
+    """Time a pipeline stage: with stage('mongo_fetch'): ..."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def timed_fit(model, fn, ok=None, stage_name=None):
+    """
+    Run fn as a fit of the given model: timed as stage '<model>_fit' (or
+    stage_name) and counted in FITS as ok or error (an exception, or ok(result)
+    returning False).
+    """
+    try:
+        with stage(stage_name or f'{model}_fit'):
+            result = fn()
+    except Exception:
+        FITS.inc(model=model, outcome='error')
+        raise
+    FITS.inc(model=model, outcome='ok' if ok is None or ok(result) else 'error')
+    return result
+
+
+# --- Stages timed in child processes ---
+# A child (e.g. product_forecaster.py) times its stages itself and reports them
+# on the last line of its stderr; the parent records them in STAGE_SECONDS.
+STAGE_TRAILER = 'STOCKPILOT_STAGE_SECONDS '
+
+_child_stages = {}
+
+
+@contextmanager
+def child_stage(name):
+    """Time a stage of a child process for its stage trailer"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _child_stages[name] = _child_stages.get(name, 0.0) + time.perf_counter() - start_time
+
+
+def write_stage_trailer():
+    """Write the trailer with the stages timed so far to stderr"""
+    if _child_stages:
+        sys.stderr.write(STAGE_TRAILER + json.dumps({name: round(seconds, 6) for name, seconds in _child_stages.items()}) + '\n')
+        sys.stderr.flush()
+
+
+def report_child_stages():
+    """Write the stage trailer when the child exits, whichever way it exits"""
+    atexit.register(write_stage_trailer)
+
+
+def record_child_stages(stderr, prefix=''):
+    """
+    Record the stage trailer found in a child's stderr in STAGE_SECONDS, each
+    stage as '<prefix><stage>'. Returns the stage timings (empty without a trailer).
+    """
+    for line in reversed((stderr or '').splitlines()):
+        if line.startswith(STAGE_TRAILER):
+            try:
+                stages = json.loads(line[len(STAGE_TRAILER):])
+            except ValueError:
+                return {}
+            for name, seconds in stages.items():
+                STAGE_SECONDS.observe(float(seconds), stage=f'{prefix}{name}')
+            return stages
+    return {}
+
+
+def render():
+    return REGISTRY.render()
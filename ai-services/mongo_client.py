@@ -0,0 +1,223 @@
+import pandas as pd
+import logging
+import os
+import threading
+from typing import Iterable, Optional
+
+# Try importing PyMongo - handle gracefully if not available
+try:
+    from pymongo import MongoClient
+except ImportError:
+    MongoClient = None
+
+logger = logging.getLogger("mongo_client")
+
+# The connection string carries credentials, so it only ever comes from the environment
+CONNECTION_STRING_VARIABLE = 'STOCKPILOT_MONGO_URI'
+DEFAULT_DATABASE = 'stockpilot_db_v5'
+
+# Client options read from the environment: option -> (variable, default)
+POOL_SETTINGS = {
+    'maxPoolSize': ('STOCKPILOT_MONGO_MAX_POOL_SIZE', 50),
+    'minPoolSize': ('STOCKPILOT_MONGO_MIN_POOL_SIZE', 0),
+    'maxIdleTimeMS': ('STOCKPILOT_MONGO_MAX_IDLE_MS', 300000),
+    'waitQueueTimeoutMS': ('STOCKPILOT_MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000),
+    'serverSelectionTimeoutMS': ('STOCKPILOT_MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+    'connectTimeoutMS': ('STOCKPILOT_MONGO_CONNECT_TIMEOUT_MS', 10000),
+    'socketTimeoutMS': ('STOCKPILOT_MONGO_SOCKET_TIMEOUT_MS', 60000)
+}
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def connection_string() -> str:
+    uri = os.environ.get(CONNECTION_STRING_VARIABLE, '').strip()
+    if not uri:
+        raise RuntimeError(f"{CONNECTION_STRING_VARIABLE} is not set - export the MongoDB connection string, "
+                           f"e.g. {CONNECTION_STRING_VARIABLE}=mongodb://localhost:27017")
+    return uri
+
+
+def database_name() -> str:
+    return os.environ.get('STOCKPILOT_MONGO_DATABASE', DEFAULT_DATABASE)
+
+
+def client_options() -> dict:
+    """Pool sizing and timeouts of the shared client"""
+    return {option: int(os.environ.get(variable, default)) for option, (variable, default) in POOL_SETTINGS.items()}
+
+
+def get_client():
+    """
+    The process-wide MongoClient, created on first use. A client keeps a
+    connection pool and monitors the servers, so it is built once per process
+    (and again after a fork, since pools cannot be shared across processes)
+    instead of paying the TLS handshake and server discovery on every call.
+    """
+    global _client, _client_pid
+    if MongoClient is None:
+        raise ImportError("PyMongo is required. Install with 'pip install pymongo'")
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(connection_string(), appname='stockpilot-ai-services', **client_options())
+            _client_pid = os.getpid()
+            logger.info(f"Created MongoDB client with {client_options()}")
+    return _client
+
+
+def get_database(name: Optional[str] = None):
+    """A database of the shared client; STOCKPILOT_MONGO_DATABASE by default"""
+    return get_client()[name or database_name()]
+
+
+def close_client() -> None:
+    """Close the shared client, e.g. on service shutdown or at the end of a script"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+# --- Repository functions ---
+# Each returns a DataFrame with exactly the requested columns. Ids keep their
+# stored type (ObjectIds or strings) so they can be passed back into queries.
+
+def _frame(cursor, columns: Optional[Iterable[str]]) -> pd.DataFrame:
+    return pd.DataFrame(list(cursor), columns=list(columns) if columns is not None else None)
+
+
+def _projection(columns: Optional[Iterable[str]]) -> Optional[dict]:
+    return {column: 1 for column in columns} if columns is not None else None
+
+
+def _date_range(start, end) -> dict:
+    query = {}
+    if start is not None:
+        query['$gte'] = pd.Timestamp(start).to_pydatetime()
+    if end is not None:
+        query['$lt'] = pd.Timestamp(end).to_pydatetime()
+    return query
+
+
+def find_newest(db=None, collection: str = 'sale_lines', field: str = 'sale_date'):
+    """Largest value of a field (an indexed lookup when it is indexed), or None"""
+    db = db if db is not None else get_database()
+    document = db[collection].find_one({field: {'$ne': None}}, {field: 1}, sort=[(field, -1)])
+    return document[field] if document is not None else None
+
+
+def find_sale_lines(db=None, product_id=None, start=None, end=None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Sale lines of one product or all products with start <= sale_date < end"""
+    db = db if db is not None else get_database()
+    query = {}
+    if product_id is not None:
+        query['product_id'] = product_id
+    if start is not None or end is not None:
+        query['sale_date'] = _date_range(start, end)
+    return _frame(db.sale_lines.find(query, _projection(columns)), columns)
+
+
+def find_sales(db=None, start=None, end=None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Sales with start <= sale_date < end"""
+    db = db if db is not None else get_database()
+    query = {'sale_date': _date_range(start, end)} if start is not None or end is not None else {}
+    return _frame(db.sales.find(query, _projection(columns)), columns)
+
+
+def find_sale_items(db=None, created_since=None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Sale items created at or after created_since"""
+    db = db if db is not None else get_database()
+    query = {'createdAt': _date_range(created_since, None)} if created_since is not None else {}
+    return _frame(db.sale_items.find(query, _projection(columns)), columns)
+
+
+def find_product_batches(db=None, product_id=None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Batches of one product, or every batch"""
+    db = db if db is not None else get_database()
+    query = {'product_id': product_id} if product_id is not None else {}
+    return _frame(db.product_batches.find(query, _projection(columns)), columns)
+
+
+def find_products(db=None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    db = db if db is not None else get_database()
+    return _frame(db.products.find({}, _projection(columns)), columns)
+
+
+def find_purchase_items(db=None, batch_ids: Optional[Iterable] = None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Purchase items of the given batches, or every purchase item"""
+    db = db if db is not None else get_database()
+    query = {'batch_id': {'$in': list(batch_ids)}} if batch_ids is not None else {}
+    return _frame(db.purchase_items.find(query, _projection(columns)), columns)
+
+
+def find_purchases(db=None, purchase_ids: Optional[Iterable] = None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """The given purchases, or every purchase"""
+    db = db if db is not None else get_database()
+    query = {'_id': {'$in': list(purchase_ids)}} if purchase_ids is not None else {}
+    return _frame(db.purchases.find(query, _projection(columns)), columns)
+
+
+# Collections whose documents are updated in place (stock levels, product
+# details, refreshed sale lines); their watermark also reads the newest
+# updatedAt. The others only grow.
+UPDATED_COLLECTIONS = ('product_batches', 'products', 'sale_lines')
+
+
+def find_watermark(db=None, collection: str = 'sale_lines', query: Optional[dict] = None) -> tuple:
+    """
+    Change marker of a collection, or of the documents matching query:
+    (collection, document count, newest _id, newest updatedAt). Any insert or
+    delete changes the count or newest _id and any in-place update of an
+    UPDATED_COLLECTIONS document its updatedAt. Reads indexes only.
+    """
+    db = db if db is not None else get_database()
+    coll = db[collection]
+    count = coll.count_documents(query) if query else coll.estimated_document_count()
+    newest = coll.find_one(query or {}, {'_id': 1}, sort=[('_id', -1)])
+    updated = None
+    if collection in UPDATED_COLLECTIONS:
+        latest = coll.find_one(query or {}, {'updatedAt': 1}, sort=[('updatedAt', -1)])
+        updated = latest.get('updatedAt') if latest else None
+    return collection, count, newest['_id'] if newest else None, updated
+
+
+# Deletions recorded by the writers that delete (bulk_upload's sync), so the
+# jobs deriving collections from others find deleted documents by reading the
+# tombstones since their watermark instead of comparing every id.
+# {collection, document_id, deletedAt}; expired by a TTL index (mongo_indexes).
+TOMBSTONES_COLLECTION = 'tombstones'
+
+
+def record_deletions(db, collection: str, document_ids: Iterable, deleted_at=None) -> int:
+    """Record tombstones for documents just deleted from collection"""
+    document_ids = list(document_ids)
+    if not document_ids:
+        return 0
+    deleted_at = deleted_at or pd.Timestamp.now('UTC').tz_localize(None).to_pydatetime()
+    db[TOMBSTONES_COLLECTION].insert_many(
+        [{'collection': collection, 'document_id': document_id, 'deletedAt': deleted_at} for document_id in document_ids],
+        ordered=False
+    )
+    return len(document_ids)
+
+
+def find_deletions(db, collection: str, since=None) -> tuple:
+    """
+    Ids of the documents of collection deleted after since, and the newest
+    deletion time among them (since when there were none)
+    """
+    query = {'collection': collection}
+    if since is not None:
+        query['deletedAt'] = {'$gt': since}
+    ids, newest = [], since
+    for tombstone in db[TOMBSTONES_COLLECTION].find(query, {'document_id': 1, 'deletedAt': 1}):
+        ids.append(tombstone['document_id'])
+        if newest is None or tombstone['deletedAt'] > newest:
+            newest = tombstone['deletedAt']
+    return ids, newest
@@ -0,0 +1,177 @@
+import argparse
+import logging
+import os
+
+# Try importing PyMongo - handle gracefully if not available
+try:
+    from pymongo import ASCENDING
+except ImportError:
+    ASCENDING = 1
+
+from mongo_client import MongoClient, get_database, close_client, database_name
+
+logger = logging.getLogger("mongo_indexes")
+
+# Indexes the services rely on: collection -> list of (name, keys[, create_index options])
+REQUIRED_INDEXES = {
+    'sale_items': [
+        ('batch_id_1', [('batch_id', ASCENDING)]),
+        ('sale_id_1', [('sale_id', ASCENDING)]),
+        ('createdAt_1', [('createdAt', ASCENDING)]),
+        # Sync watermarks of the stock ledger
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'sales': [
+        ('sale_date_1', [('sale_date', ASCENDING)]),
+        ('createdAt_1', [('createdAt', ASCENDING)]),
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'product_batches': [
+        ('product_id_1_expiry_date_1', [('product_id', ASCENDING), ('expiry_date', ASCENDING)]),
+        ('createdAt_1', [('createdAt', ASCENDING)]),
+        # Change watermark of the stock levels (mongo_client.find_watermark)
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'products': [
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'purchase_items': [
+        ('batch_id_1', [('batch_id', ASCENDING)]),
+        ('purchase_id_1', [('purchase_id', ASCENDING)]),
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'purchases': [
+        ('purchase_date_1', [('purchase_date', ASCENDING)]),
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'sale_lines': [
+        ('product_id_1_sale_date_1', [('product_id', ASCENDING), ('sale_date', ASCENDING)]),
+        ('sale_date_1', [('sale_date', ASCENDING)]),
+        # Change watermark of a product's lines, which refreshes replace in place
+        ('product_id_1_updatedAt_1', [('product_id', ASCENDING), ('updatedAt', ASCENDING)]),
+        ('updatedAt_1', [('updatedAt', ASCENDING)])
+    ],
+    'stock_movements': [
+        ('product_id_1_timestamp_1', [('product_id', ASCENDING), ('timestamp', ASCENDING)]),
+        ('source_1_source_id_1', [('source', ASCENDING), ('source_id', ASCENDING)]),
+        # One movement per revision of an item, so concurrent syncs cannot append twice.
+        # Movements recorded before revisions existed are left out of the constraint.
+        ('source_1_source_id_1_product_id_1_batch_id_1_timestamp_1_revision_1',
+         [('source', ASCENDING), ('source_id', ASCENDING), ('product_id', ASCENDING),
+          ('batch_id', ASCENDING), ('timestamp', ASCENDING), ('revision', ASCENDING)],
+         {'unique': True, 'partialFilterExpression': {'revision': {'$exists': True}}})
+    ],
+    'tombstones': [
+        ('collection_1_deletedAt_1', [('collection', ASCENDING), ('deletedAt', ASCENDING)]),
+        # Syncs run every minute or so; a month of tombstones covers any outage
+        ('deletedAt_1', [('deletedAt', ASCENDING)], {'expireAfterSeconds': 30 * 86400})
+    ],
+    'stock_snapshots': [
+        ('product_id_1_timestamp_1', [('product_id', ASCENDING), ('timestamp', ASCENDING)])
+    ]
+}
+
+
+def ensure_indexes(db, collections=None):
+    """
+    Create any missing required index. Indexes that already exist with the same
+    keys are left alone whatever their name, so this is safe to run repeatedly.
+    Returns the names of the indexes created.
+    """
+    created = []
+    for collection, indexes in REQUIRED_INDEXES.items():
+        if collections is not None and collection not in collections:
+            continue
+        existing = {tuple(tuple(key) for key in info['key']) for info in db[collection].index_information().values()}
+        for name, keys, *options in indexes:
+            if tuple(keys) in existing:
+                continue
+            db[collection].create_index(keys, name=name, **(options[0] if options else {}))
+            created.append(f'{collection}.{name}')
+            logger.info(f"Created index {name} on {collection}")
+    return created
+
+
+def _plan_stages(plan):
+    """Flatten a query plan tree into (stage, index name) pairs"""
+    stages = [(plan.get('stage'), plan.get('indexName'))]
+    children = [plan['inputStage']] if 'inputStage' in plan else plan.get('inputStages', [])
+    for child in children:
+        stages += _plan_stages(child)
+    return stages
+
+
+def explain_queries(db):
+    """
+    Run explain() on the per-product and date-windowed queries the services issue.
+    Returns {query name: (uses an index, winning plan stages)}; queries on empty
+    collections are skipped since there is nothing to build them from.
+    """
+    queries = {}
+    batch = db.product_batches.find_one({}, {'product_id': 1})
+    if batch is not None:
+        queries['product_batches by product_id'] = ('product_batches', {'product_id': batch['product_id']})
+        queries['sale_items by batch_id'] = ('sale_items', {'batch_id': {'$in': [batch['_id']]}})
+        queries['purchase_items by batch_id'] = ('purchase_items', {'batch_id': {'$in': [batch['_id']]}})
+    line = db.sale_lines.find_one({}, {'product_id': 1, 'sale_date': 1})
+    if line is not None:
+        queries['sale_lines by product and window'] = ('sale_lines', {'product_id': line['product_id'], 'sale_date': {'$gte': line['sale_date']}})
+    sale = db.sales.find_one({}, {'sale_date': 1, 'createdAt': 1})
+    if sale is not None:
+        queries['sale_items by sale_id'] = ('sale_items', {'sale_id': {'$in': [sale['_id']]}})
+        if sale.get('sale_date') is not None:
+            queries['sales by sale_date window'] = ('sales', {'sale_date': {'$gte': sale['sale_date']}})
+        if sale.get('createdAt') is not None:
+            queries['sales by createdAt watermark'] = ('sales', {'createdAt': {'$gt': sale['createdAt']}})
+
+    results = {}
+    for name, (collection, query) in queries.items():
+        plan = db[collection].find(query).explain()['queryPlanner']['winningPlan']
+        stages = _plan_stages(plan.get('queryPlan', plan))
+        uses_index = any(stage == 'IXSCAN' for stage, _ in stages) and not any(stage == 'COLLSCAN' for stage, _ in stages)
+        results[name] = (uses_index, stages)
+    return results
+
+
+def ensure_indexes_on_startup(database=None):
+    """
+    Build missing indexes when a service starts. Disabled with
+    STOCKPILOT_ENSURE_INDEXES=0; failures are logged and never stop the service.
+    """
+    if os.environ.get('STOCKPILOT_ENSURE_INDEXES', '1') == '0' or MongoClient is None:
+        return []
+    try:
+        created = ensure_indexes(get_database(database))
+        if created:
+            logger.info(f"Created MongoDB indexes: {', '.join(created)}")
+        return created
+    except Exception as e:
+        logger.warning(f"Could not ensure MongoDB indexes: {e}")
+        return []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and check the MongoDB indexes used by the StockPilot services.")
+    parser.add_argument("command", choices=["ensure", "verify"], help="Create missing indexes, or explain the hot queries.")
+    parser.add_argument("--database", type=str, default=database_name(), help="Database name.")
+    args = parser.parse_args()
+
+    if MongoClient is None:
+        print("❌ PyMongo is required. Install with 'pip install pymongo'")
+        exit(1)
+
+    db = get_database(args.database)
+    try:
+        if args.command == "ensure":
+            created = ensure_indexes(db)
+            print(f"✅ Created {len(created)} indexes" + (f": {', '.join(created)}" if created else " (all present)"))
+        else:
+            results = explain_queries(db)
+            for name, (uses_index, stages) in results.items():
+                plan = ' <- '.join(f"{stage}({index})" if index else stage for stage, index in stages)
+                print(f"{'✅' if uses_index else '❌'} {name}: {plan}")
+            if not all(uses_index for uses_index, _ in results.values()):
+                print("\n⚠️ Some queries scan whole collections. Run 'python mongo_indexes.py ensure'.")
+                exit(1)
+    finally:
+        close_client()
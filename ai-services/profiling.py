@@ -0,0 +1,274 @@
+import atexit
+import collections
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+logger = logging.getLogger("profiling")
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_KEEP = 50
+TOP_ALLOCATIONS = 25
+
+# Ask for a profile with this header (or ?profile=); the profile id comes back in PROFILE_ID_HEADER
+PROFILE_HEADER = 'X-StockPilot-Profile'
+PROFILE_ID_HEADER = 'X-StockPilot-Profile-Id'
+
+# Set for a forecaster subprocess started by a profiled request: the file prefix it writes to
+CHILD_ENV = 'STOCKPILOT_PROFILE_CHILD'
+
+_FILE_NAME = re.compile(r'^[\w.-]+$')
+_FALSE = ('', '0', 'false', 'no', 'off')
+
+# Profile file prefix of the request being profiled in this context, for its subprocesses
+_current_prefix = contextvars.ContextVar('profile_prefix', default=None)
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread records the Python stack of the
+    watched threads (all other threads when thread_ids is None) every interval
+    seconds. Stacks are counted in the collapsed format used by flamegraph.pl
+    and speedscope - one "root;...;leaf count" line per distinct stack.
+    """
+
+    def __init__(self, interval, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _start_tracemalloc():
+    """Start tracing allocations; returns False if something else already traces them"""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        return False
+    tracemalloc.start()
+    return True
+
+
+def _allocation_report(started_tracing):
+    """Top allocation sites still alive, by source line"""
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    if started_tracing:
+        tracemalloc.stop()
+    lines = [f"traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", '',
+             f"top {TOP_ALLOCATIONS} allocation sites:"]
+    for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}")
+    return '\n'.join(lines) + '\n', peak
+
+
+class ProfileSession:
+    """A running profile of one request, written to the profiles directory by stop()"""
+
+    def __init__(self, profiler, label, thread_ids):
+        self.profiler = profiler
+        self.label = label
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        self.prefix = os.path.join(profiler.directory, self.id)
+        self.sampler = StackSampler(profiler.interval, thread_ids)
+        self._started_tracing = _start_tracemalloc()
+        self._start_time = time.perf_counter()
+        self._token = _current_prefix.set(self.prefix)
+        self.sampler.start()
+
+    def stop(self, status=None):
+        """Write the profile files and return the profile id"""
+        try:
+            self.sampler.stop()
+            duration = time.perf_counter() - self._start_time
+            allocations, peak = _allocation_report(self._started_tracing)
+            with open(f"{self.prefix}.folded", 'w') as f:
+                f.write(self.sampler.folded())
+            with open(f"{self.prefix}.alloc.txt", 'w') as f:
+                f.write(allocations)
+            with open(f"{self.prefix}.json", 'w') as f:
+                json.dump({
+                    'id': self.id,
+                    'request': self.label,
+                    'status': status,
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'duration_seconds': round(duration, 3),
+                    'samples': self.sampler.samples,
+                    'interval_ms': self.profiler.interval * 1000,
+                    'peak_traced_bytes': peak
+                }, f, indent=2)
+            logger.info(f"Profiled {self.label} in {duration:.2f}s: {self.prefix}.*")
+        finally:
+            try:
+                _current_prefix.reset(self._token)
+            except ValueError:  # stopped from another context
+                _current_prefix.set(None)
+            self.profiler._finished()
+        return self.id
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of single requests.
+
+    Disabled unless STOCKPILOT_PROFILING is set. A request asks for a profile
+    with the X-StockPilot-Profile header or ?profile= - when
+    STOCKPILOT_PROFILING_TOKEN is set the value must equal it, and the same
+    token guards the list and download endpoints. The request runs under the
+    stack sampler and tracemalloc, and leaves <id>.folded (collapsed stacks
+    for a flamegraph), <id>.alloc.txt (top allocation sites) and <id>.json in
+    STOCKPILOT_PROFILE_DIR; forecaster subprocesses it starts add
+    <id>.child.* files. tracemalloc is process-wide, so one request is
+    profiled at a time - others asking meanwhile run unprofiled.
+    """
+
+    def __init__(self, enabled=None, token=None, directory=None, interval_ms=None, keep=None):
+        if enabled is None:
+            enabled = os.environ.get('STOCKPILOT_PROFILING', '').lower() not in _FALSE
+        self.enabled = enabled
+        self.token = token or os.environ.get('STOCKPILOT_PROFILING_TOKEN') or None
+        self.directory = directory or os.environ.get('STOCKPILOT_PROFILE_DIR', DEFAULT_PROFILE_DIR)
+        self.interval = float(interval_ms or os.environ.get('STOCKPILOT_PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS)) / 1000
+        self.keep = int(keep or os.environ.get('STOCKPILOT_PROFILE_KEEP', DEFAULT_KEEP))
+        self._busy = threading.Lock()
+
+    def authorized(self, *values):
+        """Whether a header or query value grants access to profiling"""
+        if not self.enabled:
+            return False
+        values = [value for value in values if value is not None and value.lower() not in _FALSE]
+        if not values:
+            return False
+        return self.token is None or self.token in values
+
+    def start(self, label, thread_ids=None):
+        """Start profiling a request, or return None if another profile is running"""
+        if not self._busy.acquire(blocking=False):
+            logger.warning(f"Not profiling {label}: another profile is running")
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._prune()
+            return ProfileSession(self, label, thread_ids)
+        except BaseException:
+            self._busy.release()
+            raise
+
+    def _finished(self):
+        self._busy.release()
+
+    def _prune(self):
+        """Delete the oldest profiles beyond the keep limit"""
+        profiles = sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
+        for profile_id in profiles[:max(0, len(profiles) - self.keep + 1)]:
+            for name in os.listdir(self.directory):
+                if name.startswith(profile_id + '.'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def list(self):
+        """Metadata of the saved profiles with their files, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(os.listdir(self.directory))
+        profiles = []
+        for name in reversed(names):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profile['files'] = [other for other in names if other.startswith(profile['id'] + '.')]
+            profiles.append(profile)
+        return profiles
+
+    def path(self, name):
+        """Path of a saved profile file, or None if there is no such file"""
+        if not _FILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+def child_env():
+    """
+    Environment for a subprocess started while handling a request: when the
+    request is profiled, the child profiles itself into the same profile.
+    None (inherit the environment) otherwise.
+    """
+    prefix = _current_prefix.get()
+    if prefix is None:
+        return None
+    return dict(os.environ, **{CHILD_ENV: prefix + '.child'})
+
+
+def profile_child():
+    """
+    Profile this process until it exits if the parent asked for it (see
+    child_env). Called at the top of scripts run as subprocesses.
+    """
+    prefix = os.environ.get(CHILD_ENV)
+    if not prefix:
+        return
+    sampler = StackSampler(float(os.environ.get('STOCKPILOT_PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS)) / 1000,
+                           [threading.main_thread().ident])
+    started_tracing = _start_tracemalloc()
+    sampler.start()
+
+    def write():
+        sampler.stop()
+        allocations, _ = _allocation_report(started_tracing)
+        with open(f"{prefix}.folded", 'w') as f:
+            f.write(sampler.folded())
+        with open(f"{prefix}.alloc.txt", 'w') as f:
+            f.write(allocations)
+
+    atexit.register(write)
+
+
+# Process-wide profiler configured from the environment
+profiler = RequestProfiler()
@@ -0,0 +1,424 @@
+import pandas as pd
+import argparse
+import itertools
+import logging
+import os
+import threading
+import time
+
+# Try importing PyMongo - handle gracefully if not available
+try:
+    from pymongo import ReplaceOne
+    from bson import ObjectId
+except ImportError:
+    ReplaceOne = None
+    ObjectId = None
+
+from data_sources import get_data_source, apply_filters
+from mongo_client import MongoClient, get_database, close_client, database_name, find_deletions
+from mongo_indexes import ensure_indexes
+
+logger = logging.getLogger("sale_lines")
+
+# One line per sale item with everything demand computations need, so readers
+# skip the sale_items -> product_batches -> sales join. _id is the sale item's id.
+SALE_LINE_COLUMNS = [
+    '_id', 'sale_id', 'batch_id', 'product_id', 'sale_date',
+    'quantity', 'mrp', 'customer_id', 'payment_mode', 'createdAt'
+]
+
+# Collection holding the refresh watermarks of materialized collections
+SYNC_STATE_COLLECTION = 'sync_state'
+
+# Fields of the sale items and sales a line is built from. Documents written by
+# the Node backend (backend/models) carry quantity_sold, batch_number/barcode
+# instead of batch_id, and date/payment_method on the sale.
+ITEM_COLUMNS = ['_id', 'sale_id', 'batch_id', 'quantity', 'mrp', 'createdAt', 'updatedAt',
+                'quantity_sold', 'batch_number', 'barcode']
+SALE_FIELDS = ['sale_date', 'customer_id', 'payment_mode', 'date', 'payment_method']
+NODE_SALE_FIELDS = {'sale_date': 'date', 'payment_mode': 'payment_method'}
+
+# Readers warn when the last refresh is older than this (STOCKPILOT_SALE_LINES_MAX_AGE)
+DEFAULT_MAX_AGE_SECONDS = 300
+# Seconds between background refreshes in the services (STOCKPILOT_SALE_LINES_REFRESH_SECONDS)
+DEFAULT_REFRESH_SECONDS = 60
+# Seconds between the background full id comparisons that catch deletes made
+# without a tombstone (STOCKPILOT_SALE_LINES_RECONCILE_SECONDS, 0 disables)
+DEFAULT_RECONCILE_SECONDS = 86400
+
+# Items inserted without an updatedAt (the Node backend) are found by their
+# ObjectId's creation time; this much before the watermark is re-checked, for
+# writers whose clocks lag or whose inserts were still in flight
+INSERT_LAG = pd.Timedelta(minutes=5)
+# Tombstones recorded this long before the watermark are read again
+TOMBSTONE_LAG = pd.Timedelta(minutes=1)
+
+
+def build_sale_lines(df_sales, df_sale_items, df_batches):
+    """
+    Join sale items with their batch's product_id and their sale's date, customer
+    and payment mode. Ids keep their original type (strings or ObjectIds); items
+    whose sale or batch is missing are dropped.
+    """
+    if df_sale_items.empty:
+        return pd.DataFrame(columns=SALE_LINE_COLUMNS)
+
+    # Compare ids as strings to handle ObjectIds
+    batch_products = pd.Series(df_batches['product_id'].values, index=df_batches['_id'].astype(str).values)
+    sales = df_sales.assign(_id_str=df_sales['_id'].astype(str)).drop_duplicates('_id_str').set_index('_id_str')
+    sale_keys = df_sale_items['sale_id'].astype(str)
+
+    lines = pd.DataFrame({
+        '_id': df_sale_items['_id'].values,
+        'sale_id': df_sale_items['sale_id'].values,
+        'batch_id': df_sale_items['batch_id'].values,
+        'product_id': df_sale_items['batch_id'].astype(str).map(batch_products).values,
+        'sale_date': sale_keys.map(sales['sale_date']).values,
+        'quantity': df_sale_items['quantity'].values,
+        'mrp': df_sale_items['mrp'].values if 'mrp' in df_sale_items.columns else None,
+        'customer_id': sale_keys.map(sales['customer_id']).values if 'customer_id' in sales.columns else None,
+        'payment_mode': sale_keys.map(sales['payment_mode']).values if 'payment_mode' in sales.columns else None,
+        'createdAt': df_sale_items['createdAt'].values if 'createdAt' in df_sale_items.columns else None
+    })
+
+    orphaned = lines['product_id'].isna() | lines['sale_date'].isna()
+    if orphaned.any():
+        logger.warning(f"Dropping {int(orphaned.sum())} sale items without a batch or sale")
+        lines = lines[~orphaned]
+    return lines.reset_index(drop=True)
+
+
+def load_sale_lines(source, columns=None, filters=None):
+    """
+    Read sale lines from a data source. Sources that have not materialized the
+    collection yet get the lines built from the base collections instead.
+    """
+    try:
+        lines = source.load('sale_lines', columns=columns, filters=filters)
+        if not lines.empty:
+            return lines
+    except FileNotFoundError:
+        pass
+
+    logger.info("sale_lines not materialized - joining the base collections")
+    lines = build_sale_lines(
+        source.load('sales', columns=['_id', 'sale_date', 'customer_id', 'payment_mode']),
+        source.load('sale_items'),
+        source.load('product_batches', columns=['_id', 'product_id'])
+    )
+    lines = apply_filters(lines, filters)
+    return lines[list(columns)] if columns is not None else lines
+
+
+def materialize_sale_lines(source, output_dir='.'):
+    """Write sale_lines.csv for CSV-based setups; returns the number of lines"""
+    lines = build_sale_lines(
+        source.load('sales', columns=['_id', 'sale_date', 'customer_id', 'payment_mode']),
+        source.load('sale_items'),
+        source.load('product_batches', columns=['_id', 'product_id'])
+    )
+    lines.to_csv(os.path.join(output_dir, 'sale_lines.csv'), index=False)
+    return len(lines)
+
+
+def _now():
+    """Current UTC time as the naive datetime MongoDB returns"""
+    return pd.Timestamp.now('UTC').tz_localize(None).to_pydatetime()
+
+
+def _frame(docs, columns):
+    df = pd.DataFrame(list(docs), columns=columns)
+    for column in ('createdAt', 'updatedAt'):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df
+
+
+def _resolve_lines(db, items):
+    """
+    Build the lines of a chunk of sale items, fetching their sales and batches
+    with $in lookups. Items and sales written by the Node backend are read too.
+    Returns (lines, items that could not be resolved) - those whose sale or
+    batch is missing, e.g. because it has not been written yet.
+    """
+    items = items.astype({'batch_id': object})
+    quantity = items['quantity'].where(items['quantity'].notna(), items['quantity_sold'])
+    items['quantity'] = pd.to_numeric(quantity, errors='coerce').astype('Int64')
+    by_number = items['batch_id'].isna() & items['batch_number'].notna()
+    if by_number.any():
+        batches = _frame(db.product_batches.find(
+            {'batch_number': {'$in': list(items.loc[by_number, 'batch_number'].unique())}},
+            {'batch_number': 1, 'barcode': 1}
+        ), ['_id', 'batch_number', 'barcode'])
+        batch_keys = batches['batch_number'].astype(str) + '|' + batches['barcode'].fillna('').astype(str)
+        batch_ids = pd.Series(batches['_id'].values, index=batch_keys.values)
+        batch_ids = batch_ids[~batch_ids.index.duplicated()]
+        item_keys = items.loc[by_number, 'batch_number'].astype(str) + '|' + items.loc[by_number, 'barcode'].fillna('').astype(str)
+        items.loc[by_number, 'batch_id'] = item_keys.map(batch_ids).values
+
+    df_sales = _frame(db.sales.find(
+        {'_id': {'$in': list(items['sale_id'].dropna().unique())}},
+        {field: 1 for field in SALE_FIELDS}
+    ), ['_id'] + SALE_FIELDS)
+    for field, node_field in NODE_SALE_FIELDS.items():
+        df_sales[field] = df_sales[field].where(df_sales[field].notna(), df_sales[node_field])
+    df_sales['sale_date'] = pd.to_datetime(df_sales['sale_date'], errors='coerce')
+    df_batches = _frame(db.product_batches.find(
+        {'_id': {'$in': list(items['batch_id'].dropna().unique())}},
+        {'product_id': 1}
+    ), ['_id', 'product_id'])
+
+    lines = build_sale_lines(df_sales, items, df_batches)
+    resolved = items['_id'].astype(str).isin(lines['_id'].astype(str))
+    return lines, items[~resolved.to_numpy()]
+
+
+def _chunked(values, chunk_size):
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+
+def _id_time(value):
+    """Creation time of an ObjectId (naive UTC), or None for other ids"""
+    if ObjectId is not None and isinstance(value, ObjectId):
+        return value.generation_time.replace(tzinfo=None)
+    return None
+
+
+def refresh_sale_lines(db, rebuild=False, reconcile=False, chunk_size=5000):
+    """
+    Bring the sale_lines collection up to date with sales and sale_items.
+
+    Each pass reads only what changed since its stored watermark, with indexed
+    range scans:
+    - items updated since the updatedAt watermark, or whose sale was;
+    - items inserted without an updatedAt - as the Node backend writes them -
+      found by their ObjectId's creation time, that have no line yet;
+    - tombstones of deleted items, sales and batches (recorded by bulk_upload's
+      sync), whose lines are removed.
+    Lines of items that no longer resolve to a sale and batch are removed, and
+    those items hold the watermarks back so they are retried. reconcile=True
+    also compares every item, line and sale id, catching deletes made without
+    a tombstone; the background refresher does so daily. With rebuild=True the
+    lines are rebuilt into a staging collection that then replaces sale_lines
+    in one rename. Returns the counts.
+    """
+    state = db[SYNC_STATE_COLLECTION].find_one({'_id': 'sale_lines'}) or {}
+    watermarks = {} if rebuild else dict(state.get('watermarks', {}))
+    if not rebuild and 'sale_items' not in watermarks and state.get('watermark') is not None:
+        # Earlier versions kept a createdAt watermark; no item was updated before it was created
+        watermarks['sale_items'] = state['watermark']
+    if not rebuild and watermarks and 'inserted' not in watermarks:
+        # Lines refreshed before the insert and tombstone watermarks existed
+        reconcile = True
+    target = db['sale_lines_staging'] if rebuild else db['sale_lines']
+    if rebuild:
+        target.drop()
+
+    since = watermarks.get('sale_items')
+    if since is None:
+        query = {}
+    else:
+        sales_since = watermarks.get('sales', since)
+        changed_sales = [doc['_id'] for doc in db.sales.find({'updatedAt': {'$gte': sales_since}}, {'_id': 1})]
+        query = {'$or': [{'updatedAt': {'$gte': since}}, {'sale_id': {'$in': changed_sales}}]}
+    # Read before the items, so a sale changed during the refresh is picked up next time
+    latest_sale = db.sales.find_one({'updatedAt': {'$ne': None}}, {'updatedAt': 1}, sort=[('updatedAt', -1)])
+
+    refreshed_at = _now()
+    counts = {'lines': 0, 'deleted': 0, 'unresolved': 0}
+    seen = set()
+    updated, held_back, held_back_ids = [], [], []
+
+    def process(cursor):
+        while True:
+            items = _frame(itertools.islice(cursor, chunk_size), ITEM_COLUMNS)
+            if items.empty:
+                break
+            seen.update(items['_id'].astype(str))
+            lines, unresolved = _resolve_lines(db, items)
+            # MongoDB keeps milliseconds - truncated so unchanged lines compare equal
+            for column in lines.select_dtypes('datetime').columns:
+                lines[column] = lines[column].dt.floor('ms')
+            lines = lines.astype(object).where(lines.notna(), None)
+            stored = {} if rebuild else {doc['_id']: doc for doc in target.find(
+                {'_id': {'$in': lines['_id'].tolist()}}, {'updatedAt': 0})}
+            # Only changed lines are written, stamped so the change watermarks of
+            # sale_lines see lines replaced in place
+            documents = [{**doc, 'updatedAt': refreshed_at} for doc in lines.to_dict('records')
+                         if stored.get(doc['_id']) != doc]
+            if documents:
+                target.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in documents], ordered=False)
+            if not rebuild and not unresolved.empty:
+                # Their sale or batch is gone (or not written yet) - not demand until it resolves
+                counts['deleted'] += target.delete_many({'_id': {'$in': unresolved['_id'].tolist()}}).deleted_count
+            counts['lines'] += len(documents)
+            counts['unresolved'] += len(unresolved)
+            updated.append(items['updatedAt'].max())
+            held_back.append(unresolved['updatedAt'].min())
+            held_back_ids.extend(time for time in map(_id_time, unresolved['_id']) if time is not None)
+
+    def delete_lines(field, values):
+        for chunk in _chunked(values, chunk_size):
+            counts['deleted'] += target.delete_many({field: {'$in': chunk}}).deleted_count
+
+    projection = {field: 1 for field in ITEM_COLUMNS[1:]}
+    process(db.sale_items.find(query, projection))
+
+    if not rebuild and 'inserted' in watermarks:
+        # Items inserted since the watermark that have no line yet
+        recent = [doc['_id'] for doc in db.sale_items.find(
+            {'_id': {'$gte': ObjectId.from_datetime(watermarks['inserted'] - INSERT_LAG)}}, {'_id': 1})]
+        recent = [value for value in recent if str(value) not in seen]
+        for chunk in _chunked(recent, chunk_size):
+            have_lines = {str(doc['_id']) for doc in target.find({'_id': {'$in': chunk}}, {'_id': 1})}
+            missing = [value for value in chunk if str(value) not in have_lines]
+            if missing:
+                process(db.sale_items.find({'_id': {'$in': missing}}, projection))
+
+    if not rebuild:
+        # Lines of deleted items, of deleted sales whose items were left behind,
+        # and of items whose batch was deleted
+        for collection, field in (('sale_items', '_id'), ('sales', 'sale_id'), ('product_batches', 'batch_id')):
+            tombstones_since = watermarks.get(f'tombstones_{collection}')
+            ids, newest = find_deletions(db, collection, tombstones_since - TOMBSTONE_LAG if tombstones_since else None)
+            delete_lines(field, ids)
+            watermarks[f'tombstones_{collection}'] = max(newest or refreshed_at, tombstones_since or refreshed_at)
+
+    if reconcile and not rebuild:
+        item_ids = {str(doc['_id']): doc['_id'] for doc in db.sale_items.find({}, {'_id': 1})}
+        line_ids = {str(doc['_id']): doc['_id'] for doc in target.find({}, {'_id': 1})}
+        missing = [value for key, value in item_ids.items() if key not in line_ids and key not in seen]
+        for chunk in _chunked(missing, chunk_size):
+            process(db.sale_items.find({'_id': {'$in': chunk}}, projection))
+        delete_lines('_id', [value for key, value in line_ids.items() if key not in item_ids])
+        sale_ids = {str(doc['_id']) for doc in db.sales.find({}, {'_id': 1})}
+        delete_lines('sale_id', [value for value in target.distinct('sale_id') if str(value) not in sale_ids])
+
+    if rebuild and counts['lines']:
+        target.rename('sale_lines', dropTarget=True)
+        ensure_indexes(db, ['sale_lines'])
+
+    newest = max((value for value in updated if pd.notna(value)), default=None)
+    oldest_unresolved = min((value for value in held_back if pd.notna(value)), default=None)
+    if oldest_unresolved is not None:
+        logger.warning(f"sale_lines: holding the watermark at {oldest_unresolved} for items without a sale or batch")
+        newest = oldest_unresolved if newest is None else min(newest, oldest_unresolved)
+    if newest is not None:
+        watermarks['sale_items'] = pd.Timestamp(newest).to_pydatetime()
+    if latest_sale is not None:
+        watermarks['sales'] = latest_sale['updatedAt']
+    # Everything inserted before the refresh started has been seen, except unresolved items
+    watermarks['inserted'] = min([refreshed_at] + held_back_ids)
+    if rebuild:
+        # A rebuild reads the items as they are now: no earlier tombstone concerns it
+        for collection in ('sale_items', 'sales', 'product_batches'):
+            watermarks[f'tombstones_{collection}'] = refreshed_at
+
+    update = {'watermarks': watermarks, 'refreshed_at': refreshed_at}
+    if reconcile or rebuild:
+        update['reconciled_at'] = refreshed_at
+    if rebuild or counts['lines'] or counts['deleted']:
+        update['changed_at'] = refreshed_at
+    db[SYNC_STATE_COLLECTION].update_one({'_id': 'sale_lines'}, {'$set': update, '$unset': {'watermark': ''}}, upsert=True)
+    logger.info(f"sale_lines refresh: {counts}")
+    return counts
+
+
+def sale_lines_changed_at(db):
+    """When a refresh last changed sale_lines, or None if it never ran"""
+    state = db[SYNC_STATE_COLLECTION].find_one({'_id': 'sale_lines'}, {'changed_at': 1}) or {}
+    return state.get('changed_at')
+
+
+def check_sale_lines(db, max_age=None):
+    """
+    Warn when sale_lines were never materialized or the background refresh
+    has fallen more than max_age seconds (STOCKPILOT_SALE_LINES_MAX_AGE)
+    behind. Readers only read sale_lines - the services' SaleLinesRefresher
+    and the loaders keep them up to date. Returns when they were last refreshed.
+    """
+    if max_age is None:
+        max_age = float(os.environ.get('STOCKPILOT_SALE_LINES_MAX_AGE', DEFAULT_MAX_AGE_SECONDS))
+    state = db[SYNC_STATE_COLLECTION].find_one({'_id': 'sale_lines'}, {'refreshed_at': 1}) or {}
+    refreshed_at = state.get('refreshed_at')
+    if refreshed_at is None:
+        logger.warning("sale_lines have never been materialized - run 'python sale_lines.py rebuild'")
+    elif (_now() - refreshed_at).total_seconds() > max_age:
+        logger.warning(f"sale_lines were last refreshed at {refreshed_at} - is the background refresh running?")
+    return refreshed_at
+
+
+class SaleLinesRefresher:
+    """
+    Background job keeping sale_lines, and the stock ledger recorded from the
+    same items, in step with the base collections. Other writers - the Node
+    backend records sales directly - never call the refresh themselves.
+    """
+
+    def __init__(self, database=None):
+        self.database = database
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Refresh incrementally, with a full id comparison every STOCKPILOT_SALE_LINES_RECONCILE_SECONDS"""
+        from stock_ledger import sync_stock_ledger
+        db = get_database(self.database)
+        every = float(os.environ.get('STOCKPILOT_SALE_LINES_RECONCILE_SECONDS', DEFAULT_RECONCILE_SECONDS))
+        with self._lock:
+            state = db[SYNC_STATE_COLLECTION].find_one({'_id': 'sale_lines'}, {'reconciled_at': 1}) or {}
+            reconciled_at = state.get('reconciled_at')
+            reconcile = every > 0 and (reconciled_at is None or (_now() - reconciled_at).total_seconds() >= every)
+            counts = refresh_sale_lines(db, reconcile=reconcile)
+            counts['movements'] = sync_stock_ledger(db, reconcile=reconcile)['movements']
+        return counts
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"sale_lines refresh failed: {e}")
+
+    def start(self, interval=None):
+        """Refresh in the background every interval seconds, the first time after one interval"""
+        if self._thread is not None:
+            return
+        if interval is None:
+            interval = float(os.environ.get('STOCKPILOT_SALE_LINES_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='sale-lines-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize the denormalized sale_lines collection.")
+    parser.add_argument("command", choices=["refresh", "reconcile", "rebuild", "csv"],
+                        help="Incremental MongoDB refresh, refresh with a full id comparison, full MongoDB rebuild, or write sale_lines.csv.")
+    parser.add_argument("--database", type=str, default=database_name(), help="MongoDB database name.")
+    parser.add_argument("--input-dir", type=str, default=".", help="Directory of the CSV files (csv command).")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.command == "csv":
+        count = materialize_sale_lines(get_data_source('csv', base_dir=args.input_dir), args.input_dir)
+    else:
+        if MongoClient is None:
+            print("❌ PyMongo is required. Install with 'pip install pymongo'")
+            exit(1)
+        try:
+            counts = refresh_sale_lines(get_database(args.database), rebuild=args.command == "rebuild",
+                                        reconcile=args.command == "reconcile")
+        finally:
+            close_client()
+        count = counts['lines']
+        print(f"✅ Removed {counts['deleted']} stale lines; {counts['unresolved']} items without a sale or batch")
+    print(f"✅ Wrote {count} sale lines in {time.perf_counter() - start_time:.2f}s")
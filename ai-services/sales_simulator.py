@@ -0,0 +1,224 @@
+import pandas as pd
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger("sales_simulator")
+
+HEX_DIGITS = np.array(list('0123456789abcdef'))
+
+
+def object_id_strings(count, timestamps, rng):
+    """
+    Vectorized MongoDB ObjectId hex strings.
+
+    Follows the ObjectId layout - 4-byte seconds timestamp, 5 random bytes and a
+    3-byte counter - but draws the random bytes from rng so output is reproducible.
+    """
+    timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.int64), (count,))
+    raw = np.empty((count, 12), dtype=np.uint8)
+    raw[:, :4] = (timestamps[:, None] >> np.array([24, 16, 8, 0])) & 0xFF
+    raw[:, 4:9] = rng.integers(0, 256, size=5, dtype=np.uint8)
+    counter = np.arange(count, dtype=np.int64) + int(rng.integers(0, 1 << 24))
+    raw[:, 9:] = (counter[:, None] >> np.array([16, 8, 0])) & 0xFF
+
+    # Two hex digits per byte, joined into fixed-width unicode strings
+    nibbles = np.empty((count, 24), dtype=np.uint8)
+    nibbles[:, 0::2] = raw >> 4
+    nibbles[:, 1::2] = raw & 0x0F
+    return HEX_DIGITS[nibbles].view('<U24').ravel()
+
+
+def mongo_timestamps(datetimes):
+    """Format datetime64 values the way the generated CSVs store dates"""
+    seconds = np.datetime_as_string(np.asarray(datetimes, dtype='datetime64[s]'), unit='s')
+    return np.char.add(seconds, '.000+00:00')
+
+
+class SalesSimulator:
+    """
+    Vectorized, seeded sales simulator.
+
+    Each simulated day draws all of its sales and items in one batch from a seeded
+    numpy Generator. Items that would oversell a batch are removed by ranking the
+    draws of each batch with cumulative counts, and stock is depleted in a single
+    bincount, so there is no per-item Python loop.
+    """
+
+    def __init__(self, df_batches, df_customers, seed=None):
+        # Constants for the simulation
+        self.BASE_SALES_PER_DAY = 20  # Average number of sales on a normal day
+        self.WEEKEND_MULTIPLIER = 1.5  # Traffic multiplier from Friday to Sunday
+        self.WEEKDAY_MULTIPLIER = 0.9  # Traffic multiplier from Monday to Thursday
+        self.ANNUAL_SEASONALITY = 0.0  # Amplitude of a yearly sine wave on traffic
+        self.MAX_ITEMS_PER_SALE = 4  # Items per sale are drawn from 1..MAX_ITEMS_PER_SALE
+        self.TAX_RATES = np.array([5, 12, 18])
+        self.DISCOUNT_RATES = np.array([0, 5, 10])
+        self.DISCOUNT_PROBABILITY = 0.3
+        self.PAYMENT_MODES = np.array(['UPI', 'CARD', 'CASH'])
+
+        self.rng = np.random.default_rng(seed)
+        self.df_batches = df_batches.reset_index(drop=True).copy()
+        self.df_customers = df_customers.reset_index(drop=True)
+
+        # Handle both old and new schema
+        id_column = '_id' if '_id' in self.df_batches.columns else 'batch_id'
+        self.batch_ids = self.df_batches[id_column].astype(str).to_numpy()
+        self.mrp = self.df_batches['mrp'].to_numpy()
+        self.stock = self.df_batches['quantity_in_stock'].fillna(0).to_numpy(dtype=np.int64).copy()
+        self.customer_ids = self.df_customers['_id'].astype(str).to_numpy() if '_id' in self.df_customers.columns else None
+
+        # Random popularity score used as the sampling weight for each batch
+        self.popularity = self.rng.integers(1, 11, size=len(self.df_batches)).astype(np.float64)
+
+    def limit_skus(self, num_skus):
+        """Restrict the simulation to a random subset of num_skus batches"""
+        if num_skus is None or num_skus >= len(self.batch_ids):
+            return
+        keep = np.zeros(len(self.batch_ids), dtype=bool)
+        keep[self.rng.choice(len(self.batch_ids), size=num_skus, replace=False)] = True
+        self.popularity[~keep] = 0
+
+    def _traffic(self, dates):
+        """Expected number of sales for each simulated day"""
+        weekday = dates.weekday.to_numpy()
+        multiplier = np.where(weekday >= 4, self.WEEKEND_MULTIPLIER, self.WEEKDAY_MULTIPLIER)
+        season = 1 + self.ANNUAL_SEASONALITY * np.sin(2 * np.pi * dates.dayofyear.to_numpy() / 365.25)
+        noise = self.rng.uniform(0.8, 1.2, size=len(dates))
+        return (self.BASE_SALES_PER_DAY * multiplier * season * noise).astype(np.int64)
+
+    def _simulate_day(self, num_sales):
+        """
+        Draw one day of sales. Returns (sale_index, batch_index) of the items that
+        could be fulfilled, with sale_index local to the day.
+        """
+        weights = self.popularity * (self.stock > 0)
+        total_weight = weights.sum()
+        if num_sales <= 0 or total_weight <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        items_per_sale = self.rng.integers(1, self.MAX_ITEMS_PER_SALE + 1, size=num_sales)
+        sale_index = np.repeat(np.arange(num_sales), items_per_sale)
+        batch_index = self.rng.choice(len(weights), size=len(sale_index), p=weights / total_weight)
+
+        # Rank each draw among the draws of the same batch; keep those within stock
+        order = np.argsort(batch_index, kind='stable')
+        sorted_batches = batch_index[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_batches[1:] != sorted_batches[:-1]])
+        group_sizes = np.diff(np.r_[group_start, len(sorted_batches)])
+        rank = np.arange(len(sorted_batches)) - np.repeat(group_start, group_sizes)
+        fulfilled = np.zeros(len(batch_index), dtype=bool)
+        fulfilled[order] = rank < self.stock[sorted_batches]
+
+        # One unit sold per item
+        self.stock -= np.bincount(batch_index[fulfilled], minlength=len(self.stock))
+        return sale_index[fulfilled], batch_index[fulfilled]
+
+    def simulate(self, num_days=180, end_date='2025-09-26'):
+        """
+        Simulate num_days of sales ending the day before end_date.
+
+        Returns (df_sales, df_sale_items, df_batches) in the MongoDB CSV schema, with
+        quantity_in_stock of df_batches depleted by the simulated sales.
+        """
+        start_time = time.perf_counter()
+        end_date = pd.Timestamp(end_date).normalize()
+        dates = pd.date_range(end=end_date - pd.Timedelta(days=1), periods=num_days, freq='D')
+        traffic = self._traffic(dates)
+
+        sale_days, item_sales, item_batches = [], [], []
+        total_sales = 0
+        days_simulated = 0
+        for day, num_sales in enumerate(traffic):
+            sale_index, batch_index = self._simulate_day(int(num_sales))
+            if len(sale_index) == 0:
+                if not (self.stock > 0).any():
+                    logger.warning(f"Ran out of all stock on day {day}. Stopping simulation.")
+                    break
+                days_simulated += 1
+                continue
+
+            # Renumber the day's sales that kept at least one item
+            sales_today, item_sale_index = np.unique(sale_index, return_inverse=True)
+            sale_days.append(np.full(len(sales_today), day))
+            item_sales.append(item_sale_index + total_sales)
+            item_batches.append(batch_index)
+            total_sales += len(sales_today)
+            days_simulated += 1
+
+        self.days_simulated = days_simulated
+        if total_sales == 0:
+            return pd.DataFrame(), pd.DataFrame(), self._updated_batches()
+
+        sale_days = np.concatenate(sale_days)
+        item_sales = np.concatenate(item_sales)
+        item_batches = np.concatenate(item_batches)
+        num_items = len(item_sales)
+
+        # Sale-level attributes
+        minutes = self.rng.integers(9 * 60, 22 * 60, size=total_sales)
+        sale_datetimes = dates.values[sale_days].astype('datetime64[m]') + minutes.astype('timedelta64[m]')
+        order = np.argsort(sale_datetimes, kind='stable')
+        sale_epoch = sale_datetimes.astype('datetime64[s]').astype(np.int64)
+
+        # Item-level attributes - one unit of each item
+        mrp = self.mrp[item_batches]
+        tax = self.rng.choice(self.TAX_RATES, size=num_items)
+        discount = np.where(
+            self.rng.random(num_items) < self.DISCOUNT_PROBABILITY,
+            self.rng.choice(self.DISCOUNT_RATES, size=num_items),
+            0
+        )
+        item_total = mrp * (1 + tax / 100) * (1 - discount / 100)
+        total_amount = np.bincount(item_sales, weights=item_total, minlength=total_sales)
+
+        # Repeated strings are stored as categoricals over shared categories, which
+        # keeps millions of rows compact and writes the same CSV text
+        sale_ids = object_id_strings(total_sales, sale_epoch, self.rng)
+        minute_values, minute_codes = np.unique(sale_datetimes, return_inverse=True)
+        minute_strings = mongo_timestamps(minute_values)
+        sale_timestamps = pd.Categorical.from_codes(minute_codes, minute_strings)
+        if self.customer_ids is not None and len(self.customer_ids) > 0:
+            customer_ids = pd.Categorical(self.customer_ids)[self.rng.integers(0, len(self.customer_ids), size=total_sales)]
+        else:
+            customer_ids = np.full(total_sales, None)
+
+        df_sales = pd.DataFrame({
+            '_id': sale_ids,
+            'customer_id': customer_ids,
+            'sale_date': sale_timestamps,
+            'total_amount': np.round(total_amount, 2),
+            'payment_mode': pd.Categorical.from_codes(self.rng.integers(0, len(self.PAYMENT_MODES), size=total_sales), self.PAYMENT_MODES),
+            'createdAt': sale_timestamps,
+            'updatedAt': sale_timestamps,
+            '__v': 0
+        }).iloc[order].reset_index(drop=True)
+
+        item_timestamps = pd.Categorical.from_codes(minute_codes[item_sales], minute_strings)
+        df_sale_items = pd.DataFrame({
+            '_id': object_id_strings(num_items, sale_epoch[item_sales], self.rng),
+            'sale_id': pd.Categorical.from_codes(item_sales, sale_ids),
+            'batch_id': pd.Categorical(self.batch_ids)[item_batches],
+            'quantity': 1,
+            'mrp': mrp,
+            'tax_percent': tax,
+            'discount_percent': discount,
+            'createdAt': item_timestamps,
+            'updatedAt': item_timestamps,
+            '__v': 0
+        })
+
+        logger.info(
+            f"Simulated {total_sales} sales ({num_items} items) over {days_simulated} days "
+            f"in {time.perf_counter() - start_time:.2f}s"
+        )
+        return df_sales, df_sale_items, self._updated_batches(end_date)
+
+    def _updated_batches(self, updated_at=None):
+        """Batches with simulated stock depletion applied"""
+        df_batches = self.df_batches.copy()
+        changed = df_batches['quantity_in_stock'].fillna(0).to_numpy(dtype=np.int64) != self.stock
+        df_batches['quantity_in_stock'] = self.stock
+        if updated_at is not None and 'updatedAt' in df_batches.columns and changed.any():
+            df_batches.loc[changed, 'updatedAt'] = mongo_timestamps([np.datetime64(updated_at, 's')])[0]
+        return df_batches
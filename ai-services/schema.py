@@ -0,0 +1,185 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+
+logger = logging.getLogger("schema")
+
+# Column kinds
+ID = 'id'                # Unique document id, kept as a string
+REFERENCE = 'reference'  # Foreign key - stored as a categorical when its ids repeat
+CATEGORY = 'category'    # Small set of repeated labels
+STRING = 'string'        # Free text, read verbatim (phones keep leading zeros)
+INT32 = 'int32'
+FLOAT32 = 'float32'      # Unit prices and percentages
+FLOAT64 = 'float64'      # Totals, which need more than float32's 7 significant digits
+TIMESTAMP = 'timestamp'
+
+# A reference column becomes categorical when it has at most this many distinct
+# values per row; nearly unique references are cheaper as plain strings
+REFERENCE_CATEGORY_RATIO = 0.5
+
+# Timestamps are written by MongoDB exports and the generators as
+# 2025-09-27T02:57:33.358+00:00; other ISO 8601 variants fall back to a slower parse
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+_AUDIT_COLUMNS = {'createdAt': TIMESTAMP, 'updatedAt': TIMESTAMP, '__v': INT32}
+
+SCHEMAS = {
+    'vendors': {
+        '_id': ID, 'vendor_name': STRING, 'phone': STRING, 'email': STRING, 'address': STRING,
+        'gst_number': STRING, 'payment_terms': CATEGORY, **_AUDIT_COLUMNS
+    },
+    'customers': {
+        '_id': ID, 'customer_name': STRING, 'phone': STRING, 'email': STRING, 'address': STRING,
+        'gst_number': STRING, **_AUDIT_COLUMNS
+    },
+    'products': {
+        '_id': ID, 'product_name': STRING, 'category': CATEGORY, 'hsn_code': STRING,
+        'description': STRING, **_AUDIT_COLUMNS
+    },
+    'product_batches': {
+        '_id': ID, 'product_id': REFERENCE, 'batch_number': STRING, 'barcode': STRING,
+        'expiry_date': TIMESTAMP, 'mrp': FLOAT32, 'quantity_in_stock': INT32, **_AUDIT_COLUMNS
+    },
+    'purchases': {
+        '_id': ID, 'vendor_id': REFERENCE, 'bill_no': STRING, 'purchase_date': TIMESTAMP,
+        'total_amount': FLOAT64, 'payment_status': CATEGORY, **_AUDIT_COLUMNS
+    },
+    'purchase_items': {
+        '_id': ID, 'purchase_id': REFERENCE, 'batch_id': REFERENCE, 'quantity': INT32,
+        'purchase_rate': FLOAT32, 'tax_percent': FLOAT32, 'discount_percent': FLOAT32, **_AUDIT_COLUMNS
+    },
+    'sales': {
+        '_id': ID, 'customer_id': REFERENCE, 'sale_date': TIMESTAMP, 'total_amount': FLOAT64,
+        'payment_mode': CATEGORY, **_AUDIT_COLUMNS
+    },
+    'sale_items': {
+        '_id': ID, 'sale_id': REFERENCE, 'batch_id': REFERENCE, 'quantity': INT32, 'mrp': FLOAT32,
+        'tax_percent': FLOAT32, 'discount_percent': FLOAT32, **_AUDIT_COLUMNS
+    },
+    'sale_lines': {
+        '_id': ID, 'sale_id': REFERENCE, 'batch_id': REFERENCE, 'product_id': REFERENCE,
+        'sale_date': TIMESTAMP, 'quantity': INT32, 'mrp': FLOAT32, 'customer_id': REFERENCE,
+        'payment_mode': CATEGORY, 'createdAt': TIMESTAMP
+    }
+}
+
+# Foreign keys of each collection: field -> referenced collection
+FOREIGN_KEYS = {
+    'product_batches': {'product_id': 'products'},
+    'purchases': {'vendor_id': 'vendors'},
+    'sales': {'customer_id': 'customers'},
+    'purchase_items': {'purchase_id': 'purchases', 'batch_id': 'product_batches'},
+    'sale_items': {'sale_id': 'sales', 'batch_id': 'product_batches'}
+}
+
+
+def timestamp_columns(collection=None):
+    """Timestamp columns of one collection, or of every collection"""
+    schemas = [SCHEMAS.get(collection, {})] if collection is not None else SCHEMAS.values()
+    return sorted({column for schema in schemas for column, kind in schema.items() if kind == TIMESTAMP})
+
+
+def csv_dtypes(collection):
+    """read_csv dtypes so text columns are never inferred as numbers and labels load as categoricals"""
+    dtypes = {}
+    for column, kind in SCHEMAS.get(collection, {}).items():
+        if kind == CATEGORY:
+            dtypes[column] = 'category'
+        elif kind in (ID, REFERENCE, STRING):
+            dtypes[column] = str
+    return dtypes
+
+
+def parse_timestamps(series):
+    """Parse timestamps to timezone-naive UTC, trying the declared format first"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, 'tz', None) is not None:
+            return series.dt.tz_convert('UTC').dt.tz_localize(None)
+        return series
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Parse each distinct timestamp once
+        categories = parse_timestamps(pd.Series(series.cat.categories))
+        return pd.Series(categories.to_numpy()[series.cat.codes.to_numpy()], index=series.index).where(series.notna())
+    try:
+        parsed = pd.to_datetime(series, format=TIMESTAMP_FORMAT, utc=True)
+    except (ValueError, TypeError):
+        parsed = pd.to_datetime(series, format='ISO8601', errors='coerce', utc=True)
+    return parsed.dt.tz_localize(None)
+
+
+def _to_category(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    # ObjectIds and other objects are compared as strings everywhere else
+    if series.dtype == object:
+        series = series.where(series.isna(), series.astype(str))
+    return series.astype('category')
+
+
+def apply_schema(df, collection):
+    """
+    Convert the columns of a loaded collection to their declared dtypes. Integer
+    columns with missing values fall back to float32; unknown columns are kept.
+    """
+    for column, kind in SCHEMAS.get(collection, {}).items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if kind == TIMESTAMP:
+            df[column] = parse_timestamps(series)
+        elif kind == CATEGORY:
+            df[column] = _to_category(series)
+        elif kind == REFERENCE:
+            if series.nunique() <= REFERENCE_CATEGORY_RATIO * len(series):
+                df[column] = _to_category(series)
+            elif series.dtype == object:
+                df[column] = series.where(series.isna(), series.astype(str))
+        elif kind == INT32:
+            numeric = pd.to_numeric(series, errors='coerce')
+            df[column] = numeric.astype(np.int32) if numeric.notna().all() else numeric.astype(np.float32)
+        elif kind in (FLOAT32, FLOAT64):
+            df[column] = pd.to_numeric(series, errors='coerce').astype(kind)
+    return df
+
+
+def memory_report(source, collections=None):
+    """
+    Compare the memory of each collection loaded as a plain loader would (no
+    dtypes given) and with the schema applied. Returns a DataFrame of megabytes
+    per collection.
+    """
+    rows = []
+    for collection in collections or SCHEMAS:
+        try:
+            inferred = source.load_raw(collection)
+            typed = source.load(collection)
+        except FileNotFoundError:
+            continue
+        before = inferred.memory_usage(deep=True).sum() / 1e6
+        after = typed.memory_usage(deep=True).sum() / 1e6
+        rows.append({'collection': collection, 'rows': len(typed), 'inferred_mb': round(before, 2),
+                     'typed_mb': round(after, 2), 'saved_pct': round(100 * (1 - after / before), 1) if before else 0.0})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from data_sources import get_data_source
+
+    parser = argparse.ArgumentParser(description="Report the memory saved by the typed collection schemas.")
+    parser.add_argument("command", choices=["report"], help="Command to run.")
+    parser.add_argument("--source", choices=["csv", "mongo", "parquet"], default="csv", help="Where to read the collections from.")
+    parser.add_argument("--input-dir", type=str, default=None, help="Directory of the CSV files or Parquet snapshot.")
+    args = parser.parse_args()
+
+    kwargs = {'base_dir': args.input_dir} if args.input_dir and args.source != 'mongo' else {}
+    source = get_data_source(args.source, **kwargs)
+    try:
+        report = memory_report(source)
+    finally:
+        source.close()
+    print(report.to_string(index=False))
+    total_before, total_after = report['inferred_mb'].sum(), report['typed_mb'].sum()
+    if total_before:
+        print(f"\n📊 {total_before:.1f} MB -> {total_after:.1f} MB ({100 * (1 - total_after / total_before):.1f}% saved)")
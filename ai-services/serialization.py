@@ -0,0 +1,167 @@
+import gzip
+import json
+import math
+from datetime import date, datetime
+
+from metrics import stage
+
+# Try importing the fast encoder and Brotli - handle gracefully if not available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response shapes of record lists: one object per row, or one array per field
+SHAPES = ['records', 'columns']
+
+# Bodies smaller than this are sent uncompressed - the headers would outweigh the savings
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+def _default(obj):
+    """Encode the values the JSON encoder has no native support for"""
+    # pandas and NumPy are imported on first use to keep service startup fast
+    import numpy as np
+    import pandas as pd
+    if isinstance(obj, (datetime, date, pd.Timestamp)):
+        # ISO 8601; datetimes keep their time (sale times, refresh stamps)
+        return obj.isoformat() if not pd.isna(obj) else None
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return None if np.isnan(obj) else float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.Series):
+        return _column(obj)
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('records')
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    # ObjectIds and anything else with a sensible string form
+    return str(obj)
+
+
+def _column(series):
+    """
+    A Series as a JSON-ready column. With orjson, numeric and boolean columns are
+    passed as NumPy arrays and encoded without creating a Python object per value.
+    """
+    import numpy as np
+    import pandas as pd
+    if orjson is not None and isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+        return np.ascontiguousarray(series.to_numpy())
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return _iso_column(series).astype(object).where(series.notna(), None).tolist()
+    if pd.api.types.is_float_dtype(series):
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+def _iso_column(series):
+    """ISO 8601 strings of a datetime column, formatted as Timestamp.isoformat() does"""
+    if series.dt.tz is not None:
+        offset = series.dt.strftime('%z').str.replace(r'(\d\d)$', r':\1', regex=True)
+    else:
+        offset = ''
+    fraction = '.%f' if (series.dt.microsecond.fillna(0) != 0).any() else ''
+    return series.dt.strftime(f'%Y-%m-%dT%H:%M:%S{fraction}') + offset
+
+
+def _replace_nan(obj):
+    # The standard library writes NaN, which is not valid JSON
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    if isinstance(obj, dict):
+        return {key: _replace_nan(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace_nan(value) for value in obj]
+    return obj
+
+
+def dumps(obj, indent=False):
+    """
+    Encode to JSON bytes. NumPy scalars and arrays, pandas Series and DataFrames,
+    datetimes (as ISO 8601) and ObjectIds are handled directly; NaN becomes null.
+    Uses orjson when installed and the standard library otherwise.
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(_replace_nan(obj), default=_default, indent=2 if indent else None).encode('utf-8')
+
+
+# Raised by loads on malformed input (a ValueError with either backend)
+JSONDecodeError = orjson.JSONDecodeError if orjson is not None else json.JSONDecodeError
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def shape_records(records, shape='records'):
+    """
+    Return a list of records (or a DataFrame) in the requested shape: 'records'
+    keeps one object per row, 'columns' gives {field: [values...]} which repeats
+    no keys and is far smaller for long lists.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown response shape: {shape}. Use one of {', '.join(SHAPES)}")
+    import pandas as pd
+    if isinstance(records, pd.DataFrame):
+        if shape == 'columns':
+            return {column: _column(records[column]) for column in records.columns}
+        return records.to_dict('records')
+    if shape == 'columns':
+        fields = list(dict.fromkeys(key for record in records for key in record))
+        return {field: [record.get(field) for record in records] for field in fields}
+    return records
+
+
+def choose_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, or None for identity"""
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',') if part.strip()}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def encode(payload, accept_encoding=None):
+    """
+    Serialize a payload and compress it for the client.
+    Returns (body bytes, headers dict).
+    """
+    with stage('serialize'):
+        body = dumps(payload)
+    headers = {'Content-Type': JSON_MEDIA_TYPE, 'Vary': 'Accept-Encoding'}
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        with stage('compress'):
+            if encoding == 'br':
+                body = brotli.compress(body, quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers['Content-Encoding'] = encoding
+    return body, headers
+
+
+def fastapi_response(payload, request, status_code=200, headers=None):
+    """A FastAPI/Starlette response, compressed as the request's Accept-Encoding allows"""
+    from fastapi import Response
+    body, encoding_headers = encode(payload, request.headers.get('accept-encoding'))
+    return Response(content=body, status_code=status_code, headers={**encoding_headers, **(headers or {})})
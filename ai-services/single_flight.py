@@ -0,0 +1,82 @@
+import logging
+import threading
+
+from metrics import Counter
+
+logger = logging.getLogger("single_flight")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical computations.
+
+    do(key, fn) runs fn once for all callers that ask for the same key while it
+    is running: the first caller computes, the others block until it finishes and
+    receive the same result (or the same exception). Nothing is cached - a call
+    arriving after the computation finished starts a new one. Shared results are
+    handed to every caller, so they must be treated as read-only.
+
+    on_join is called when the caller joins a running computation instead of
+    starting one, e.g. to raise the priority of the fit it now waits for.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, on_join=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"Joining in-flight computation for {key}")
+            if on_join is not None:
+                try:
+                    on_join()
+                except Exception as e:
+                    logger.warning(f"Join hook for {key} failed: {e}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """Number of computations currently running"""
+        with self._lock:
+            return len(self._calls)
+
+
+# Process-wide instance shared by the forecast and reorder endpoints
+flights = SingleFlight()
+
+COALESCED_CALLS = Counter('stockpilot_coalesced_calls_total', 'Calls that computed versus joined an in-flight computation', ['result'],
+                          collect=lambda: {('executed',): flights.executed, ('shared',): flights.shared})
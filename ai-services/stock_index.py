@@ -0,0 +1,126 @@
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger("stock_index")
+
+# Day number used for batches without an expiry date - they never expire
+NO_EXPIRY = np.iinfo(np.int32).max
+
+
+def _to_day_numbers(dates):
+    """Convert dates (strings, datetimes or NaT) to int64 days since the epoch"""
+    dates = pd.to_datetime(pd.Series(dates), errors='coerce', utc=True).dt.tz_localize(None)
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    return np.where(dates.isna().to_numpy(), NO_EXPIRY, days)
+
+
+class ExpiryStockIndex:
+    """
+    Expiry-aware stock index over product batches.
+
+    Batches are stored as compact arrays sorted by (product, expiry date) with a
+    running total of quantity_in_stock, so sellable and expiring stock for a
+    product is a binary search into its slice. Catalog-wide queries encode
+    (product, expiry) into a single sorted key and search all products at once.
+    """
+
+    def __init__(self, df_batches):
+        product_ids = df_batches['product_id'].astype(str).to_numpy()
+        if 'expiry_date' in df_batches.columns:
+            expiry_days = _to_day_numbers(df_batches['expiry_date'])
+        else:
+            expiry_days = np.full(len(df_batches), NO_EXPIRY, dtype=np.int64)
+        quantities = pd.to_numeric(df_batches['quantity_in_stock'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+
+        self.product_ids, product_index = np.unique(product_ids, return_inverse=True)
+        self._positions = {product_id: i for i, product_id in enumerate(self.product_ids)}
+
+        # Sort by product, then by expiry date
+        order = np.lexsort((expiry_days, product_index))
+        self.product_index = product_index[order].astype(np.int64)
+        self.expiry_days = expiry_days[order]
+        self.quantities = quantities[order]
+
+        # offsets[i]:offsets[i + 1] is the slice of product i
+        self.offsets = np.zeros(len(self.product_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.product_index, minlength=len(self.product_ids)), out=self.offsets[1:])
+        self.cumulative_quantity = np.concatenate(([0], np.cumsum(self.quantities)))
+
+        # Composite key: product-major, expiry-minor, for catalog-wide searches
+        dated = self.expiry_days[self.expiry_days != NO_EXPIRY]
+        self._day_offset = int(dated.min()) if len(dated) else 0
+        self._span = np.int64(NO_EXPIRY) - self._day_offset + 1
+        self._keys = self.product_index * self._span + (self.expiry_days - self._day_offset)
+
+        logger.info(f"Indexed {len(self.quantities)} batches for {len(self.product_ids)} products")
+
+    def _day(self, as_of):
+        """Day number for a query date, defaulting to today"""
+        if as_of is None:
+            as_of = pd.Timestamp.now()
+        return int(_to_day_numbers([as_of])[0])
+
+    def _clip_day(self, day):
+        """Keep query days inside the encodable key range"""
+        return min(max(day, self._day_offset - 1), NO_EXPIRY - 1)
+
+    def _stock_between(self, product_positions, low_day, high_day):
+        """Stock with low_day < expiry <= high_day for each product position"""
+        base = product_positions * self._span
+        start = np.searchsorted(self._keys, base + (self._clip_day(low_day) - self._day_offset), side='right')
+        if high_day is None:
+            stop = self.offsets[product_positions + 1]
+        else:
+            stop = np.searchsorted(self._keys, base + (self._clip_day(high_day) - self._day_offset), side='right')
+        return self.cumulative_quantity[stop] - self.cumulative_quantity[start]
+
+    def sellable_stock(self, product_id, as_of=None):
+        """Units of a product whose batches have not expired as of the given date"""
+        position = self._positions.get(str(product_id))
+        if position is None:
+            return 0
+        low = self.offsets[position]
+        high = self.offsets[position + 1]
+        start = low + np.searchsorted(self.expiry_days[low:high], self._day(as_of), side='right')
+        return int(self.cumulative_quantity[high] - self.cumulative_quantity[start])
+
+    def expiring_stock(self, product_id, days, as_of=None):
+        """Units of a product that are sellable now but expire within the given number of days"""
+        position = self._positions.get(str(product_id))
+        if position is None:
+            return 0
+        day = self._day(as_of)
+        low = self.offsets[position]
+        high = self.offsets[position + 1]
+        expiry = self.expiry_days[low:high]
+        start = low + np.searchsorted(expiry, day, side='right')
+        stop = low + np.searchsorted(expiry, day + int(days), side='right')
+        return int(self.cumulative_quantity[stop] - self.cumulative_quantity[start])
+
+    def sellable_stock_all(self, as_of=None):
+        """Sellable stock for every product as a Series indexed by product_id"""
+        positions = np.arange(len(self.product_ids), dtype=np.int64)
+        stock = self._stock_between(positions, self._day(as_of), None)
+        return pd.Series(stock, index=self.product_ids, name='sellable_stock')
+
+    def expiring_stock_all(self, days, as_of=None):
+        """Stock expiring within the given number of days for every product"""
+        positions = np.arange(len(self.product_ids), dtype=np.int64)
+        day = self._day(as_of)
+        stock = self._stock_between(positions, day, day + int(days))
+        return pd.Series(stock, index=self.product_ids, name='expiring_stock')
+
+    def next_expiry(self, product_id, as_of=None):
+        """Earliest expiry date among the product's sellable batches, or None"""
+        position = self._positions.get(str(product_id))
+        if position is None:
+            return None
+        low = self.offsets[position]
+        high = self.offsets[position + 1]
+        start = low + np.searchsorted(self.expiry_days[low:high], self._day(as_of), side='right')
+        # Skip batches that are already sold out
+        in_stock = np.flatnonzero(self.quantities[start:high] > 0)
+        if len(in_stock) == 0 or self.expiry_days[start + in_stock[0]] == NO_EXPIRY:
+            return None
+        return (np.datetime64(0, 'D') + int(self.expiry_days[start + in_stock[0]])).astype(object)
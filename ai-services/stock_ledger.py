@@ -0,0 +1,603 @@
+import pandas as pd
+import numpy as np
+import argparse
+import itertools
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+# Try importing PyMongo - handle gracefully if not available
+try:
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError, DuplicateKeyError
+except ImportError:
+    UpdateOne = None
+    BulkWriteError = DuplicateKeyError = None
+
+from mongo_client import MongoClient, get_database, close_client, database_name, find_deletions
+
+logger = logging.getLogger("stock_ledger")
+
+MOVEMENT_COLUMNS = ['movement_id', 'product_id', 'batch_id', 'timestamp', 'quantity', 'movement_type']
+
+# Persisted ledger: append-only movements and per-product snapshots of the level
+# just after each SNAPSHOT_INTERVAL_DAYS boundary (aligned to the epoch)
+MOVEMENTS_COLLECTION = 'stock_movements'
+SNAPSHOTS_COLLECTION = 'stock_snapshots'
+SNAPSHOT_INTERVAL_DAYS = 7
+
+# Item collections recorded as movements:
+# source -> (parent collection, parent key, date field, sign, movement type)
+MOVEMENT_SOURCES = {
+    'purchase_items': ('purchases', 'purchase_id', 'purchase_date', 1, 'receipt'),
+    'sale_items': ('sales', 'sale_id', 'sale_date', -1, 'sale')
+}
+
+# Collection holding the sync watermarks (shared with sale_lines)
+SYNC_STATE_COLLECTION = 'sync_state'
+
+# A sync holds a lease in sync_state so only one process appends at a time;
+# a crashed holder's lease lapses after this many seconds
+DEFAULT_LEASE_SECONDS = 600
+
+# Fields identifying a movement: the source item's (product, batch, date) plus
+# its revision, the number of movements recorded for them before it. A unique
+# index on them turns a second sync appending the same difference into a no-op.
+MOVEMENT_KEY = ['source', 'source_id', 'product_id', 'batch_id', 'timestamp', 'revision']
+DUPLICATE_KEY = 11000
+
+# Tombstones (mongo_client.record_deletions) recorded this long before the
+# watermark are read again
+TOMBSTONE_LAG = pd.Timedelta(minutes=1)
+
+
+def _to_seconds(timestamps):
+    """Convert timestamps to int64 seconds since the epoch (UTC)"""
+    timestamps = pd.to_datetime(pd.Series(timestamps), errors='coerce', utc=True).dt.tz_localize(None)
+    return timestamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def build_movements(df_purchases, df_purchase_items, df_sales, df_sale_items, df_batches):
+    """
+    Turn purchase_items (receipts) and sale_items (sales) into signed stock movements.
+
+    Receipts are dated by their purchase's purchase_date and sales by their sale's
+    sale_date; each item's own _id is kept as movement_id so the ledger can ignore
+    movements it has already recorded.
+    """
+    # Compare ids as strings to handle ObjectIds
+    batch_products = pd.Series(df_batches['product_id'].astype(str).values, index=df_batches['_id'].astype(str).values)
+    purchase_dates = pd.Series(df_purchases['purchase_date'].values, index=df_purchases['_id'].astype(str).values)
+    sale_dates = pd.Series(df_sales['sale_date'].values, index=df_sales['_id'].astype(str).values)
+
+    receipts = pd.DataFrame({
+        'movement_id': df_purchase_items['_id'].astype(str).values,
+        'batch_id': df_purchase_items['batch_id'].astype(str).values,
+        'timestamp': df_purchase_items['purchase_id'].astype(str).map(purchase_dates).values,
+        'quantity': df_purchase_items['quantity'].to_numpy(dtype=np.int64),
+        'movement_type': 'receipt'
+    })
+    sales = pd.DataFrame({
+        'movement_id': df_sale_items['_id'].astype(str).values,
+        'batch_id': df_sale_items['batch_id'].astype(str).values,
+        'timestamp': df_sale_items['sale_id'].astype(str).map(sale_dates).values,
+        'quantity': -df_sale_items['quantity'].to_numpy(dtype=np.int64),
+        'movement_type': 'sale'
+    })
+
+    movements = pd.concat([receipts, sales], ignore_index=True)
+    movements['product_id'] = movements['batch_id'].map(batch_products)
+
+    orphaned = movements['product_id'].isna() | movements['timestamp'].isna()
+    if orphaned.any():
+        logger.warning(f"Dropping {int(orphaned.sum())} movements without a batch or date")
+        movements = movements[~orphaned]
+
+    return movements[MOVEMENT_COLUMNS].reset_index(drop=True)
+
+
+class StockLedger:
+    """
+    Append-only stock ledger with periodic per-product snapshots.
+
+    Every receipt and sale is kept as a signed movement sorted by (product, time).
+    Stock levels for all products are snapshotted every SNAPSHOT_INTERVAL_DAYS, so
+    inventory at any past timestamp is the preceding snapshot plus a replay of the
+    few movements recorded since, instead of a scan over the full history.
+    """
+
+    def __init__(self, movements=None, snapshot_interval_days=7):
+        # Constants for the ledger
+        self.SNAPSHOT_INTERVAL_DAYS = snapshot_interval_days  # Days between stock snapshots
+
+        if movements is None:
+            movements = pd.DataFrame(columns=MOVEMENT_COLUMNS)
+        self.movements = movements[MOVEMENT_COLUMNS].drop_duplicates('movement_id').reset_index(drop=True)
+        self._build()
+
+    @classmethod
+    def from_frames(cls, df_purchases, df_purchase_items, df_sales, df_sale_items, df_batches, **kwargs):
+        """Build a ledger from the purchase, sale and batch collections"""
+        movements = build_movements(df_purchases, df_purchase_items, df_sales, df_sale_items, df_batches)
+        return cls(movements, **kwargs)
+
+    def _build(self):
+        """Sort movements and compute the snapshot grid"""
+        self.movements['product_id'] = self.movements['product_id'].astype(str)
+        seconds = _to_seconds(self.movements['timestamp'])
+
+        self.product_ids, product_index = np.unique(self.movements['product_id'].to_numpy(), return_inverse=True)
+        self._positions = {product_id: i for i, product_id in enumerate(self.product_ids)}
+
+        order = np.lexsort((seconds, product_index))
+        self.movements = self.movements.iloc[order].reset_index(drop=True)
+        self.product_index = product_index[order].astype(np.int64)
+        self.seconds = seconds[order]
+        self.quantities = self.movements['quantity'].to_numpy(dtype=np.int64)
+
+        # offsets[i]:offsets[i + 1] is the slice of product i
+        self.offsets = np.zeros(len(self.product_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.product_index, minlength=len(self.product_ids)), out=self.offsets[1:])
+
+        if len(self.seconds) == 0:
+            self.snapshot_seconds = np.zeros(0, dtype=np.int64)
+            self.snapshot_levels = np.zeros((len(self.product_ids), 0), dtype=np.int64)
+            return
+
+        # Snapshot boundaries every interval from the first movement's day
+        interval = self.SNAPSHOT_INTERVAL_DAYS * 86400
+        first = (self.seconds.min() // 86400) * 86400
+        self.snapshot_seconds = np.arange(first, self.seconds.max() + interval, interval, dtype=np.int64)
+
+        # Level of every product at every boundary, via a product-major composite key
+        span = np.int64(self.snapshot_seconds[-1] - first + 1)
+        keys = self.product_index * span + (self.seconds - first)
+        boundary_keys = np.arange(len(self.product_ids), dtype=np.int64)[:, None] * span + (self.snapshot_seconds - first)[None, :]
+        cumulative = np.concatenate(([0], np.cumsum(self.quantities)))
+        stop = np.searchsorted(keys, boundary_keys, side='right')
+        self.snapshot_levels = cumulative[stop] - cumulative[self.offsets[:-1]][:, None]
+
+        logger.info(
+            f"Ledger holds {len(self.quantities)} movements for {len(self.product_ids)} products "
+            f"with {len(self.snapshot_seconds)} snapshots"
+        )
+
+    def append(self, new_movements):
+        """
+        Record new movements. Movements already in the ledger (by movement_id) are
+        ignored, so replaying the same source rows is safe. Returns the number added.
+        """
+        new_movements = new_movements[MOVEMENT_COLUMNS]
+        new_movements = new_movements[~new_movements['movement_id'].isin(self.movements['movement_id'])]
+        new_movements = new_movements.drop_duplicates('movement_id')
+        if new_movements.empty:
+            return 0
+
+        self.movements = pd.concat([self.movements, new_movements], ignore_index=True)
+        self._build()
+        return len(new_movements)
+
+    def stock_at(self, product_id, timestamp):
+        """Stock level of a product at a timestamp: snapshot plus a short replay"""
+        position = self._positions.get(str(product_id))
+        if position is None:
+            return 0
+        second = int(_to_seconds([timestamp])[0])
+
+        low = self.offsets[position]
+        high = self.offsets[position + 1]
+        snapshot = np.searchsorted(self.snapshot_seconds, second, side='right') - 1
+        if snapshot >= 0:
+            level = int(self.snapshot_levels[position, snapshot])
+            replay_from = low + np.searchsorted(self.seconds[low:high], self.snapshot_seconds[snapshot], side='right')
+        else:
+            level = 0
+            replay_from = low
+        replay_to = low + np.searchsorted(self.seconds[low:high], second, side='right')
+        return level + int(self.quantities[replay_from:replay_to].sum())
+
+    def stock_at_all(self, timestamp):
+        """Stock level of every product at a timestamp as a Series indexed by product_id"""
+        second = int(_to_seconds([timestamp])[0])
+        levels = np.zeros(len(self.product_ids), dtype=np.int64)
+        snapshot = np.searchsorted(self.snapshot_seconds, second, side='right') - 1
+        if snapshot >= 0:
+            levels += self.snapshot_levels[:, snapshot]
+            since = self.snapshot_seconds[snapshot]
+        else:
+            since = np.iinfo(np.int64).min
+
+        # Replay the movements between the snapshot and the timestamp
+        window = (self.seconds > since) & (self.seconds <= second)
+        levels += np.bincount(self.product_index[window], weights=self.quantities[window], minlength=len(self.product_ids)).astype(np.int64)
+        return pd.Series(levels, index=self.product_ids, name='stock_level')
+
+    def daily_closing_levels(self, product_id, dates):
+        """End-of-day stock level of a product for each date"""
+        position = self._positions.get(str(product_id))
+        dates = pd.to_datetime(pd.Series(dates)).dt.normalize()
+        if position is None:
+            return pd.Series(np.zeros(len(dates), dtype=np.int64), index=dates.values)
+
+        low = self.offsets[position]
+        high = self.offsets[position + 1]
+        end_of_day = _to_seconds(dates) + 86400 - 1
+        stop = low + np.searchsorted(self.seconds[low:high], end_of_day, side='right')
+        cumulative = np.concatenate(([0], np.cumsum(self.quantities[low:high])))
+        return pd.Series(cumulative[stop - low], index=dates.values)
+
+    def stockout_flags(self, product_id, dates):
+        """
+        Flag days on which the product ran out of stock.
+
+        Sales on those days are censored by availability rather than demand, so the
+        forecaster should not treat them as true demand observations.
+        """
+        return self.daily_closing_levels(product_id, dates) <= 0
+
+
+# --- Persisted ledger ---
+
+def _snapshot_interval():
+    return pd.Timedelta(days=SNAPSHOT_INTERVAL_DAYS)
+
+
+def _frame(docs, columns):
+    return pd.DataFrame(list(docs), columns=columns)
+
+
+def _desired_movements(db, source, items):
+    """
+    The movements the items should add up to: one row per item, signed and dated
+    by its parent. Returns (movements, items that could not be resolved) - those
+    whose parent or batch is missing, e.g. because it has not been written yet.
+    """
+    parent, key, date_field, sign, _ = MOVEMENT_SOURCES[source]
+    parents = _frame(db[parent].find({'_id': {'$in': list(items[key].dropna().unique())}}, {date_field: 1}), ['_id', date_field])
+    batches = _frame(db.product_batches.find({'_id': {'$in': list(items['batch_id'].dropna().unique())}}, {'product_id': 1}), ['_id', 'product_id'])
+    # Compare ids as strings to handle ObjectIds; stored values keep their type
+    dates = pd.Series(parents[date_field].values, index=parents['_id'].astype(str).values)
+    products = pd.Series(batches['product_id'].values, index=batches['_id'].astype(str).values)
+
+    movements = pd.DataFrame({
+        'source_id': items['_id'].values,
+        'product_id': items['batch_id'].astype(str).map(products).values,
+        'batch_id': items['batch_id'].values,
+        'timestamp': pd.to_datetime(items[key].astype(str).map(dates).values),
+        'quantity': sign * pd.to_numeric(items['quantity'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    })
+    unresolved = (movements['product_id'].isna() | movements['timestamp'].isna()).to_numpy()
+    return movements[~unresolved], items[unresolved]
+
+
+def _no_movements():
+    return pd.DataFrame({'source_id': [], 'product_id': [], 'batch_id': [],
+                         'timestamp': pd.to_datetime([]), 'quantity': np.zeros(0, dtype=np.int64)})
+
+
+def _recorded_movements(db, source, source_ids):
+    """
+    Net recorded quantity and number of movements (the next revision) of the
+    given sources per (source_id, product_id, batch_id, timestamp)
+    """
+    rows = []
+    for doc in db[MOVEMENTS_COLLECTION].aggregate([
+        {'$match': {'source': source, 'source_id': {'$in': list(source_ids)}}},
+        {'$group': {
+            '_id': {'source_id': '$source_id', 'product_id': '$product_id', 'batch_id': '$batch_id', 'timestamp': '$timestamp'},
+            'quantity': {'$sum': '$quantity'},
+            'revision': {'$sum': 1}
+        }}
+    ]):
+        rows.append({**doc['_id'], 'quantity': doc['quantity'], 'revision': doc['revision']})
+    recorded = pd.DataFrame(rows, columns=['source_id', 'product_id', 'batch_id', 'timestamp', 'quantity', 'revision'])
+    recorded['timestamp'] = pd.to_datetime(recorded['timestamp'])
+    return recorded
+
+
+def _append_differences(db, source, source_ids, desired):
+    """
+    Append the movements that bring the recorded net of each source to its desired
+    value: new items are recorded as receipts or sales, changed quantities, dates
+    or batches and deleted items as adjustments. Nothing is ever rewritten.
+    Returns the appended movements.
+    """
+    recorded = _recorded_movements(db, source, source_ids)
+    key = ['source_id', 'product_id', 'batch_id', 'timestamp']
+    # ObjectIds and strings are compared as strings, the stored values are kept
+    for frame in (desired, recorded):
+        for column in ('source_id', 'product_id', 'batch_id'):
+            frame[f'{column}_key'] = frame[column].astype(str)
+    match = ['source_id_key', 'product_id_key', 'batch_id_key', 'timestamp']
+    desired = desired.groupby(match, as_index=False).agg({'source_id': 'first', 'product_id': 'first', 'batch_id': 'first', 'quantity': 'sum'})
+    merged = desired.merge(recorded, on=match, how='outer', suffixes=('', '_recorded'), indicator='origin')
+    for column in ('source_id', 'product_id', 'batch_id'):
+        merged[column] = merged[column].where(merged[column].notna(), merged[f'{column}_recorded'])
+    delta = merged['quantity'].astype(np.float64).fillna(0).astype(np.int64) - merged['quantity_recorded'].astype(np.float64).fillna(0).astype(np.int64)
+    merged = merged.assign(quantity=delta)[delta != 0]
+    if merged.empty:
+        return merged[key + ['quantity']]
+
+    movement_type = MOVEMENT_SOURCES[source][4]
+    recorded_at = pd.Timestamp.now('UTC').tz_localize(None).to_pydatetime()
+    revisions = merged['revision'].astype(np.float64).fillna(0).astype(np.int64)
+    documents = [{
+        'source': source,
+        'source_id': row.source_id,
+        'product_id': row.product_id,
+        'batch_id': row.batch_id,
+        'timestamp': row.timestamp.to_pydatetime(),
+        'revision': int(revision),
+        'quantity': int(row.quantity),
+        'movement_type': movement_type if row.origin == 'left_only' else 'adjustment',
+        'recorded_at': recorded_at
+    } for row, revision in zip(merged.itertuples(index=False), revisions)]
+    # Upserted on the movement key: a concurrent sync that computed the same
+    # difference already appended it, and this one then appends nothing
+    requests = [UpdateOne({field: doc[field] for field in MOVEMENT_KEY}, {'$setOnInsert': doc}, upsert=True)
+                for doc in documents]
+    try:
+        upserted = db[MOVEMENTS_COLLECTION].bulk_write(requests, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        if any(error['code'] != DUPLICATE_KEY for error in e.details['writeErrors']):
+            raise
+        upserted = {upsert['index']: upsert['_id'] for upsert in e.details.get('upserted', [])}
+    if len(upserted) < len(documents):
+        logger.info(f"{source}: {len(documents) - len(upserted)} movements were already appended by another sync")
+    return merged.iloc[sorted(upserted)][key + ['quantity']]
+
+
+def acquire_lease(db, name, seconds=None):
+    """
+    Take the lease name in sync_state for seconds (STOCKPILOT_LEDGER_LEASE_SECONDS),
+    unless another process holds it. Returns the owner token, or None.
+    """
+    if seconds is None:
+        seconds = float(os.environ.get('STOCKPILOT_LEDGER_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+    owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'
+    now = pd.Timestamp.now('UTC').tz_localize(None).to_pydatetime()
+    try:
+        db[SYNC_STATE_COLLECTION].update_one(
+            {'_id': f'{name}_lease', '$or': [{'expires': {'$lt': now}}, {'expires': None}]},
+            {'$set': {'owner': owner, 'expires': now + pd.Timedelta(seconds=seconds).to_pytimedelta()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease document exists and has not expired
+        return None
+    return owner
+
+
+def release_lease(db, name, owner):
+    db[SYNC_STATE_COLLECTION].delete_one({'_id': f'{name}_lease', 'owner': owner})
+
+
+def _rewrite_snapshots(db, first_changes):
+    """
+    Recompute the snapshots of each product from the first boundary at or after
+    its earliest changed movement: the last unaffected snapshot plus a replay of
+    the movements since. Returns the number of snapshots written.
+    """
+    interval = _snapshot_interval()
+    written = 0
+    for product_id, first_change in first_changes.items():
+        first_boundary = pd.Timestamp(first_change).ceil(interval)
+        base = db[SNAPSHOTS_COLLECTION].find_one(
+            {'product_id': product_id, 'timestamp': {'$lt': first_boundary.to_pydatetime()}}, sort=[('timestamp', -1)])
+        query = {'product_id': product_id}
+        if base is not None:
+            query['timestamp'] = {'$gt': base['timestamp']}
+        movements = _frame(db[MOVEMENTS_COLLECTION].find(query, {'timestamp': 1, 'quantity': 1}).sort('timestamp', 1),
+                           ['_id', 'timestamp', 'quantity'])
+        if movements.empty:
+            continue
+
+        times = pd.to_datetime(movements['timestamp']).to_numpy()
+        boundaries = pd.date_range(first_boundary, pd.Timestamp(times[-1]).ceil(interval), freq=interval)
+        cumulative = np.concatenate(([0], np.cumsum(movements['quantity'].to_numpy(dtype=np.int64))))
+        levels = (base['level'] if base is not None else 0) + cumulative[np.searchsorted(times, boundaries.to_numpy(), side='right')]
+        db[SNAPSHOTS_COLLECTION].bulk_write([
+            UpdateOne({'product_id': product_id, 'timestamp': boundary.to_pydatetime()},
+                      {'$set': {'level': int(level)}}, upsert=True)
+            for boundary, level in zip(boundaries, levels)
+        ], ordered=False)
+        written += len(boundaries)
+    return written
+
+
+def sync_stock_ledger(db, reconcile=False, chunk_size=5000):
+    """
+    Bring the persisted ledger up to date with purchase_items and sale_items.
+
+    Items updated since the stored updatedAt watermark of their collection, or
+    whose purchase or sale was, are diffed against the movements recorded for
+    them; items deleted since are found from their tombstones, or with
+    reconcile=True by comparing every id. Only the differences are appended, and the snapshots of the products they touch are
+    rewritten. Items whose parent or batch is missing are retried next time: the
+    watermark is held back to the oldest of them. One process syncs at a time
+    (a lease in sync_state); while another holds it this returns at once with
+    skipped set. Returns the counts.
+    """
+    owner = acquire_lease(db, 'stock_ledger')
+    if owner is None:
+        logger.info("Another process is syncing the stock ledger - skipped")
+        return {'movements': 0, 'unresolved': 0, 'snapshots': 0, 'skipped': True}
+    try:
+        return _sync_stock_ledger(db, reconcile, chunk_size)
+    finally:
+        release_lease(db, 'stock_ledger', owner)
+
+
+def _sync_stock_ledger(db, reconcile, chunk_size):
+    from mongo_indexes import ensure_indexes
+    # The unique movement key must exist before anything is appended
+    ensure_indexes(db, [MOVEMENTS_COLLECTION])
+    state = db[SYNC_STATE_COLLECTION].find_one({'_id': 'stock_ledger'}) or {}
+    watermarks = dict(state.get('watermarks', {}))
+    if watermarks and not any(name.startswith('tombstones_') for name in watermarks):
+        # Recorded before deletions were tracked with tombstones
+        reconcile = True
+    started_at = pd.Timestamp.now('UTC').tz_localize(None).to_pydatetime()
+    first_changes = {}
+    counts = {'movements': 0, 'unresolved': 0}
+
+    def record(source, source_ids, desired):
+        appended = _append_differences(db, source, source_ids, desired)
+        for row in appended.itertuples(index=False):
+            first_changes[row.product_id] = min(row.timestamp, first_changes.get(row.product_id, row.timestamp))
+        counts['movements'] += len(appended)
+
+    for source, (parent, key, _, _, _) in MOVEMENT_SOURCES.items():
+        since = watermarks.get(source)
+        if since is None:
+            query = {}
+        else:
+            parent_since = watermarks.get(parent, since)
+            changed_parents = [doc['_id'] for doc in db[parent].find({'updatedAt': {'$gte': parent_since}}, {'_id': 1})]
+            query = {'$or': [{'updatedAt': {'$gte': since}}, {key: {'$in': changed_parents}}]}
+        # Read before the items, so a parent changed during the sync is picked up next time
+        latest_parent = db[parent].find_one({'updatedAt': {'$ne': None}}, {'updatedAt': 1}, sort=[('updatedAt', -1)])
+
+        columns = ['_id', key, 'batch_id', 'quantity', 'updatedAt']
+        updated, held_back = [], []
+        cursor = db[source].find(query, {column: 1 for column in columns[1:]})
+        while True:
+            items = _frame(itertools.islice(cursor, chunk_size), columns)
+            if items.empty:
+                break
+            desired, unresolved = _desired_movements(db, source, items)
+            record(source, items['_id'].tolist(), desired)
+            counts['unresolved'] += len(unresolved)
+            updated.append(items['updatedAt'].max())
+            held_back.append(unresolved['updatedAt'].min())
+
+        # Items deleted since they were recorded, from their tombstones - or, when
+        # reconciling, every source with a non-zero net and no item
+        tombstones_since = watermarks.get(f'tombstones_{source}')
+        deleted, newest_tombstone = find_deletions(
+            db, source, tombstones_since - TOMBSTONE_LAG if tombstones_since else None)
+        watermarks[f'tombstones_{source}'] = max(newest_tombstone or started_at, tombstones_since or started_at)
+        if reconcile:
+            live = {str(doc['_id']) for doc in db[source].find({}, {'_id': 1})}
+            deleted = [doc['_id'] for doc in db[MOVEMENTS_COLLECTION].aggregate([
+                {'$match': {'source': source}},
+                {'$group': {'_id': '$source_id', 'net': {'$sum': '$quantity'}}},
+                {'$match': {'net': {'$ne': 0}}}
+            ]) if str(doc['_id']) not in live]
+        for start in range(0, len(deleted), chunk_size):
+            record(source, deleted[start:start + chunk_size], _no_movements())
+
+        newest = max((value for value in updated if pd.notna(value)), default=None)
+        oldest_unresolved = min((value for value in held_back if pd.notna(value)), default=None)
+        if oldest_unresolved is not None:
+            logger.warning(f"{source}: holding the ledger watermark at {oldest_unresolved} for items without a parent or batch")
+            newest = oldest_unresolved if newest is None else min(newest, oldest_unresolved)
+        if newest is not None:
+            watermarks[source] = pd.Timestamp(newest).to_pydatetime()
+        if latest_parent is not None:
+            watermarks[parent] = latest_parent['updatedAt']
+
+    counts['snapshots'] = _rewrite_snapshots(db, first_changes)
+    db[SYNC_STATE_COLLECTION].update_one({'_id': 'stock_ledger'}, {'$set': {'watermarks': watermarks}}, upsert=True)
+    counts['skipped'] = False
+    logger.info(f"Stock ledger sync: {counts}")
+    return counts
+
+
+def rebuild_stock_ledger(db):
+    """Drop the persisted ledger and record every item again"""
+    owner = acquire_lease(db, 'stock_ledger')
+    if owner is None:
+        raise RuntimeError("Another process is syncing the stock ledger - try again when it has finished")
+    try:
+        db[MOVEMENTS_COLLECTION].drop()
+        db[SNAPSHOTS_COLLECTION].drop()
+        db[SYNC_STATE_COLLECTION].delete_one({'_id': 'stock_ledger'})
+        from mongo_indexes import ensure_indexes
+        ensure_indexes(db, [SNAPSHOTS_COLLECTION])
+        return _sync_stock_ledger(db, False, 5000)
+    finally:
+        release_lease(db, 'stock_ledger', owner)
+
+
+def stored_stock_at(db, product_id, timestamp, inclusive=True):
+    """
+    Stock level of a product at a timestamp from the persisted ledger: the latest
+    snapshot at or before it plus a replay of the movements since. With
+    inclusive=False, movements at the timestamp itself are not counted.
+    """
+    timestamp = pd.Timestamp(timestamp).to_pydatetime()
+    bound = '$lte' if inclusive else '$lt'
+    snapshot = db[SNAPSHOTS_COLLECTION].find_one({'product_id': product_id, 'timestamp': {bound: timestamp}}, sort=[('timestamp', -1)])
+    window = {bound: timestamp}
+    if snapshot is not None:
+        window['$gt'] = snapshot['timestamp']
+    replay = list(db[MOVEMENTS_COLLECTION].aggregate([
+        {'$match': {'product_id': product_id, 'timestamp': window}},
+        {'$group': {'_id': None, 'quantity': {'$sum': '$quantity'}}}
+    ]))
+    return (snapshot['level'] if snapshot is not None else 0) + (replay[0]['quantity'] if replay else 0)
+
+
+def find_movements(db, product_id, start, end, exclude_source=None):
+    """Movements of a product with start <= timestamp < end as (timestamp, quantity) rows"""
+    query = {'product_id': product_id, 'timestamp': {'$gte': pd.Timestamp(start).to_pydatetime(), '$lt': pd.Timestamp(end).to_pydatetime()}}
+    if exclude_source is not None:
+        query['source'] = {'$ne': exclude_source}
+    movements = _frame(db[MOVEMENTS_COLLECTION].find(query, {'timestamp': 1, 'quantity': 1}), ['_id', 'timestamp', 'quantity'])
+    return movements[['timestamp', 'quantity']]
+
+
+def replay_daily_levels(opening, timestamps, quantities, dates):
+    """End-of-day stock for each date: the opening level plus every movement up to that day's end"""
+    dates = pd.to_datetime(pd.Series(dates)).dt.normalize()
+    seconds = _to_seconds(timestamps)
+    order = np.argsort(seconds, kind='stable')
+    cumulative = np.concatenate(([0], np.cumsum(np.asarray(quantities, dtype=np.int64)[order])))
+    stop = np.searchsorted(seconds[order], _to_seconds(dates) + 86400 - 1, side='right')
+    return pd.Series(opening + cumulative[stop], index=dates.values)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stock ledger: report stock levels from the CSVs, or sync the MongoDB ledger.")
+    parser.add_argument("command", choices=["report", "sync", "reconcile", "rebuild"],
+                        help="Report levels from the CSV files, append new movements, also compare every item id, or record everything again.")
+    parser.add_argument("--at", type=str, default=None, help="Timestamp of the report (default now).")
+    parser.add_argument("--database", type=str, default=database_name(), help="MongoDB database name.")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        # Build the ledger from the generated CSV files and report stock levels
+        ledger = StockLedger.from_frames(
+            pd.read_csv('purchases.csv'),
+            pd.read_csv('purchase_items.csv'),
+            pd.read_csv('sales.csv'),
+            pd.read_csv('sale_items.csv'),
+            pd.read_csv('product_batches.csv')
+        )
+        timestamp = args.at or pd.Timestamp.now()
+        levels = ledger.stock_at_all(timestamp)
+        print(json.dumps({
+            'timestamp': str(timestamp),
+            'total_movements': int(len(ledger.movements)),
+            'products_out_of_stock': int((levels <= 0).sum()),
+            'stock_levels': {product_id: int(level) for product_id, level in levels.items()}
+        }, indent=2))
+    else:
+        if MongoClient is None:
+            print("❌ PyMongo is required. Install with 'pip install pymongo'")
+            exit(1)
+        start_time = time.perf_counter()
+        try:
+            db = get_database(args.database)
+            counts = rebuild_stock_ledger(db) if args.command == "rebuild" else sync_stock_ledger(db, reconcile=args.command == "reconcile")
+        finally:
+            close_client()
+        if counts['skipped']:
+            print("❌ Another process is syncing the stock ledger - nothing appended")
+            exit(1)
+        print(f"✅ Appended {counts['movements']} movements and wrote {counts['snapshots']} snapshots "
+              f"in {time.perf_counter() - start_time:.2f}s")
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+from bulk_upload import BulkLoader, SOURCE_ID_FIELD, SYNC_HASH_FIELD, to_object_ids
+from data_sources import DataSource
+from mongo_client import find_deletions
+from schema import apply_schema
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def object_id(i):
+    return f'{i:024x}'
+
+
+class FrameSource(DataSource):
+    """In-memory source giving each collection the declared schema, like the real backends"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def load(self, collection, columns=None, filters=None):
+        if collection not in self.frames:
+            raise FileNotFoundError(collection)
+        df = apply_schema(self.frames[collection].copy(), collection)
+        return df[list(columns)] if columns is not None else df
+
+
+def catalog(products=20, batches=60):
+    return {
+        'products': pd.DataFrame({
+            '_id': [object_id(i) for i in range(products)],
+            'product_name': [f'Product {i}' for i in range(products)],
+            'category': [['Tablets', 'Syrups', 'Ointments'][i % 3] for i in range(products)]
+        }),
+        'product_batches': pd.DataFrame({
+            '_id': [object_id(1000 + i) for i in range(batches)],
+            'product_id': [object_id(i % products) for i in range(batches)],
+            'mrp': np.round(np.linspace(10, 500, batches), 2),
+            'quantity_in_stock': np.arange(batches) % 17
+        })
+    }
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def upload(db, frames, id_mode='keep'):
+    loader = BulkLoader(db, FrameSource(frames), id_mode=id_mode, workers=1)
+    assert loader.run(list(frames))
+    return loader
+
+
+def sync(db, frames, collection, id_mode='keep'):
+    loader = BulkLoader(db, FrameSource(frames), id_mode=id_mode, workers=1)
+    loader.build_id_maps({name: loader.source.load(name) for name in frames}, sync=True)
+    return loader.sync_collection(collection, loader.source.load(collection))
+
+
+def stored_rows(db, collection, key='_id'):
+    return {str(doc[key]): doc for doc in db[collection].find()}
+
+
+def test_to_object_ids_converts_valid_ids_and_leaves_the_rest_empty():
+    converted = to_object_ids(pd.Series([object_id(1), None, 'not-an-id', object_id(1).upper(), object_id(1), np.nan]))
+    assert converted.tolist() == [ObjectId(object_id(1)), None, None, ObjectId(object_id(1)), ObjectId(object_id(1)), None]
+    assert to_object_ids(pd.Series([], dtype=object)).tolist() == []
+
+
+def test_sync_of_unchanged_source_writes_nothing(db):
+    frames = catalog()
+    upload(db, frames)
+    counts = sync(db, frames, 'product_batches')
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 60}
+
+
+def test_sync_writes_only_new_changed_and_deleted_rows(db):
+    frames = catalog()
+    upload(db, frames)
+    before = stored_rows(db, 'product_batches')
+
+    batches = frames['product_batches']
+    batches.loc[3, 'quantity_in_stock'] = 99
+    batches.loc[7, 'mrp'] = 1.25
+    batches = batches.drop(index=[10, 11])
+    added = pd.DataFrame({'_id': [object_id(5000)], 'product_id': [object_id(2)], 'mrp': [20.0], 'quantity_in_stock': [4]})
+    frames['product_batches'] = pd.concat([batches, added], ignore_index=True)
+
+    counts = sync(db, frames, 'product_batches')
+    assert counts == {'inserted': 1, 'updated': 2, 'deleted': 2, 'unchanged': 56}
+
+    after = stored_rows(db, 'product_batches')
+    assert set(after) == set(frames['product_batches']['_id'])
+    assert after[object_id(1003)]['quantity_in_stock'] == 99
+    assert after[object_id(1007)]['mrp'] == 1.25
+    assert after[object_id(5000)]['product_id'] == ObjectId(object_id(2))
+    # Untouched documents keep their hash and are not rewritten
+    assert after[object_id(1004)][SYNC_HASH_FIELD] == before[object_id(1004)][SYNC_HASH_FIELD]
+    assert 'updatedAt' not in after[object_id(1004)]
+    assert 'updatedAt' in after[object_id(1003)]
+
+    deleted, _ = find_deletions(db, 'product_batches')
+    assert sorted(map(str, deleted)) == [object_id(1010), object_id(1011)]
+    assert sync(db, frames, 'product_batches')['unchanged'] == 59
+
+
+def test_sync_replaces_documents_stored_without_a_key(db):
+    frames = catalog()
+    upload(db, frames)
+    db.products.insert_one({'product_name': 'Written by hand'})
+    db.products.update_one({'_id': ObjectId(object_id(5))}, {'$unset': {SYNC_HASH_FIELD: ''}})
+
+    counts = sync(db, frames, 'products')
+    assert counts['deleted'] == 1 and counts['updated'] == 1
+    assert db.products.count_documents({}) == 20
+    assert db.products.find_one({'_id': ObjectId(object_id(5))})[SYNC_HASH_FIELD] is not None
+
+
+def test_regenerated_ids_survive_a_sync(db):
+    frames = catalog()
+    upload(db, frames, id_mode='regenerate')
+    ids = {key: doc['_id'] for key, doc in stored_rows(db, 'products', SOURCE_ID_FIELD).items()}
+    batches = stored_rows(db, 'product_batches', SOURCE_ID_FIELD)
+    # Foreign keys point at the regenerated product ids
+    assert batches[object_id(1021)]['product_id'] == ids[object_id(1)]
+
+    frames['products'].loc[1, 'product_name'] = 'Renamed'
+    counts = sync(db, frames, 'products', id_mode='regenerate')
+    assert counts['updated'] == 1 and counts['inserted'] == 0
+    after = stored_rows(db, 'products', SOURCE_ID_FIELD)
+    assert {key: doc['_id'] for key, doc in after.items()} == ids
+    assert after[object_id(1)]['product_name'] == 'Renamed'
@@ -0,0 +1,104 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from conditional import ConditionalCache, Version, CACHE_HEADER
+
+
+class Computation:
+    """compute() stand-in counting its calls; blocks while gate is clear"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.gate.wait(5)
+        self.calls += 1
+        self.done.set()
+        return f'result-{self.calls}'
+
+
+def test_matching_etag_is_answered_304_without_computing():
+    cache = ConditionalCache(stale_while_revalidate=False, name='test')
+    compute = Computation()
+    first = cache.get('k', lambda: Version('v1'), compute)
+    assert (first.status, first.result, first.headers[CACHE_HEADER]) == (200, 'result-1', 'miss')
+
+    again = cache.get('k', lambda: Version('v1'), compute, if_none_match=first.headers['ETag'])
+    assert again.status == 304 and again.result is None
+    assert again.headers[CACHE_HEADER] == 'revalidated'
+    # The strong form of the same tag matches too
+    strong = first.headers['ETag'][2:]
+    assert cache.get('k', lambda: Version('v1'), compute, if_none_match=strong).status == 304
+
+    hit = cache.get('k', lambda: Version('v1'), compute)
+    assert (hit.status, hit.result, hit.headers[CACHE_HEADER]) == (200, 'result-1', 'hit')
+    assert compute.calls == 1
+
+
+def test_changed_version_is_recomputed_with_a_new_etag():
+    cache = ConditionalCache(stale_while_revalidate=False, name='test')
+    compute = Computation()
+    first = cache.get('k', lambda: Version('v1'), compute)
+    changed = cache.get('k', lambda: Version('v2'), compute, if_none_match=first.headers['ETag'])
+    assert (changed.status, changed.result) == (200, 'result-2')
+    assert changed.headers['ETag'] != first.headers['ETag']
+
+
+def test_if_modified_since():
+    cache = ConditionalCache(stale_while_revalidate=False, name='test')
+    modified = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    compute = Computation()
+    first = cache.get('k', lambda: Version('v1', last_modified=modified), compute)
+    # Never earlier than when the cache first saw the tag
+    sent = first.headers['Last-Modified']
+    assert cache.get('k', lambda: Version('v1', last_modified=modified), compute, if_modified_since=sent).status == 304
+
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(hours=1), usegmt=True)
+    assert cache.get('k', lambda: Version('v1', last_modified=modified), compute, if_modified_since=later).status == 304
+    # A new tag moves Last-Modified past the previous one even when the stored times did not change
+    changed = cache.get('k', lambda: Version('v2', last_modified=modified), compute, if_modified_since=sent)
+    assert changed.status == 200
+
+
+def test_uncacheable_results_are_not_stored():
+    cache = ConditionalCache(stale_while_revalidate=False, name='test')
+    compute = Computation()
+    cache.get('k', lambda: Version('v1'), compute, cacheable=lambda result: False)
+    assert cache.get('k', lambda: Version('v1'), compute).headers[CACHE_HEADER] == 'miss'
+    assert compute.calls == 2
+
+
+def test_stale_result_is_served_while_revalidating():
+    cache = ConditionalCache(stale_while_revalidate=True, name='test')
+    compute = Computation()
+    cache.get('k', lambda: Version('v1'), compute)
+
+    compute.gate.clear()
+    compute.done.clear()
+    stale = cache.get('k', lambda: Version('v2'), compute)
+    # Answered at once from the old version, under the old version's ETag
+    assert (stale.status, stale.result, stale.headers[CACHE_HEADER]) == (200, 'result-1', 'stale')
+    assert stale.headers['ETag'] == Version('v1').etag()
+
+    compute.gate.set()
+    assert compute.done.wait(5)
+    for _ in range(100):
+        if 'k' not in cache._refreshing:
+            break
+        threading.Event().wait(0.01)
+    fresh = cache.get('k', lambda: Version('v2'), compute)
+    assert (fresh.result, fresh.headers[CACHE_HEADER]) == ('result-2', 'hit')
+    assert compute.calls == 2
+
+
+def test_stale_is_opt_in_per_request():
+    cache = ConditionalCache(stale_while_revalidate=False, name='test')
+    compute = Computation()
+    cache.get('k', lambda: Version('v1'), compute)
+    assert cache.get('k', lambda: Version('v2'), compute).headers[CACHE_HEADER] == 'miss'
+    stale = cache.get('k', lambda: Version('v3'), compute, allow_stale=True)
+    assert stale.headers[CACHE_HEADER] == 'stale'
@@ -0,0 +1,92 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+import mongo_client
+from data_sources import CSVDataSource, MongoDataSource, ParquetDataSource, get_data_source, snapshot_to_parquet
+
+mongomock = pytest.importorskip("mongomock")
+
+START = datetime.datetime(2025, 1, 1)
+FILTERS = [
+    [('sale_date', '>=', '2025-03-01'), ('sale_date', '<', '2025-06-01')],
+    [('payment_mode', 'in', ['UPI', 'Card']), ('total_amount', '>', 500)],
+    [('total_amount', '<=', 100), ('payment_mode', '!=', 'Cash')]
+]
+
+
+def sales_documents(count=300):
+    rng = np.random.default_rng(1)
+    return [{
+        '_id': ObjectId(f'{1000 + i:024x}'),
+        'customer_id': ObjectId(f'{int(rng.integers(0, 10)):024x}'),
+        'sale_date': START + datetime.timedelta(seconds=int(rng.integers(0, 200 * 86400)), milliseconds=int(rng.integers(0, 1000))),
+        'total_amount': round(float(rng.random() * 1000), 2),
+        'payment_mode': str(rng.choice(['Cash', 'UPI', 'Card']))
+    } for i in range(count)]
+
+
+@pytest.fixture
+def shared_client(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mongo_client, 'get_client', lambda: client)
+    client['stockpilot_test'].sales.insert_many(sales_documents())
+    return client
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    df = pd.DataFrame(sales_documents())
+    for column in ('_id', 'customer_id'):
+        df[column] = df[column].astype(str)
+    df['sale_date'] = pd.to_datetime(df['sale_date']).dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3] + '+00:00'
+    df.to_csv(tmp_path / 'sales.csv', index=False)
+    return tmp_path
+
+
+def canonical(df):
+    return df.sort_values('_id').reset_index(drop=True).astype({'customer_id': object, 'payment_mode': object})
+
+
+def test_mongo_source_reads_through_the_shared_client(shared_client):
+    source = get_data_source('mongo', base_dir='ignored', database='stockpilot_test')
+    assert isinstance(source, MongoDataSource)
+    assert source.db.client is shared_client
+    source.close()
+    # The shared client stays usable for the rest of the process
+    assert len(source.load('sales')) == 300
+
+
+@pytest.mark.parametrize('filters', [None] + FILTERS)
+def test_backends_return_the_same_frames(shared_client, csv_dir, filters):
+    mongo = MongoDataSource('stockpilot_test').load('sales', filters=filters)
+    csv = CSVDataSource(str(csv_dir)).load('sales', filters=filters)
+    assert len(csv) > 0
+    pd.testing.assert_frame_equal(canonical(mongo), canonical(csv)[list(mongo.columns)])
+
+
+def test_columns_are_projected(shared_client, csv_dir):
+    columns = ['total_amount', 'sale_date']
+    for source in (MongoDataSource('stockpilot_test'), CSVDataSource(str(csv_dir))):
+        df = source.load('sales', columns=columns, filters=FILTERS[1])
+        assert list(df.columns) == columns
+
+
+def test_raw_loads_keep_the_inferred_dtypes(shared_client, csv_dir):
+    raw = CSVDataSource(str(csv_dir)).load_raw('sales')
+    assert raw['sale_date'].dtype == object and raw['total_amount'].dtype == np.float64
+    raw = MongoDataSource('stockpilot_test').load_raw('sales')
+    assert isinstance(raw['_id'].iloc[0], ObjectId)
+
+
+def test_parquet_snapshot_matches_its_source(csv_dir, tmp_path):
+    pytest.importorskip("pyarrow")
+    source = CSVDataSource(str(csv_dir))
+    snapshot_to_parquet(source, str(tmp_path / 'snapshot'), collections=['sales'])
+    parquet = ParquetDataSource(str(tmp_path / 'snapshot'))
+    for filters in [None] + FILTERS:
+        pd.testing.assert_frame_equal(canonical(parquet.load('sales', filters=filters)),
+                                      canonical(source.load('sales', filters=filters)))
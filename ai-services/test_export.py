@@ -0,0 +1,92 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+import export
+from fit_scheduler import SchedulerBusy
+from serialization import loads
+
+
+class FakeCalculator:
+    """Loaded calculator stand-in: reorder points of p1..p5, with failures chosen per test"""
+
+    def __init__(self, failing=(), busy=()):
+        self.df_batches = pd.DataFrame({'product_id': ['p3', 'p1', 'p5', 'p2', 'p4', 'p1']})
+        self.df_products = pd.DataFrame({'_id': ['p1', 'p2']})
+        self.failing = set(failing)
+        self.busy = set(busy)
+        self.calculated = []
+
+    def when_admitted(self, fn):
+        return fn()
+
+    def calculate_reorder_point(self, product_id, priority):
+        if product_id in self.busy:
+            raise SchedulerBusy("Forecast queue is full", 429, 1)
+        self.calculated.append(product_id)
+        if product_id in self.failing:
+            return {'error': f'No sales data for {product_id}'}
+        return {'product_id': product_id, 'reorder_point': 10, 'reorder_needed': False}
+
+
+def ndjson(calculator, **kwargs):
+    body, headers = export.export_stream('reorder', calculator, 'ndjson', **kwargs)
+    return [loads(line) for line in b''.join(body).splitlines()], headers
+
+
+def test_products_come_in_ascending_id_order():
+    rows, headers = ndjson(FakeCalculator(), chunk_size=2)
+    assert [row['product_id'] for row in rows] == ['p1', 'p2', 'p3', 'p4', 'p5']
+    assert headers['X-StockPilot-Export-Products'] == '5'
+
+
+def test_after_resumes_past_the_last_product_received():
+    calculator = FakeCalculator()
+    first, _ = ndjson(calculator, limit=2)
+    resumed, headers = ndjson(calculator, after=first[-1]['product_id'])
+    assert [row['product_id'] for row in first + resumed] == ['p1', 'p2', 'p3', 'p4', 'p5']
+    assert headers['X-StockPilot-Export-Products'] == '3'
+    # Resuming computes only what is left
+    assert calculator.calculated == ['p1', 'p2', 'p3', 'p4', 'p5']
+
+
+def test_after_need_not_be_an_exported_id():
+    rows, _ = ndjson(FakeCalculator(), after='p2x')
+    assert [row['product_id'] for row in rows] == ['p3', 'p4', 'p5']
+    assert ndjson(FakeCalculator(), after='p5')[0] == []
+
+
+def test_failed_products_get_an_error_row():
+    rows, _ = ndjson(FakeCalculator(failing={'p2'}))
+    assert rows[1] == {'product_id': 'p2', 'error': 'No sales data for p2'}
+    assert [row['product_id'] for row in rows] == ['p1', 'p2', 'p3', 'p4', 'p5']
+
+
+def test_busy_scheduler_ends_the_stream_with_a_marker_row():
+    rows, _ = ndjson(FakeCalculator(busy={'p4'}), chunk_size=2)
+    assert [row['product_id'] for row in rows] == ['p1', 'p2', 'p3', 'p4']
+    assert rows[-1]['error'] == export.BUSY_ERROR
+    # Resuming after the last product exported in full picks up the marked one
+    resumed, _ = ndjson(FakeCalculator(), after=rows[-2]['product_id'])
+    assert [row['product_id'] for row in resumed] == ['p4', 'p5']
+
+
+def test_busy_before_any_product_is_raised():
+    with pytest.raises(SchedulerBusy):
+        export.export_stream('reorder', FakeCalculator(busy={'p1'}), 'ndjson')
+
+
+def test_csv_has_the_error_column_and_gzip_on_request():
+    body, headers = export.export_stream('reorder', FakeCalculator(failing={'p1'}), 'csv', limit=2,
+                                         accept_encoding='br, gzip;q=0.8')
+    assert headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(b''.join(body)).decode('utf-8').splitlines()
+    assert lines[0].split(',')[-1] == 'error'
+    assert lines[1].startswith('p1,') and lines[1].endswith(',No sales data for p1')
+    assert lines[2].startswith('p2,') and lines[2].endswith(',')
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        export.export_stream('reorder', FakeCalculator(), 'xml')
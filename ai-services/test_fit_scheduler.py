@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from fit_scheduler import FitScheduler, SchedulerBusy, INTERACTIVE, BATCH
+
+
+def _occupy(scheduler):
+    """Hold the scheduler's only slot until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def fit():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=scheduler.run, args=(fit,))
+    thread.start()
+    started.wait(5)
+    return thread, release
+
+
+def _queue(scheduler, name, priority, order, errors, key=None, deadline=None):
+    def call():
+        try:
+            scheduler.run(lambda: order.append(name), priority, deadline=deadline, key=key)
+        except SchedulerBusy as e:
+            errors.append((name, e))
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread
+
+
+def _wait_queued(scheduler, queued):
+    for _ in range(1000):
+        if scheduler.stats()['queued'] >= queued:
+            return
+        time.sleep(0.005)
+    raise AssertionError(f"{queued} fits never queued")
+
+
+def test_interactive_runs_before_queued_batch():
+    scheduler = FitScheduler(max_concurrent=1, max_queue=4)
+    holder, release = _occupy(scheduler)
+    order, errors = [], []
+    threads = [_queue(scheduler, 'batch', BATCH, order, errors)]
+    _wait_queued(scheduler, 1)
+    threads.append(_queue(scheduler, 'interactive', INTERACTIVE, order, errors))
+    _wait_queued(scheduler, 2)
+    release.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+
+    assert order == ['interactive', 'batch']
+    assert errors == []
+
+
+def test_full_queue_rejects_with_429():
+    scheduler = FitScheduler(max_concurrent=1, max_queue=1)
+    holder, release = _occupy(scheduler)
+    order, errors = [], []
+    queued = _queue(scheduler, 'queued', BATCH, order, errors)
+    _wait_queued(scheduler, 1)
+
+    with pytest.raises(SchedulerBusy) as busy:
+        scheduler.run(lambda: None)
+    assert busy.value.status == 429
+    assert busy.value.retry_after >= 1
+
+    release.set()
+    holder.join(5)
+    queued.join(5)
+    assert order == ['queued']
+    assert scheduler.stats()['rejected'] == 1
+
+
+def test_deadline_passing_in_queue_gives_503():
+    scheduler = FitScheduler(max_concurrent=1, max_queue=4)
+    holder, release = _occupy(scheduler)
+    try:
+        with pytest.raises(SchedulerBusy) as busy:
+            scheduler.run(lambda: None, deadline=0.1)
+        assert busy.value.status == 503
+        stats = scheduler.stats()
+        assert stats['expired'] == 1 and stats['queued'] == 0
+    finally:
+        release.set()
+        holder.join(5)
+
+
+def test_promote_moves_batch_fit_ahead():
+    scheduler = FitScheduler(max_concurrent=1, max_queue=4)
+    holder, release = _occupy(scheduler)
+    order, errors = [], []
+    threads = [_queue(scheduler, 'other', BATCH, order, errors)]
+    _wait_queued(scheduler, 1)
+    threads.append(_queue(scheduler, 'joined', BATCH, order, errors, key='p1'))
+    _wait_queued(scheduler, 2)
+
+    assert scheduler.promote('p1', INTERACTIVE) == 1
+    assert scheduler.promote('missing', INTERACTIVE) == 0
+    release.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    assert order == ['joined', 'other']
+    assert scheduler.stats()['promoted'] == 1
+
+
+def test_promote_shortens_the_deadline():
+    scheduler = FitScheduler(max_concurrent=1, max_queue=4, deadlines={INTERACTIVE: 0.3, BATCH: 60})
+    holder, release = _occupy(scheduler)
+    order, errors = [], []
+    threads = [_queue(scheduler, 'other', BATCH, order, errors)]
+    _wait_queued(scheduler, 1)
+    threads.append(_queue(scheduler, 'joined', BATCH, order, errors, key='p1'))
+    _wait_queued(scheduler, 2)
+
+    assert scheduler.promote('p1', INTERACTIVE) == 1
+    # Now under the interactive deadline, the promoted fit gives up first
+    threads[1].join(5)
+    assert [name for name, _ in errors] == ['joined']
+    assert errors[0][1].status == 503
+
+    release.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    assert order == ['other']
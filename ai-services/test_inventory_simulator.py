@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from inventory_simulator import InventorySimulator, build_daily_demand_matrix
+from lead_time_demand import LeadTimeDemandModel
+
+
+def test_demand_matrix_keeps_days_without_sales():
+    sales = pd.DataFrame({'_id': ['s1', 's2', 's3'],
+                          'sale_date': pd.to_datetime(['2025-01-01 09:00', '2025-01-01 17:00', '2025-01-04 12:00'])})
+    items = pd.DataFrame({'sale_id': ['s1', 's2', 's3', 's3', 'missing'],
+                          'product_id': ['p2', 'p2', 'p1', 'p2', 'p1'],
+                          'quantity': [1, 2, 5, 3, 100]})
+    product_ids, dates, matrix = build_daily_demand_matrix(items, sales)
+    assert product_ids.tolist() == ['p1', 'p2']
+    assert len(dates) == 4
+    np.testing.assert_array_equal(matrix, [[0, 0, 0, 5], [3, 0, 0, 3]])
+
+    # Requested products keep their order; unknown ones are all zeros
+    product_ids, _, matrix = build_daily_demand_matrix(items, sales, product_ids=['p9', 'p1'])
+    np.testing.assert_array_equal(matrix, [[0, 0, 0, 0], [0, 0, 0, 5]])
+
+
+def test_constant_demand_stocks_out_exactly_past_the_lead_time_demand():
+    simulator = InventorySimulator(np.full((3, 30), [[1], [2], [0]]), num_paths=50, seed=1)
+    results = simulator.simulate([5, 10], [4, 5, 10, 20])
+    # Lead-time demand is 5 / 10, 10 / 20 and 0 for the three products
+    np.testing.assert_array_equal(results['stockout_probability'][0], [[1, 0, 0, 0], [1, 1, 0, 0]])
+    np.testing.assert_array_equal(results['stockout_probability'][1], [[1, 1, 0, 0], [1, 1, 1, 0]])
+    assert not results['stockout_probability'][2].any()
+    np.testing.assert_allclose(results['fill_rate'][0, 0], [0.8, 1, 1, 1])
+    np.testing.assert_allclose(results['fill_rate'][2], 1)
+
+
+def test_stockout_probability_matches_the_exact_distribution():
+    rng = np.random.default_rng(2)
+    demand = rng.poisson([[0.3], [2], [6]], size=(3, 90))
+    lead_time_days = 7
+    simulator = InventorySimulator(demand, num_paths=20000, seed=3)
+    candidates = np.array([0, 5, 15, 40, 60])
+    simulated = simulator.simulate([lead_time_days], candidates)['stockout_probability'][:, 0, :]
+
+    cdf = np.cumsum(LeadTimeDemandModel(demand).distribution(lead_time_days), axis=1)
+    exact = 1 - cdf[:, np.minimum(candidates, cdf.shape[1] - 1)]
+    np.testing.assert_allclose(simulated, exact, atol=0.015)
+
+
+def test_per_product_reorder_points_and_small_chunks():
+    demand = np.tile(np.arange(1, 5, dtype=np.float32)[:, None], (1, 20))
+    simulator = InventorySimulator(demand, num_paths=10, seed=4)
+    simulator.MAX_CHUNK_BYTES = 1
+    results = simulator.simulate(3, demand[:, :1] * [3, 2])
+    np.testing.assert_array_equal(results['stockout_probability'][:, 0, :], [[0, 1]] * 4)
+
+
+def test_no_history_means_no_risk():
+    results = InventorySimulator(np.zeros((2, 0)), seed=5).simulate([7], [1, 2])
+    assert not results['stockout_probability'].any()
+    assert (results['fill_rate'] == 1).all()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from lead_time_demand import LeadTimeDemandModel, daily_demand_pmf
+
+
+def random_demand(seed, products=12, days=60):
+    rng = np.random.default_rng(seed)
+    # Slow, medium and fast movers, with some products that never sell
+    scale = rng.choice([0, 0.5, 3, 15], size=products)[:, None]
+    return rng.poisson(scale, size=(products, days))
+
+
+def brute_force_distribution(daily, lead_time_days):
+    """Lead-time demand by direct repeated convolution of the empirical daily pmf"""
+    pmf = np.bincount(daily, minlength=1) / len(daily)
+    distribution = np.array([1.0])
+    for _ in range(lead_time_days):
+        distribution = np.convolve(distribution, pmf)
+    return distribution
+
+
+def test_daily_pmf_counts_each_product_separately():
+    pmf = daily_demand_pmf(np.array([[0, 1, 1, 3], [2, 2, 2, 2], [-1, 0, 0.4, 0]]))
+    np.testing.assert_allclose(pmf, [[0.25, 0.5, 0, 0.25], [0, 0, 1, 0], [1, 0, 0, 0]])
+
+
+@pytest.mark.parametrize('lead_time_days', [1, 2, 7, 14])
+def test_distribution_matches_direct_convolution(lead_time_days):
+    demand = random_demand(lead_time_days)
+    distribution = LeadTimeDemandModel(demand).distribution(lead_time_days)
+    for row, daily in zip(distribution, demand):
+        expected = brute_force_distribution(daily, lead_time_days)
+        np.testing.assert_allclose(row[:len(expected)], expected, atol=1e-10)
+        # Beyond the product's own support only rounding noise of its chunk's transform remains
+        np.testing.assert_allclose(row[len(expected):], 0, atol=1e-10)
+
+
+@pytest.mark.parametrize('service_level', [0.5, 0.9, 0.95, 0.99])
+@pytest.mark.parametrize('chunk_bytes', [1, 64 * 1024, None])
+def test_reorder_points_are_quantiles_of_direct_convolution(service_level, chunk_bytes):
+    lead_time_days = 7
+    demand = random_demand(3)
+    model = LeadTimeDemandModel(demand)
+    if chunk_bytes is not None:
+        # Tiny budgets split the catalog into many chunks of different widths
+        model.MAX_CHUNK_BYTES = chunk_bytes
+    reorder_points, mean_demand = model.reorder_points(lead_time_days, service_level)
+    for product, daily in enumerate(demand):
+        expected = brute_force_distribution(daily, lead_time_days)
+        cdf = np.cumsum(expected)
+        assert reorder_points[product] == np.argmax(cdf >= service_level - 1e-9)
+        assert mean_demand[product] == pytest.approx(lead_time_days * daily.mean(), abs=1e-6)
+
+
+def test_zero_lead_time_needs_no_stock():
+    model = LeadTimeDemandModel(random_demand(4))
+    reorder_points, mean_demand = model.reorder_points(0, 0.95)
+    assert not reorder_points.any() and not mean_demand.any()
+    assert np.all(model.distribution(0)[:, 0] == 1)
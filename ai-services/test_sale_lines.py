@@ -0,0 +1,114 @@
+import datetime
+
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+from mongo_client import record_deletions
+from sale_lines import build_sale_lines, refresh_sale_lines, sale_lines_changed_at
+
+mongomock = pytest.importorskip("mongomock")
+
+SALE_DATE = datetime.datetime(2025, 9, 1, 10, 30)
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    db.product_batches.insert_many([
+        {'_id': ObjectId(), 'product_id': f'p{i}', 'batch_number': f'B{i}', 'barcode': f'89{i}'} for i in range(3)
+    ])
+    db.sales.insert_many([
+        {'_id': ObjectId(), 'sale_date': SALE_DATE + datetime.timedelta(days=i), 'customer_id': 'c1',
+         'payment_mode': 'Cash', 'updatedAt': SALE_DATE} for i in range(4)
+    ])
+    batches = [doc['_id'] for doc in db.product_batches.find()]
+    sales = [doc['_id'] for doc in db.sales.find()]
+    db.sale_items.insert_many([
+        {'_id': ObjectId(), 'sale_id': sales[i % 4], 'batch_id': batches[i % 3], 'quantity': i + 1, 'mrp': 10.0,
+         'createdAt': SALE_DATE, 'updatedAt': SALE_DATE} for i in range(12)
+    ])
+    return db
+
+
+def expected_lines(db):
+    """sale_lines as a full join of the base collections would build them"""
+    lines = build_sale_lines(
+        pd.DataFrame(list(db.sales.find())),
+        pd.DataFrame(list(db.sale_items.find())),
+        pd.DataFrame(list(db.product_batches.find()))
+    )
+    return {str(line['_id']): (line['product_id'], int(line['quantity']), line['sale_date'])
+            for line in lines.to_dict('records')}
+
+
+def stored_lines(db):
+    return {str(doc['_id']): (doc['product_id'], doc['quantity'], doc['sale_date']) for doc in db.sale_lines.find()}
+
+
+def test_build_sale_lines_drops_items_without_a_sale_or_batch():
+    sales = pd.DataFrame({'_id': ['s1'], 'sale_date': [SALE_DATE], 'customer_id': ['c1'], 'payment_mode': ['UPI']})
+    items = pd.DataFrame({'_id': ['i1', 'i2', 'i3'], 'sale_id': ['s1', 's2', 's1'], 'batch_id': ['b1', 'b1', 'b9'],
+                          'quantity': [2, 3, 4]})
+    lines = build_sale_lines(sales, items, pd.DataFrame({'_id': ['b1'], 'product_id': ['p1']}))
+    assert lines[['_id', 'product_id', 'quantity', 'payment_mode']].values.tolist() == [['i1', 'p1', 2, 'UPI']]
+
+
+def test_rebuild_and_idle_refreshes(db):
+    counts = refresh_sale_lines(db, rebuild=True)
+    assert counts['lines'] == 12
+    assert stored_lines(db) == expected_lines(db)
+    changed_at = sale_lines_changed_at(db)
+
+    # Nothing changed: nothing is written and the change time stays put
+    assert refresh_sale_lines(db) == {'lines': 0, 'deleted': 0, 'unresolved': 0}
+    assert sale_lines_changed_at(db) == changed_at
+
+
+def test_refresh_follows_updates_inserts_and_tombstones(db):
+    refresh_sale_lines(db, rebuild=True)
+    later = datetime.datetime.utcnow()
+    items = [doc['_id'] for doc in db.sale_items.find()]
+    sales = [doc['_id'] for doc in db.sales.find()]
+
+    db.sale_items.update_one({'_id': items[0]}, {'$set': {'quantity': 50, 'updatedAt': later}})
+    db.sales.update_one({'_id': sales[1]}, {'$set': {'sale_date': SALE_DATE - datetime.timedelta(days=30), 'updatedAt': later}})
+    # Written by the Node backend: no updatedAt, quantity_sold and the batch by number
+    node_item = db.sale_items.insert_one({'_id': ObjectId(), 'sale_id': sales[2], 'quantity_sold': 7,
+                                          'batch_number': 'B2', 'barcode': '892'}).inserted_id
+    db.sale_items.delete_one({'_id': items[3]})
+    record_deletions(db, 'sale_items', [items[3]])
+    db.sales.delete_one({'_id': sales[3]})
+    record_deletions(db, 'sales', [sales[3]])
+
+    counts = refresh_sale_lines(db)
+    # The two items left behind by the deleted sale no longer resolve
+    assert counts['unresolved'] == 2
+    lines = stored_lines(db)
+    assert lines.pop(str(node_item)) == ('p2', 7, SALE_DATE + datetime.timedelta(days=2))
+    assert lines == expected_lines(db)
+    assert len(lines) == 12 - 3
+
+
+def test_unresolved_items_are_retried(db):
+    refresh_sale_lines(db, rebuild=True)
+    sale_id = ObjectId()
+    db.sale_items.insert_one({'_id': ObjectId(), 'sale_id': sale_id, 'batch_id': db.product_batches.find_one()['_id'],
+                              'quantity': 1, 'updatedAt': datetime.datetime.utcnow()})
+    assert refresh_sale_lines(db)['unresolved'] == 1
+
+    # The sale arrives after its item
+    db.sales.insert_one({'_id': sale_id, 'sale_date': SALE_DATE, 'customer_id': 'c2', 'payment_mode': 'UPI'})
+    assert refresh_sale_lines(db)['lines'] == 1
+    assert stored_lines(db) == expected_lines(db)
+
+
+def test_deletes_without_tombstones_wait_for_reconcile(db):
+    refresh_sale_lines(db, rebuild=True)
+    db.sale_items.delete_many({'quantity': {'$lte': 2}})
+    refresh_sale_lines(db)
+    assert len(stored_lines(db)) == 12
+
+    assert refresh_sale_lines(db, reconcile=True)['deleted'] == 2
+    assert stored_lines(db) == expected_lines(db)
+    assert db.sync_state.find_one({'_id': 'sale_lines'})['reconciled_at'] is not None
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from data_sources import CSVDataSource
+from schema import apply_schema, memory_report, parse_timestamps
+
+
+def test_timestamps_parse_to_naive_utc_in_every_format():
+    values = pd.Series(['2025-09-27T02:57:33.358+00:00', '2025-09-27T08:27:33.358+05:30', '2025-09-27', None, 'garbage'])
+    expected = pd.to_datetime([pd.Timestamp('2025-09-27 02:57:33.358'), pd.Timestamp('2025-09-27 02:57:33.358'),
+                               pd.Timestamp('2025-09-27'), None, None])
+    pd.testing.assert_series_equal(parse_timestamps(values), pd.Series(expected), check_names=False)
+    # Categoricals are parsed once per category and aware datetimes converted to UTC
+    pd.testing.assert_series_equal(parse_timestamps(values.astype('category')), pd.Series(expected), check_names=False)
+    aware = pd.Series(pd.to_datetime(['2025-01-01 05:30']).tz_localize('Asia/Kolkata'))
+    assert parse_timestamps(aware).iloc[0] == pd.Timestamp('2025-01-01')
+
+
+def test_apply_schema_converts_every_kind():
+    df = apply_schema(pd.DataFrame({
+        '_id': ['a', 'b', 'c', 'd'],
+        'sale_id': ['s1', 's1', 's1', 's2'],
+        'batch_id': ['b1', 'b2', 'b3', 'b4'],
+        'quantity': ['1', 2, 3.0, 4],
+        'mrp': [10.5, None, 3, '7.25'],
+        'createdAt': ['2025-01-01T00:00:00.000+00:00'] * 4,
+        'extra': [1, 2, 3, 4]
+    }), 'sale_items')
+    assert isinstance(df['sale_id'].dtype, pd.CategoricalDtype)
+    # Nearly unique references stay plain strings
+    assert df['batch_id'].dtype == object
+    assert df['quantity'].dtype == np.int32
+    assert df['mrp'].dtype == np.float32 and np.isnan(df['mrp'].iloc[1])
+    assert df['createdAt'].dtype == 'datetime64[ns]'
+    assert df['extra'].dtype == np.int64
+
+
+def test_integers_with_gaps_fall_back_to_float32():
+    df = apply_schema(pd.DataFrame({'quantity_in_stock': [1, None, 3]}), 'product_batches')
+    assert df['quantity_in_stock'].dtype == np.float32
+
+
+def test_memory_report_compares_a_plain_read_csv_with_the_typed_load(tmp_path):
+    rng = np.random.default_rng(1)
+    rows = 5000
+    pd.DataFrame({
+        '_id': [f'{i:024x}' for i in range(rows)],
+        'customer_id': [f'{i:024x}' for i in rng.integers(0, 50, rows)],
+        'sale_date': ['2025-09-27T02:57:33.358+00:00'] * rows,
+        'total_amount': rng.random(rows) * 1000,
+        'payment_mode': rng.choice(['Cash', 'UPI', 'Card'], rows)
+    }).to_csv(tmp_path / 'sales.csv', index=False)
+
+    source = CSVDataSource(str(tmp_path))
+    report = memory_report(source, ['sales', 'sale_items']).set_index('collection')
+    # Missing collections are skipped
+    assert list(report.index) == ['sales']
+    plain = pd.read_csv(tmp_path / 'sales.csv').memory_usage(deep=True).sum() / 1e6
+    typed = source.load('sales').memory_usage(deep=True).sum() / 1e6
+    assert report.loc['sales', 'inferred_mb'] == round(plain, 2)
+    assert report.loc['sales', 'typed_mb'] == round(typed, 2)
+    assert report.loc['sales', 'saved_pct'] > 0
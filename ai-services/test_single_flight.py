@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _start_leader(flights, key, fn):
+    """Start a call of key in a thread; returns (thread, results, errors)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread, results, errors
+
+
+def _wait_for_waiters(flights, key, waiters):
+    # Waiters register under the lock before blocking
+    for _ in range(1000):
+        call = flights._calls.get(key)
+        if call is not None and call.waiters >= waiters:
+            return
+        threading.Event().wait(0.005)
+    raise AssertionError(f"{waiters} waiters never joined {key}")
+
+
+def test_concurrent_callers_share_one_result():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return 42
+
+    leader, results, errors = _start_leader(flights, 'k', compute)
+    started.wait(5)
+    followers = [_start_leader(flights, 'k', lambda: pytest.fail("joined call must not compute")) for _ in range(3)]
+    _wait_for_waiters(flights, 'k', 3)
+    release.set()
+    for thread, _, _ in [(leader, results, errors)] + followers:
+        thread.join(5)
+
+    assert results == [42]
+    assert [r for _, r, _ in followers] == [[42]] * 3
+    assert flights.executed == 1 and flights.shared == 3
+    assert flights.in_flight() == 0
+
+
+def test_error_propagates_to_every_waiter():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    error = RuntimeError("fit failed")
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise error
+
+    leader, _, leader_errors = _start_leader(flights, 'k', compute)
+    started.wait(5)
+    followers = [_start_leader(flights, 'k', lambda: None) for _ in range(2)]
+    _wait_for_waiters(flights, 'k', 2)
+    release.set()
+    leader.join(5)
+    for thread, _, _ in followers:
+        thread.join(5)
+
+    assert leader_errors == [error]
+    assert [e for _, _, e in followers] == [[error], [error]]
+    # Nothing is cached: the next call computes again
+    assert flights.do('k', lambda: 'retried') == 'retried'
+
+
+def test_on_join_runs_only_for_joined_callers():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    joined = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return 'done'
+
+    leader, _, _ = _start_leader(flights, 'k', compute)
+    started.wait(5)
+    follower = threading.Thread(target=lambda: flights.do('k', lambda: None, on_join=lambda: joined.append(True)))
+    follower.start()
+    _wait_for_waiters(flights, 'k', 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert joined == [True]
+    flights.do('other', lambda: None, on_join=lambda: joined.append(False))
+    assert joined == [True]
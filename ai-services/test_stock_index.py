@@ -0,0 +1,99 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_index import ExpiryStockIndex
+
+START = pd.Timestamp('2025-03-01')
+
+
+def random_batches(seed, count=300, products=8):
+    rng = np.random.default_rng(seed)
+    expiry = START + pd.to_timedelta(rng.integers(-60, 200, count), unit='D')
+    # Some batches never expire, some have unparseable dates, some are sold out
+    expiry = pd.Series(expiry.strftime('%Y-%m-%dT%H:%M:%S.000+00:00'), dtype=object)
+    expiry[rng.random(count) < 0.1] = None
+    expiry[rng.random(count) < 0.03] = 'not a date'
+    return pd.DataFrame({
+        'product_id': [f'p{i}' for i in rng.integers(0, products, count)],
+        'expiry_date': expiry,
+        'quantity_in_stock': np.where(rng.random(count) < 0.2, 0, rng.integers(1, 100, count))
+    })
+
+
+def expiry_days(batches):
+    return pd.to_datetime(batches['expiry_date'], errors='coerce', utc=True).dt.tz_localize(None).dt.normalize()
+
+
+def brute_force_stock(batches, product_id, low, high=None):
+    """Stock with low < expiry day <= high; undated batches only count when there is no upper bound"""
+    days = expiry_days(batches)
+    rows = batches['product_id'] == product_id
+    if high is None:
+        rows &= days.isna() | (days > low)
+    else:
+        rows &= days.notna() & (days > low) & (days <= high)
+    return int(batches.loc[rows, 'quantity_in_stock'].sum())
+
+
+def query_days():
+    return [START + pd.Timedelta(days=offset) for offset in (-400, -61, -60, -1, 0, 1, 30, 45, 139, 199, 200, 5000)]
+
+
+@pytest.fixture
+def batches():
+    return random_batches(1)
+
+
+def test_sellable_stock_matches_a_scan(batches):
+    index = ExpiryStockIndex(batches)
+    sellable = {day: index.sellable_stock_all(as_of=day) for day in query_days()}
+    for product_id in [f'p{i}' for i in range(8)]:
+        for day in query_days():
+            expected = brute_force_stock(batches, product_id, day)
+            assert index.sellable_stock(product_id, as_of=day) == expected
+            assert sellable[day][product_id] == expected
+
+
+@pytest.mark.parametrize('window', [0, 1, 7, 30, 365])
+def test_expiring_stock_matches_a_scan(batches, window):
+    index = ExpiryStockIndex(batches)
+    for day in query_days():
+        expiring = index.expiring_stock_all(window, as_of=day)
+        for product_id in [f'p{i}' for i in range(8)]:
+            expected = brute_force_stock(batches, product_id, day, day + pd.Timedelta(days=window))
+            assert index.expiring_stock(product_id, window, as_of=day) == expected
+            assert expiring[product_id] == expected
+
+
+def test_a_batch_is_sellable_through_its_expiry_day():
+    index = ExpiryStockIndex(pd.DataFrame({'product_id': ['p1'], 'expiry_date': ['2025-03-10'], 'quantity_in_stock': [5]}))
+    assert index.sellable_stock('p1', as_of='2025-03-09 23:00') == 5
+    assert index.sellable_stock('p1', as_of='2025-03-10') == 0
+    assert index.expiring_stock('p1', 1, as_of='2025-03-09') == 5
+
+
+def test_next_expiry_skips_expired_and_sold_out_batches():
+    index = ExpiryStockIndex(pd.DataFrame({
+        'product_id': ['p1', 'p1', 'p1', 'p1', 'p2'],
+        'expiry_date': ['2025-03-05', '2025-03-12', '2025-03-20', None, None],
+        'quantity_in_stock': [10, 0, 4, 7, 3]
+    }))
+    assert index.next_expiry('p1', as_of='2025-03-06') == datetime.date(2025, 3, 20)
+    assert index.next_expiry('p1', as_of='2025-03-25') is None
+    assert index.next_expiry('p2', as_of='2025-03-06') is None
+    assert index.next_expiry('missing') is None
+
+
+def test_products_without_batches_have_no_stock(batches):
+    index = ExpiryStockIndex(batches)
+    assert index.sellable_stock('missing', as_of=START) == 0
+    assert index.expiring_stock('missing', 30, as_of=START) == 0
+
+
+def test_batches_without_expiry_column_never_expire():
+    index = ExpiryStockIndex(pd.DataFrame({'product_id': ['p1', 'p2', 'p1'], 'quantity_in_stock': [3, 4, '5']}))
+    assert index.sellable_stock_all(as_of='2100-01-01').to_dict() == {'p1': 8, 'p2': 4}
+    assert index.expiring_stock_all(10000, as_of=START).sum() == 0
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_ledger import (
+    MOVEMENT_COLUMNS, MOVEMENTS_COLLECTION, SNAPSHOTS_COLLECTION, StockLedger, acquire_lease, release_lease,
+    replay_daily_levels, stored_stock_at, sync_stock_ledger
+)
+
+mongomock = pytest.importorskip("mongomock")
+
+START = pd.Timestamp('2025-01-01')
+
+
+def random_movements(seed, count=400, products=5, days=90):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'movement_id': [f'm{i}' for i in range(count)],
+        'product_id': [f'p{i}' for i in rng.integers(0, products, count)],
+        'batch_id': [f'b{i}' for i in rng.integers(0, 3 * products, count)],
+        'timestamp': START + pd.to_timedelta(rng.integers(0, days * 86400, count), unit='s'),
+        'quantity': rng.integers(-20, 40, count),
+        'movement_type': 'sale'
+    })[MOVEMENT_COLUMNS]
+
+
+def brute_force_stock(movements, product_id, timestamp):
+    rows = movements[(movements['product_id'] == product_id) & (movements['timestamp'] <= pd.Timestamp(timestamp))]
+    return int(rows['quantity'].sum())
+
+
+def probe_times(seed, count=60, days=100):
+    rng = np.random.default_rng(seed)
+    times = list(START - pd.Timedelta(days=1) + pd.to_timedelta(rng.integers(0, days * 86400, count), unit='s'))
+    # Exactly on snapshot boundaries and movements
+    return times + [START + pd.Timedelta(days=7 * week) for week in range(14)]
+
+
+@pytest.mark.parametrize('interval', [1, 7, 30])
+def test_stock_at_matches_a_full_replay(interval):
+    movements = random_movements(1)
+    ledger = StockLedger(movements, snapshot_interval_days=interval)
+    times = probe_times(2) + list(movements['timestamp'].iloc[:20])
+    for product_id in ['p0', 'p1', 'p4']:
+        for timestamp in times:
+            assert ledger.stock_at(product_id, timestamp) == brute_force_stock(movements, product_id, timestamp)
+
+
+def test_stock_at_all_matches_stock_at():
+    movements = random_movements(3)
+    ledger = StockLedger(movements)
+    for timestamp in probe_times(4, count=20):
+        levels = ledger.stock_at_all(timestamp)
+        for product_id in ledger.product_ids:
+            assert levels[product_id] == brute_force_stock(movements, product_id, timestamp)
+
+
+def test_unknown_products_and_times_before_the_first_movement_have_no_stock():
+    ledger = StockLedger(random_movements(5))
+    assert ledger.stock_at('missing', START + pd.Timedelta(days=10)) == 0
+    assert (ledger.stock_at_all(START - pd.Timedelta(days=1)) == 0).all()
+
+
+def test_daily_closing_levels_count_the_whole_day():
+    movements = random_movements(6)
+    ledger = StockLedger(movements)
+    dates = pd.date_range(START - pd.Timedelta(days=2), periods=95, freq='D')
+    levels = ledger.daily_closing_levels('p2', dates)
+    expected = [brute_force_stock(movements, 'p2', day + pd.Timedelta(seconds=86399)) for day in dates]
+    assert levels.tolist() == expected
+    assert ledger.stockout_flags('p2', dates).tolist() == [level <= 0 for level in expected]
+
+
+def test_replay_daily_levels_matches_the_ledger():
+    movements = random_movements(7)
+    ledger = StockLedger(movements)
+    rows = movements[movements['product_id'] == 'p3']
+    dates = pd.date_range(START, periods=90, freq='D')
+    replayed = replay_daily_levels(0, rows['timestamp'], rows['quantity'], dates)
+    assert replayed.tolist() == ledger.daily_closing_levels('p3', dates).tolist()
+
+
+def test_append_ignores_recorded_movements_and_rebuilds_snapshots():
+    movements = random_movements(8)
+    ledger = StockLedger(movements.iloc[:300])
+    assert ledger.append(movements.iloc[250:]) == 100
+    assert ledger.append(movements) == 0
+    for timestamp in probe_times(9, count=20):
+        assert ledger.stock_at('p1', timestamp) == brute_force_stock(movements, 'p1', timestamp)
+
+
+def test_from_frames_signs_and_dates_items_by_their_parent():
+    purchases = pd.DataFrame({'_id': ['pu1'], 'purchase_date': [START]})
+    purchase_items = pd.DataFrame({'_id': ['pi1'], 'purchase_id': ['pu1'], 'batch_id': ['b1'], 'quantity': [50]})
+    sales = pd.DataFrame({'_id': ['s1', 's2'], 'sale_date': [START + pd.Timedelta(days=3), START + pd.Timedelta(days=9)]})
+    sale_items = pd.DataFrame({'_id': ['si1', 'si2', 'si3'], 'sale_id': ['s1', 's2', 's2'],
+                               'batch_id': ['b1', 'b1', 'unknown'], 'quantity': [10, 15, 99]})
+    batches = pd.DataFrame({'_id': ['b1'], 'product_id': ['p1']})
+
+    ledger = StockLedger.from_frames(purchases, purchase_items, sales, sale_items, batches)
+    assert len(ledger.movements) == 3
+    assert ledger.stock_at('p1', START + pd.Timedelta(days=5)) == 40
+    assert ledger.stock_at('p1', START + pd.Timedelta(days=10)) == 25
+
+
+# --- Persisted ledger ---
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def seed_collections(db, seed, sales=60):
+    rng = np.random.default_rng(seed)
+    db.product_batches.insert_many([{'_id': f'b{i}', 'product_id': f'p{i % 3}'} for i in range(6)])
+    db.purchases.insert_one({'_id': 'pu1', 'purchase_date': START.to_pydatetime(), 'updatedAt': START.to_pydatetime()})
+    db.purchase_items.insert_many([{'_id': f'pi{i}', 'purchase_id': 'pu1', 'batch_id': f'b{i}', 'quantity': 500,
+                                    'updatedAt': START.to_pydatetime()} for i in range(6)])
+    days = np.sort(rng.integers(1, 60, sales))
+    db.sales.insert_many([{'_id': f's{i}', 'sale_date': (START + pd.Timedelta(days=int(day), hours=10)).to_pydatetime(),
+                           'updatedAt': START.to_pydatetime()} for i, day in enumerate(days)])
+    db.sale_items.insert_many([{'_id': f'si{i}', 'sale_id': f's{i}', 'batch_id': f'b{rng.integers(0, 6)}',
+                                'quantity': int(rng.integers(1, 10)), 'updatedAt': START.to_pydatetime()}
+                               for i in range(sales)])
+
+
+def expected_stock(db, product_id, timestamp):
+    batches = {doc['_id'] for doc in db.product_batches.find({'product_id': product_id})}
+    level = sum(doc['quantity'] for doc in db.purchase_items.find({'batch_id': {'$in': list(batches)}}))
+    sale_dates = {doc['_id']: doc['sale_date'] for doc in db.sales.find()}
+    for item in db.sale_items.find({'batch_id': {'$in': list(batches)}}):
+        if sale_dates[item['sale_id']] <= timestamp:
+            level -= item['quantity']
+    return level
+
+
+def assert_stored_levels_match(db):
+    for product_id in ['p0', 'p1', 'p2']:
+        for day in range(0, 70, 3):
+            timestamp = (START + pd.Timedelta(days=day, hours=12)).to_pydatetime()
+            assert stored_stock_at(db, product_id, timestamp) == expected_stock(db, product_id, timestamp)
+
+
+def test_sync_records_every_item_and_writes_snapshots(db):
+    seed_collections(db, 10)
+    counts = sync_stock_ledger(db)
+    assert counts['movements'] == 66 and counts['unresolved'] == 0 and not counts['skipped']
+    assert db[SNAPSHOTS_COLLECTION].count_documents({}) > 0
+    assert_stored_levels_match(db)
+
+
+def test_sync_appends_only_the_differences(db):
+    seed_collections(db, 11)
+    sync_stock_ledger(db)
+    assert sync_stock_ledger(db)['movements'] == 0
+
+    later = (START + pd.Timedelta(days=90)).to_pydatetime()
+    db.sale_items.update_one({'_id': 'si5'}, {'$set': {'quantity': 40, 'updatedAt': later}})
+    db.sales.update_one({'_id': 's7'}, {'$set': {'sale_date': (START + pd.Timedelta(days=2)).to_pydatetime(), 'updatedAt': later}})
+    counts = sync_stock_ledger(db)
+    # The changed quantity is one adjustment; the moved sale is reversed and recorded on its new date
+    assert counts['movements'] == 3
+    assert db[MOVEMENTS_COLLECTION].count_documents({'movement_type': 'adjustment'}) == 2
+    assert_stored_levels_match(db)
+
+
+def test_reconcile_reverses_deleted_items(db):
+    seed_collections(db, 12)
+    sync_stock_ledger(db)
+    db.sale_items.delete_many({'_id': {'$in': ['si1', 'si2']}})
+    assert sync_stock_ledger(db)['movements'] == 0
+    assert sync_stock_ledger(db, reconcile=True)['movements'] == 2
+    assert_stored_levels_match(db)
+
+
+def test_sync_is_skipped_while_another_process_holds_the_lease(db):
+    seed_collections(db, 13)
+    owner = acquire_lease(db, 'stock_ledger')
+    assert acquire_lease(db, 'stock_ledger') is None
+    assert sync_stock_ledger(db)['skipped']
+    assert db[MOVEMENTS_COLLECTION].count_documents({}) == 0
+    release_lease(db, 'stock_ledger', owner)
+    assert not sync_stock_ledger(db)['skipped']
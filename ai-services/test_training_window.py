@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_sources import CSVDataSource
+from training_window import (
+    classify_tier, load_windowed_sales, lookback_days, training_window as window, window_end, window_metadata
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    for variable in ['STOCKPILOT_WINDOW_END', 'STOCKPILOT_LOOKBACK_REORDER_DAYS', 'STOCKPILOT_LOOKBACK_FAST_DAYS']:
+        monkeypatch.delenv(variable, raising=False)
+
+
+def test_lookback_comes_from_the_tier_before_the_model(monkeypatch):
+    assert lookback_days('product') == 365
+    assert lookback_days('product', tier='fast') == 180
+    assert lookback_days('product', tier='slow') == 730
+    monkeypatch.setenv('STOCKPILOT_LOOKBACK_FAST_DAYS', '90')
+    monkeypatch.setenv('STOCKPILOT_LOOKBACK_REORDER_DAYS', '30')
+    assert lookback_days('reorder') == 30
+    assert lookback_days('reorder', tier='fast') == 90
+    with pytest.raises(ValueError):
+        lookback_days('unknown')
+
+
+@pytest.mark.parametrize('units_per_day, tier', [(0, 'slow'), (0.19, 'slow'), (0.2, 'medium'), (0.99, 'medium'), (1, 'fast'), (40, 'fast')])
+def test_tiers_follow_the_thresholds(units_per_day, tier):
+    assert classify_tier(units_per_day) == tier
+
+
+def test_window_end_follows_the_setting(monkeypatch):
+    newest = lambda: pd.Timestamp('2025-09-25 18:30', tz='UTC')
+    assert window_end(newest) == pd.Timestamp('2025-09-25 18:30')
+    # Without sales the window ends today
+    assert window_end(lambda: None).normalize() == pd.Timestamp.now().normalize()
+    monkeypatch.setenv('STOCKPILOT_WINDOW_END', '2024-12-31')
+    assert window_end(newest) == pd.Timestamp('2024-12-31')
+    monkeypatch.setenv('STOCKPILOT_WINDOW_END', 'now')
+    assert window_end(newest).normalize() == pd.Timestamp.now().normalize()
+
+
+def test_window_includes_the_whole_last_day():
+    start, end = window('reorder', end='2025-09-25 18:30')
+    assert end == pd.Timestamp('2025-09-26')
+    assert start == end - pd.Timedelta(days=180)
+    metadata = window_metadata('reorder', start, end, rows=12)
+    assert metadata == {'model': 'reorder', 'tier': None, 'lookback_days': 180, 'window_start': '2025-03-30',
+                        'window_end': '2025-09-25', 'training_rows': 12}
+
+
+def test_windowed_sales_are_exactly_the_sales_in_the_window(tmp_path):
+    rng = np.random.default_rng(1)
+    sale_dates = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 300 * 86400, 400), unit='s')
+    sales = pd.DataFrame({'_id': [f'{i:024x}' for i in range(400)],
+                          'sale_date': sale_dates.strftime('%Y-%m-%dT%H:%M:%S.000+00:00')})
+    items = pd.DataFrame({'_id': [f'{10000 + i:024x}' for i in range(800)],
+                          'sale_id': [f'{i % 400:024x}' for i in range(800)],
+                          'quantity': rng.integers(1, 5, 800)})
+    # Items are created a few minutes after their sale
+    items['createdAt'] = (sale_dates[np.arange(800) % 400] + pd.Timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%S.000+00:00')
+    sales.to_csv(tmp_path / 'sales.csv', index=False)
+    items.to_csv(tmp_path / 'sale_items.csv', index=False)
+
+    start, end = window('reorder', end='2025-08-31')
+    df_sales, df_items = load_windowed_sales(CSVDataSource(str(tmp_path)), start, end, item_columns=['quantity'])
+
+    inside = (sale_dates >= start) & (sale_dates < end)
+    assert sorted(df_sales['_id']) == sorted(sales['_id'][inside])
+    assert sorted(df_items['sale_id']) == sorted(items['sale_id'][inside[np.arange(800) % 400]])
+    assert list(df_items.columns) == ['sale_id', 'quantity']
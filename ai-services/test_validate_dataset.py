@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_sources import CSVDataSource
+from validate_dataset import orphan_mask, validate_dataset
+
+
+def object_id(i):
+    return f'{i:024x}'
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_orphan_mask_matches_isin(categorical):
+    rng = np.random.default_rng(1)
+    parents = pd.Series([object_id(i) for i in range(0, 200, 2)] + [None])
+    values = pd.Series([object_id(i) for i in rng.integers(0, 220, 1000)], dtype=object)
+    values[rng.random(1000) < 0.05] = None
+    if categorical:
+        values = values.astype('category')
+    expected = values.notna() & ~values.astype(object).isin(parents.dropna())
+    assert orphan_mask(values, parents).tolist() == expected.tolist()
+
+
+def write_collections(base_dir, **frames):
+    for collection, df in frames.items():
+        df.to_csv(base_dir / f'{collection}.csv', index=False)
+
+
+def test_valid_collections_have_no_issues(tmp_path):
+    write_collections(
+        tmp_path,
+        products=pd.DataFrame({'_id': [object_id(1), object_id(2)], 'product_name': ['A', 'B']}),
+        product_batches=pd.DataFrame({'_id': [object_id(10)], 'product_id': [object_id(2)], 'mrp': [5.5], 'quantity_in_stock': [3]})
+    )
+    assert validate_dataset(CSVDataSource(str(tmp_path)), ['products', 'product_batches']) == []
+
+
+def test_every_kind_of_problem_is_reported(tmp_path):
+    write_collections(
+        tmp_path,
+        products=pd.DataFrame({'_id': [object_id(1), object_id(2)], 'product_name': ['A', 'B']}),
+        product_batches=pd.DataFrame({
+            '_id': [object_id(10), object_id(10), object_id(12), object_id(13)],
+            'product_id': [object_id(1), object_id(9), object_id(2), None],
+            'mrp': [5.5, -1, 'abc', 2],
+            'quantity_in_stock': [3, 1, 2, 4]
+        }),
+        sale_items=pd.DataFrame({'_id': [object_id(20)], 'sale_id': [object_id(30)], 'batch_id': [object_id(12)],
+                                 'quantity': [0], 'mrp': [10], 'tax_percent': [120]})
+    )
+    issues = validate_dataset(CSVDataSource(str(tmp_path)), ['product_batches', 'sale_items'])
+    found = {(issue['collection'], issue['check'], issue['column']): issue for issue in issues}
+
+    assert found[('product_batches', 'duplicate', '_id')]['rows'] == 2
+    assert found[('product_batches', 'null', 'product_id')]['examples'] == [object_id(13)]
+    # An unparseable number becomes a null
+    assert found[('product_batches', 'null', 'mrp')]['examples'] == [object_id(12)]
+    assert found[('product_batches', 'range [0, ]', 'mrp')]['examples'] == ['-1.0']
+    assert found[('product_batches', 'orphan -> products', 'product_id')]['examples'] == [object_id(9)]
+    assert found[('sale_items', 'range [1, ]', 'quantity')]['rows'] == 1
+    assert found[('sale_items', 'range [0, 100]', 'tax_percent')]['rows'] == 1
+    # sales.csv does not exist, so its foreign keys cannot be checked
+    assert ('sales', 'missing collection', None) in found
+    assert ('sale_items', 'orphan -> product_batches', 'batch_id') not in found
@@ -0,0 +1,113 @@
+import pandas as pd
+import os
+
+# Days of sales history each model trains on
+LOOKBACK_DAYS = {
+    'general': 365,  # Store-wide daily sales forecaster
+    'product': 365,  # Per-product forecaster when the product's tier is unknown
+    'reorder': 180   # Demand history behind reorder points
+}
+
+# Per-product lookback by sales velocity - fast movers have plenty of recent signal
+TIER_LOOKBACK_DAYS = {
+    'fast': 180,
+    'medium': 365,
+    'slow': 730
+}
+
+# Minimum average units sold per day for each tier, checked in order
+TIER_THRESHOLDS = [('fast', 1.0), ('medium', 0.2), ('slow', 0.0)]
+
+# Where training windows end without an explicit end (STOCKPILOT_WINDOW_END):
+#   data - the day of the newest sale, so a dataset that stopped growing (the
+#          generated CSVs end on 2025-09-25) still trains on its last months
+#   now  - today's wall-clock date
+#   or a fixed date such as 2025-09-25
+DEFAULT_WINDOW_END = 'data'
+
+# Sale items are created with their sale, so their createdAt is never much earlier than
+# the sale_date; the slack keeps the createdAt range a superset of the sales window
+ITEM_CREATED_SLACK = pd.Timedelta(days=1)
+
+
+def lookback_days(model, tier=None):
+    """
+    Lookback window in days for a model, or for a product tier when one is given.
+    STOCKPILOT_LOOKBACK_<MODEL or TIER>_DAYS overrides the configured value.
+    """
+    key = tier if tier is not None else model
+    configured = TIER_LOOKBACK_DAYS.get(tier) if tier is not None else LOOKBACK_DAYS.get(model)
+    if configured is None:
+        raise ValueError(f"Unknown model or tier: {key}")
+    return int(os.environ.get(f'STOCKPILOT_LOOKBACK_{key.upper()}_DAYS', configured))
+
+
+def classify_tier(units_per_day):
+    """Velocity tier of a product from its average units sold per day"""
+    for tier, threshold in TIER_THRESHOLDS:
+        if units_per_day >= threshold:
+            return tier
+    return TIER_THRESHOLDS[-1][0]
+
+
+def window_end(newest=None):
+    """
+    The last day of the training windows as configured by STOCKPILOT_WINDOW_END.
+    newest is called for the newest sale date in 'data' mode; without one, or
+    without any sales, the window ends today.
+    """
+    setting = os.environ.get('STOCKPILOT_WINDOW_END', DEFAULT_WINDOW_END).strip().lower()
+    if setting == 'now':
+        return pd.Timestamp.now()
+    if setting != 'data':
+        return pd.Timestamp(setting)
+    latest = newest() if newest is not None else None
+    return pd.Timestamp(latest).tz_localize(None) if latest is not None and pd.notna(latest) else pd.Timestamp.now()
+
+
+def training_window(model, tier=None, end=None, newest=None):
+    """
+    (start, end) timestamps of a model's training window. The window ends at the
+    start of the day after end, so the whole last day is included. end defaults
+    to window_end(newest) - the newest sale date unless configured otherwise.
+    """
+    end = (pd.Timestamp(end) if end is not None else window_end(newest)).normalize() + pd.Timedelta(days=1)
+    return end - pd.Timedelta(days=lookback_days(model, tier)), end
+
+
+def sale_date_filters(start, end):
+    """Data source filters selecting sales with start <= sale_date < end"""
+    return [('sale_date', '>=', start), ('sale_date', '<', end)]
+
+
+def load_windowed_sales(source, start, end, sale_columns=None, item_columns=None):
+    """
+    Load the sales inside a window and their sale items from a data source.
+
+    The sale_date range is pushed down to the backend (MongoDB query or Parquet
+    month partitions). Sale items have no sale_date, so they are narrowed with a
+    createdAt range and then matched to the loaded sales.
+    """
+    if sale_columns is not None and '_id' not in sale_columns:
+        sale_columns = ['_id'] + list(sale_columns)
+    if item_columns is not None and 'sale_id' not in item_columns:
+        item_columns = ['sale_id'] + list(item_columns)
+
+    df_sales = source.load('sales', columns=sale_columns, filters=sale_date_filters(start, end))
+    df_sale_items = source.load('sale_items', columns=item_columns, filters=[('createdAt', '>=', start - ITEM_CREATED_SLACK)])
+    df_sale_items = df_sale_items[df_sale_items['sale_id'].astype(str).isin(df_sales['_id'].astype(str))]
+    return df_sales, df_sale_items.reset_index(drop=True)
+
+
+def window_metadata(model, start, end, tier=None, rows=None):
+    """Description of a training window for model metadata and logs"""
+    metadata = {
+        'model': model,
+        'tier': tier,
+        'lookback_days': int((end - start).days),
+        'window_start': start.strftime('%Y-%m-%d'),
+        'window_end': (end - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    }
+    if rows is not None:
+        metadata['training_rows'] = int(rows)
+    return metadata
@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import time
+
+from data_sources import get_data_source, COLLECTIONS
+from schema import SCHEMAS, FOREIGN_KEYS, ID, REFERENCE
+
+logger = logging.getLogger("validate_dataset")
+
+# Columns every document must have a value for, besides its _id and foreign keys
+REQUIRED_COLUMNS = {
+    'vendors': ['vendor_name'],
+    'customers': ['customer_name'],
+    'products': ['product_name'],
+    'product_batches': ['mrp', 'quantity_in_stock'],
+    'purchases': ['purchase_date', 'total_amount'],
+    'purchase_items': ['quantity', 'purchase_rate'],
+    'sales': ['sale_date', 'total_amount'],
+    'sale_items': ['quantity', 'mrp']
+}
+
+# Allowed (min, max) of numeric columns; None leaves that side open
+VALUE_RANGES = {
+    'product_batches': {'mrp': (0, None), 'quantity_in_stock': (0, None)},
+    'purchases': {'total_amount': (0, None)},
+    'purchase_items': {'quantity': (1, None), 'purchase_rate': (0, None),
+                       'tax_percent': (0, 100), 'discount_percent': (0, 100)},
+    'sales': {'total_amount': (0, None)},
+    'sale_items': {'quantity': (1, None), 'mrp': (0, None),
+                   'tax_percent': (0, 100), 'discount_percent': (0, 100)}
+}
+
+# Offending values shown per issue
+EXAMPLE_COUNT = 5
+
+
+def _examples(values):
+    return [str(value) for value in pd.unique(values)[:EXAMPLE_COUNT]]
+
+
+def _issue(collection, check, column, mask, values):
+    return {'collection': collection, 'check': check, 'column': column,
+            'rows': int(mask.sum()), 'examples': _examples(values[mask])}
+
+
+def orphan_mask(series, parent_ids):
+    """
+    Anti-join: rows whose non-null value is not among parent_ids. The lookup is a
+    hash-table probe (get_indexer), which is much faster than isin on string ids.
+    Categoricals are probed once per category and spread over the rows by code.
+    """
+    parent_ids = pd.Index(parent_ids.dropna().astype(str).unique())
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        missing = parent_ids.get_indexer(series.cat.categories.astype(str)) < 0
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(np.append(missing, False)[codes], index=series.index)
+    return series.notna() & (parent_ids.get_indexer(series.astype(str)) < 0)
+
+
+def check_collection(collection, df):
+    """Uniqueness, null and value-range checks of one collection"""
+    issues = []
+    schema = SCHEMAS.get(collection, {})
+    keys = [column for column, kind in schema.items() if kind in (ID, REFERENCE)]
+    required = keys + REQUIRED_COLUMNS.get(collection, [])
+
+    for column in required:
+        if column not in df.columns:
+            issues.append({'collection': collection, 'check': 'missing column', 'column': column,
+                           'rows': len(df), 'examples': []})
+            continue
+        # The schema turns unparseable numbers and dates into nulls, so both land here
+        mask = df[column].isna()
+        if mask.any():
+            issues.append(_issue(collection, 'null', column, mask, df['_id'] if '_id' in df.columns else df.index))
+
+    if '_id' in df.columns:
+        mask = df['_id'].duplicated(keep=False) & df['_id'].notna()
+        if mask.any():
+            issues.append(_issue(collection, 'duplicate', '_id', mask, df['_id']))
+
+    for column, (low, high) in VALUE_RANGES.get(collection, {}).items():
+        if column not in df.columns:
+            continue
+        values = pd.to_numeric(df[column], errors='coerce')
+        mask = pd.Series(False, index=df.index)
+        if low is not None:
+            mask |= values < low
+        if high is not None:
+            mask |= values > high
+        if mask.any():
+            issues.append(_issue(collection, f'range [{low}, {high if high is not None else ""}]', column, mask, values))
+    return issues
+
+
+def check_foreign_keys(collection, df, frames):
+    """Anti-join every foreign key of a collection against the referenced ids"""
+    issues = []
+    for field, target in FOREIGN_KEYS.get(collection, {}).items():
+        if field not in df.columns or target not in frames:
+            continue
+        mask = orphan_mask(df[field], frames[target]['_id'])
+        if mask.any():
+            issues.append(_issue(collection, f'orphan -> {target}', field, mask, df[field]))
+    return issues
+
+
+def validate_dataset(source, collections=None):
+    """
+    Check the collections of a CSV or Parquet data source before they are uploaded:
+    unique, non-null ids, required columns, value ranges, and that every foreign key
+    points at an existing document. Referenced collections outside `collections` are
+    loaded for their ids only. Returns a list of issue dicts; empty means valid.
+    """
+    collections = list(collections or COLLECTIONS)
+    frames = {}
+    issues = []
+    for collection in collections:
+        try:
+            frames[collection] = source.load(collection)
+        except FileNotFoundError:
+            issues.append({'collection': collection, 'check': 'missing collection', 'column': None,
+                           'rows': 0, 'examples': []})
+
+    referenced = {t for c in frames for t in FOREIGN_KEYS.get(c, {}).values()} - set(frames)
+    for collection in referenced:
+        try:
+            frames[collection] = source.load(collection, columns=['_id'])
+        except FileNotFoundError:
+            issues.append({'collection': collection, 'check': 'missing collection', 'column': None,
+                           'rows': 0, 'examples': []})
+
+    for collection in collections:
+        if collection not in frames:
+            continue
+        issues += check_collection(collection, frames[collection])
+        issues += check_foreign_keys(collection, frames[collection], frames)
+    return issues
+
+
+def print_issues(issues):
+    if not issues:
+        print("✅ Dataset is valid")
+        return
+    print(f"❌ Found {len(issues)} data problems:")
+    for issue in issues:
+        column = f".{issue['column']}" if issue['column'] else ''
+        examples = f" e.g. {', '.join(issue['examples'])}" if issue['examples'] else ''
+        print(f"  - {issue['collection']}{column}: {issue['check']} ({issue['rows']} rows){examples}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a StockPilot dataset for broken references, duplicates, nulls and out-of-range values.")
+    parser.add_argument("--source", choices=["csv", "parquet"], default="csv", help="Where to read the collections from.")
+    parser.add_argument("--input-dir", type=str, default=None, help="Directory of the CSV files or Parquet snapshot.")
+    parser.add_argument("--collections", nargs="+", choices=COLLECTIONS, default=None, help="Only check these collections.")
+    args = parser.parse_args()
+
+    source_kwargs = {'base_dir': args.input_dir} if args.input_dir else {}
+    source = get_data_source(args.source, **source_kwargs)
+    start_time = time.perf_counter()
+    try:
+        issues = validate_dataset(source, args.collections)
+    finally:
+        source.close()
+    print_issues(issues)
+    print(f"Checked in {time.perf_counter() - start_time:.2f}s")
+    if issues:
+        exit(1)
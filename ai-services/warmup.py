@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+
+from metrics import stage
+
+logger = logging.getLogger("warmup")
+
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+
+
+# Seconds before failed tasks are retried, doubling after every failed retry up
+# to the maximum (STOCKPILOT_WARMUP_RETRY_SECONDS, STOCKPILOT_WARMUP_RETRY_MAX_SECONDS)
+DEFAULT_RETRY_SECONDS = 5.0
+DEFAULT_RETRY_MAX_SECONDS = 300.0
+
+
+class Warmup:
+    """
+    Expensive start-up work run on a background thread, so a service binds its
+    port at once and reports readiness separately from liveness.
+
+    Tasks registered with @warmup.task run in registration order; each one that
+    raises is marked failed and the next still runs. Failed tasks are then
+    retried with exponential backoff until they succeed. The service is ready
+    only while every task has succeeded - a failed task keeps it unready, and
+    shows up with its error and attempts in status(). An app sharing another
+    service's warm-up can require only some of its tasks (see is_ready).
+    """
+
+    def __init__(self, name, retry_seconds=None, retry_max_seconds=None):
+        self.name = name
+        if retry_seconds is None:
+            retry_seconds = float(os.environ.get('STOCKPILOT_WARMUP_RETRY_SECONDS', DEFAULT_RETRY_SECONDS))
+        if retry_max_seconds is None:
+            retry_max_seconds = float(os.environ.get('STOCKPILOT_WARMUP_RETRY_MAX_SECONDS', DEFAULT_RETRY_MAX_SECONDS))
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._tasks = []
+        self._status = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def task(self, fn=None, name=None):
+        """Register a warm-up task; usable as @warmup.task or @warmup.task(name='...')"""
+        def register(fn):
+            task_name = name or fn.__name__
+            self._tasks.append((task_name, fn))
+            self._status[task_name] = {'state': PENDING}
+            return fn
+        return register(fn) if fn is not None else register
+
+    def _set(self, name, **status):
+        with self._lock:
+            self._status[name] = status
+
+    def _run_task(self, name, fn, attempt):
+        self._set(name, state=RUNNING, attempts=attempt)
+        start_time = time.perf_counter()
+        try:
+            with stage(f'warmup_{name}'):
+                fn()
+        except Exception as e:
+            logger.error(f"{self.name} warm-up task {name} failed (attempt {attempt}): {e}")
+            self._set(name, state=FAILED, attempts=attempt, seconds=round(time.perf_counter() - start_time, 3), error=str(e))
+        else:
+            self._set(name, state=READY, attempts=attempt, seconds=round(time.perf_counter() - start_time, 3))
+
+    def _failed(self):
+        with self._lock:
+            return [(name, fn) for name, fn in self._tasks if self._status[name]['state'] == FAILED]
+
+    def _run(self):
+        for name, fn in self._tasks:
+            self._run_task(name, fn, 1)
+        self._done.set()
+        logger.info(f"{self.name} warm-up finished: {self.status()['tasks']}")
+
+        delay = self.retry_seconds
+        attempt = 1
+        while not self._stop.is_set():
+            failed = self._failed()
+            if not failed:
+                break
+            logger.info(f"{self.name} retrying {', '.join(name for name, _ in failed)} in {delay:g}s")
+            if self._stop.wait(delay):
+                break
+            attempt += 1
+            for name, fn in failed:
+                self._run_task(name, fn, attempt)
+            delay = min(delay * 2, self.retry_max_seconds)
+
+    def start(self):
+        """Start the warm-up thread (once - later calls do nothing)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-warmup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop retrying failed tasks"""
+        self._stop.set()
+
+    def is_ready(self, required=None):
+        """
+        Whether every task has run and succeeded - or, given the names of the
+        tasks an app needs, whether those have
+        """
+        if required is None and not self._done.is_set():
+            return False
+        with self._lock:
+            names = self._status if required is None else required
+            return all(self._status[name]['state'] == READY for name in names)
+
+    def wait(self, timeout=None):
+        """Block until every task has run once; returns whether they have"""
+        return self._done.wait(timeout)
+
+    def status(self, required=None):
+        """Readiness and task states; tasks outside required (when given) are marked optional"""
+        with self._lock:
+            tasks = {name: dict(status) for name, status in self._status.items()}
+        if required is not None:
+            for name, status in tasks.items():
+                if name not in required:
+                    status['optional'] = True
+        return {'ready': self.is_ready(required), 'tasks': tasks}
+
+
+def fit_prophet_once():
+    """
+    Import Prophet and fit a tiny synthetic series, so the first real fit does
+    not also pay for loading the Stan model and its compiled backend.
+    """
+    import pandas as pd
+    from prophet import Prophet
+    history = pd.DataFrame({'ds': pd.date_range('2024-01-01', periods=30, freq='D'), 'y': [float(i % 7) for i in range(30)]})
+    model = Prophet(daily_seasonality=False, weekly_seasonality=True, yearly_seasonality=False)
+    model.fit(history)
+    model.predict(model.make_future_dataframe(periods=7))